@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Brand, Product, ProductVariant, ProductImage, Imei
+from .models import Brand, Product, ProductVariant, ProductImage, VariantImage, Imei, PriceHistory
 
 
 @admin.register(Brand)
@@ -28,11 +28,25 @@ class ProductAdmin(admin.ModelAdmin):
     inlines = [ProductVariantInline, ProductImageInline]
 
 
+class VariantImageInline(admin.TabularInline):
+    model = VariantImage
+    extra = 0
+
+
 @admin.register(ProductVariant)
 class ProductVariantAdmin(admin.ModelAdmin):
     list_display = ['__str__', 'sku', 'price', 'current_stock', 'is_active']
     list_filter = ['product__brand', 'is_active']
     search_fields = ['sku', 'product__name']
+    inlines = [VariantImageInline]
+
+
+@admin.register(PriceHistory)
+class PriceHistoryAdmin(admin.ModelAdmin):
+    list_display = ['product_variant', 'old_price', 'new_price', 'changed_by', 'changed_at']
+    list_filter = ['changed_at']
+    search_fields = ['product_variant__sku', 'product_variant__product__name']
+    readonly_fields = ['product_variant', 'old_price', 'new_price', 'changed_by', 'changed_at']
 
 
 @admin.register(Imei)
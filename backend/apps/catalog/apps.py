@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.catalog'
-    verbose_name = 'Product Catalog' 
\ No newline at end of file
+    verbose_name = 'Product Catalog'
+
+    def ready(self):
+        from . import signals  # noqa: F401
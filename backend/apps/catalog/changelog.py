@@ -0,0 +1,139 @@
+"""
+Catalog change log for delta sync.
+
+Every committed write to a brand, product, variant or inventory row is logged as a
+``CatalogChange``; its auto-increment id is the catalog version. Only the latest
+change per object is kept (the previous entry is deleted when a new one is written),
+so the log stays as large as the catalog plus tombstones, and a client at version N
+fetches ``id > N`` to get exactly the objects that changed since.
+
+Entries are written after the data transaction commits, in short transactions of at
+most one batch, so a long write (e.g. a bulk import) cannot hold back a version
+number that a faster transaction has already published. An id is still assigned at
+insert and becomes visible at commit, so a batch can commit after a higher id; sync
+therefore stops below the oldest entry younger than ``CATALOG_SYNC_SETTLE_SECONDS``,
+well past the time a batch takes to commit.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+SYNC_LIMIT = 1000
+MAX_SYNC_LIMIT = 5000
+
+PRODUCT_VALUES = [
+    'id', 'name', 'sku', 'barcode', 'brand_id', 'is_active',
+    'min_price', 'max_price', 'active_variants_count', 'primary_variant_id',
+]
+VARIANT_VALUES = ['id', 'product_id', 'sku', 'ram', 'rom', 'color', 'price', 'is_active']
+
+
+def record_changes(model, object_ids, deleted=False):
+    """Log changed objects (a CatalogChange.MODEL_CHOICES key) once the transaction commits"""
+    object_ids = list(object_ids)
+    if object_ids:
+        transaction.on_commit(lambda: write_changes(model, object_ids, deleted))
+
+
+def write_changes(model, object_ids, deleted=False, batch_size=1000):
+    from .models import CatalogChange
+
+    for start in range(0, len(object_ids), batch_size):
+        chunk = object_ids[start:start + batch_size]
+        try:
+            with transaction.atomic():
+                CatalogChange.objects.filter(model=model, object_id__in=chunk).delete()
+                CatalogChange.objects.bulk_create([
+                    CatalogChange(model=model, object_id=object_id, deleted=deleted)
+                    for object_id in chunk
+                ])
+        except Exception:
+            # The data is committed already; clients miss these objects until they change again
+            logger.exception('Could not log %s changes %s', model, chunk)
+
+
+def current_version():
+    from .models import CatalogChange
+
+    return CatalogChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def changes_since(version, limit=SYNC_LIMIT):
+    """
+    Rows changed after ``version`` (at most ``limit`` log entries, none of the last
+    settle seconds), tombstones for deleted objects, the version to sync from next and
+    whether more changes remain.
+    """
+    from apps.inventory.models import Inventory
+    from .models import Brand, CatalogChange, Product, ProductVariant
+
+    entries = CatalogChange.objects.filter(id__gt=version)
+    settle_from = timezone.now() - timedelta(seconds=settings.CATALOG_SYNC_SETTLE_SECONDS)
+    horizon = CatalogChange.objects.filter(created_at__gt=settle_from).order_by('id').values_list(
+        'id', flat=True
+    ).first()
+    if horizon is not None:
+        entries = entries.filter(id__lt=horizon)
+    entries = list(
+        entries.order_by('id').values_list('id', 'model', 'object_id', 'deleted')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    changed = {model: [] for model, _ in CatalogChange.MODEL_CHOICES}
+    deleted = {model: [] for model, _ in CatalogChange.MODEL_CHOICES}
+    for _, model, object_id, is_deleted in entries:
+        (deleted if is_deleted else changed)[model].append(object_id)
+
+    payload = {
+        'version': entries[-1][0] if entries else version,
+        'has_more': has_more,
+        # The client is ahead of this catalog (e.g. restored database): reload from 0
+        'reset': not entries and version > current_version(),
+        'brands': [],
+        'products': [],
+        'variants': [],
+        'inventory': [],
+        'deleted': {model: ids for model, ids in deleted.items() if ids},
+    }
+    if changed[CatalogChange.BRAND]:
+        brands = list(Brand.objects.filter(pk__in=changed[CatalogChange.BRAND]))
+        Brand.resolve_logo_urls(brands)
+        payload['brands'] = [
+            {'id': brand.id, 'name': brand.name, 'slug': brand.slug,
+             'logo': brand.logo_url, 'is_active': brand.is_active}
+            for brand in brands
+        ]
+    if changed[CatalogChange.PRODUCT]:
+        payload['products'] = list(
+            Product.objects.filter(pk__in=changed[CatalogChange.PRODUCT]).order_by().values(*PRODUCT_VALUES)
+        )
+    if changed[CatalogChange.VARIANT]:
+        payload['variants'] = list(
+            ProductVariant.objects.filter(pk__in=changed[CatalogChange.VARIANT]).order_by().values(*VARIANT_VALUES)
+        )
+    if changed[CatalogChange.INVENTORY]:
+        payload['inventory'] = list(
+            Inventory.objects.filter(product_variant_id__in=changed[CatalogChange.INVENTORY])
+            .values('product_variant_id', 'on_hand')
+        )
+
+    # An object deleted after its change was logged is reported as a tombstone
+    found = {
+        CatalogChange.BRAND: {row['id'] for row in payload['brands']},
+        CatalogChange.PRODUCT: {row['id'] for row in payload['products']},
+        CatalogChange.VARIANT: {row['id'] for row in payload['variants']},
+        CatalogChange.INVENTORY: {row['product_variant_id'] for row in payload['inventory']},
+    }
+    for model, object_ids in changed.items():
+        missing = [object_id for object_id in object_ids if object_id not in found[model]]
+        if missing:
+            payload['deleted'].setdefault(model, []).extend(missing)
+    return payload
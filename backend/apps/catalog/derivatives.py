@@ -0,0 +1,86 @@
+"""
+Background rendering of variant image derivatives (thumbnails, WebP).
+
+Uploads call ``enqueue`` with the manifest paths they wrote. After the transaction
+commits, a background thread hands the paths to a process pool (Pillow resizing is
+CPU bound) and flags the finished manifest rows with ``has_derivatives`` so the
+serializers start returning derivative URLs. With ``IMAGE_DERIVATIVE_WORKERS = 0``
+the images are rendered inline instead.
+"""
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import response_cache
+from .images import render_derivatives
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process pool shared by every job of this process"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_DERIVATIVE_WORKERS)
+        return _executor
+
+
+def _render(assets_root, relpath):
+    """Worker entry point; a broken upload must not fail the rest of the batch"""
+    try:
+        render_derivatives(assets_root, relpath)
+        return True
+    except Exception:
+        logger.exception('Could not render derivatives of %s', relpath)
+        return False
+
+
+def render_images(paths, executor=None):
+    """Render the derivatives of the given manifest paths and flag the rows; returns the count"""
+    from .models import VariantImage
+
+    paths = list(paths)
+    mapper = executor.map if executor else map
+    results = mapper(_render, repeat(str(settings.ASSETS_ROOT)), paths)
+    done = [path for path, ok in zip(paths, results) if ok]
+
+    for start in range(0, len(done), 500):
+        VariantImage.objects.filter(path__in=done[start:start + 500]).update(has_derivatives=True)
+    if done:
+        # Cached responses still point at the originals
+        response_cache.invalidate()
+    return len(done)
+
+
+def _render_in_background(paths):
+    try:
+        render_images(paths, get_executor())
+    except Exception:
+        logger.exception('Image derivative job failed')
+    finally:
+        # This thread's own connection; not reused by request handling
+        connection.close()
+
+
+def enqueue(paths):
+    """Render derivatives of the given manifest paths once the current transaction commits"""
+    paths = list(paths)
+    if not paths:
+        return
+
+    def start():
+        if settings.IMAGE_DERIVATIVE_WORKERS:
+            threading.Thread(target=_render_in_background, args=(paths,), daemon=True).start()
+        else:
+            render_images(paths)
+
+    transaction.on_commit(start)
@@ -0,0 +1,364 @@
+"""
+In-process facet index for the product list.
+
+For every facet value (brand, RAM, ROM, color, price band, in stock) the index keeps
+a bitmap - a Python int with bit ``product_id`` set - of the products having at least
+one variant with that value (brand is per product), and for the variant facets a
+second bitmap over variant ids. RAM / ROM / color / price band come from the active
+variants; in stock from every variant, like ``Product.has_stock``. Filtering is a few
+AND/ORs of bitmaps and a count is ``bit_count()``, so facet counts never run
+``GROUP BY`` over variants and inventory. Several variant facets must hold for one
+variant (8GB and Blue means an 8GB Blue variant), so they are ANDed over the variant
+bitmaps and the result is mapped to its products.
+
+The index is built lazily with two queries, then updated per product from the shared
+feed of committed writes (``index_changes``) before each read: old values are diffed
+against new ones and only those bits flip. Each worker process owns its copy; the
+feed brings in writes made by other processes, and a rebuild after
+``FACET_INDEX_MAX_AGE`` seconds backs it up when the cache is not shared.
+"""
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from . import index_changes
+
+
+# Facets answered by the index, in response order
+FACETS = ('brand', 'ram', 'rom', 'color', 'price_band', 'in_stock')
+
+# Facets of a variant (brand is a facet of the product)
+VARIANT_FACETS = ('ram', 'rom', 'color', 'price_band', 'in_stock')
+
+# Price bands: key -> [low, high) in VND
+PRICE_BANDS = {
+    'under-5m': (0, 5000000),
+    '5m-10m': (5000000, 10000000),
+    '10m-20m': (10000000, 20000000),
+    '20m-30m': (20000000, 30000000),
+    'over-30m': (30000000, None),
+}
+
+_ONE_BITS = re.compile('1')
+
+
+def price_band(price):
+    for key, (low, high) in PRICE_BANDS.items():
+        if price >= low and (high is None or price < high):
+            return key
+    return None
+
+
+def bitmap_ids(bitmap):
+    """Ids of the set bits of a bitmap"""
+    bits = bin(bitmap)[:1:-1]  # Least significant bit first
+    return [match.start() for match in _ONE_BITS.finditer(bits)]
+
+
+def parse_selection(params):
+    """{facet: set of values} from comma-separated query parameters"""
+    selection = {}
+    for facet in FACETS:
+        raw = params.get(facet)
+        if raw:
+            values = {value.strip() for value in raw.split(',') if value.strip()}
+            if values:
+                selection[facet] = values
+    return selection
+
+
+class FacetIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.bitmaps = {facet: {} for facet in FACETS}                  # facet -> value -> product bitmap
+        self.variant_bitmaps = {facet: {} for facet in VARIANT_FACETS}  # facet -> value -> variant bitmap
+        self.product_values = {}                                         # product id -> {(facet, value)}
+        self.variant_values = {}                                         # variant id -> {(facet, value)}
+        self.variant_product = {}                                        # variant id -> product id
+        self.product_variants = {}                                       # product id -> {variant id}
+        self.all_products = 0
+        self.active_products = 0
+        self.built_at = None
+        self.position = None
+
+    @property
+    def is_built(self):
+        return self.built_at is not None
+
+    def _ensure_fresh(self):
+        max_age = getattr(settings, 'FACET_INDEX_MAX_AGE', 300)
+        if not self.is_built or time.monotonic() - self.built_at > max_age:
+            self.build()
+            return
+        position, product_ids, variant_ids = index_changes.changes_since(self.position)
+        if product_ids is None:
+            self.build()
+        elif position != self.position:
+            self.refresh_products(product_ids | self._products_of_variants(variant_ids))
+            self.position = position
+
+    # Queries --------------------------------------------------------------
+
+    def base(self, is_active=None, product_ids=None):
+        """Bitmap of all products, optionally limited by is_active and an id list"""
+        self._ensure_fresh()
+        if is_active is None:
+            bitmap = self.all_products
+        elif is_active:
+            bitmap = self.active_products
+        else:
+            bitmap = self.all_products & ~self.active_products
+        if product_ids is not None:
+            bitmap &= self.to_bitmap(product_ids)
+        return bitmap
+
+    @staticmethod
+    def to_bitmap(ids):
+        """Bitmap of an id list (set in a bytearray: ``|=`` on a big int copies it each time)"""
+        ids = list(ids)
+        if not ids:
+            return 0
+        buffer = bytearray(max(ids) // 8 + 1)
+        for member_id in ids:
+            buffer[member_id >> 3] |= 1 << (member_id & 7)
+        return int.from_bytes(buffer, 'little')
+
+    def products_of(self, variant_bitmap):
+        """Bitmap of the products of the variants of a variant bitmap"""
+        if not variant_bitmap:
+            return 0
+        products = map(self.variant_product.get, bitmap_ids(variant_bitmap))
+        # A variant removed meanwhile maps to None
+        return self.to_bitmap({product_id for product_id in products if product_id is not None})
+
+    @staticmethod
+    def facet_match(facet, values, bitmaps):
+        """Members of ``bitmaps`` (products or variants) having any of the values of one facet"""
+        bitmap = 0
+        for value in values:
+            bitmap |= bitmaps[facet].get(value, 0)
+        return bitmap
+
+    def variant_match(self, selection, facets, variant_bitmaps):
+        """Variants matching the selection of every facet in ``facets``"""
+        bitmap = None
+        for facet in facets:
+            matched = self.facet_match(facet, selection[facet], variant_bitmaps)
+            bitmap = matched if bitmap is None else bitmap & matched
+        return bitmap or 0
+
+    def match(self, selection, base, exclude=None, snapshot=None):
+        """
+        Products of ``base`` matching every selected facet except ``exclude``, the variant
+        facets all on one variant. ``snapshot`` is a (bitmaps, variant_bitmaps) copy.
+        """
+        bitmaps, variant_bitmaps = snapshot or (self.bitmaps, self.variant_bitmaps)
+        selected = {facet: values for facet, values in selection.items() if facet in FACETS and facet != exclude}
+        variant_facets = [facet for facet in selected if facet in VARIANT_FACETS]
+        bitmap = base
+        for facet, values in selected.items():
+            # A lone variant facet needs any variant with the value: the product bitmap says so
+            if facet not in VARIANT_FACETS or len(variant_facets) == 1:
+                bitmap &= self.facet_match(facet, values, bitmaps)
+        if len(variant_facets) > 1:
+            bitmap &= self.products_of(self.variant_match(selected, variant_facets, variant_bitmaps))
+        return bitmap
+
+    def counts(self, selection, base):
+        """
+        Result count per facet value. Each facet is counted with the other facets'
+        selections applied but not its own, so alternatives stay visible.
+        """
+        self._ensure_fresh()
+        # Counted on a snapshot: refreshes flip bits and drop values meanwhile
+        with self._lock:
+            snapshot = (
+                {facet: dict(values) for facet, values in self.bitmaps.items()},
+                {facet: dict(values) for facet, values in self.variant_bitmaps.items()},
+            )
+        bitmaps, variant_bitmaps = snapshot
+        selection = {facet: values for facet, values in selection.items() if facet in FACETS}
+        counts = {}
+        for facet in FACETS:
+            others = [other for other in selection if other in VARIANT_FACETS and other != facet]
+            if facet in VARIANT_FACETS and others:
+                # A value counts the products with a variant having it and the other selected values
+                scope = self.match(
+                    {other: values for other, values in selection.items() if other not in VARIANT_FACETS},
+                    base, snapshot=snapshot,
+                )
+                variants = self.variant_match(selection, others, variant_bitmaps)
+                values = (
+                    (value, (scope & self.products_of(variants & bitmap)).bit_count())
+                    for value, bitmap in sorted(variant_bitmaps[facet].items())
+                )
+            else:
+                scope = self.match(selection, base, exclude=facet, snapshot=snapshot)
+                values = ((value, (scope & bitmap).bit_count()) for value, bitmap in sorted(bitmaps[facet].items()))
+            counts[facet] = {value: count for value, count in values if count}
+        return counts
+
+    # Maintenance ----------------------------------------------------------
+
+    _VARIANT_FIELDS = ('id', 'product_id', 'is_active', 'ram', 'rom', 'color', 'price', 'inventory__on_hand')
+
+    def build(self):
+        """Load every product and variant"""
+        from .models import Product, ProductVariant
+
+        # Taken first: writes committed while loading are applied again afterwards
+        position = index_changes.current_position()
+        products = Product.objects.values_list('id', 'brand_id', 'is_active')
+        variants = ProductVariant.objects.values_list(*self._VARIANT_FIELDS)
+
+        # Built aside and swapped in, so readers never see a half-built index
+        product_values = {}
+        variant_values = {}
+        variant_product = {}
+        product_variants = {}
+        active = []
+        for product_id, brand_id, is_active in products.iterator():
+            product_values[product_id] = {('brand', str(brand_id))}
+            product_variants[product_id] = set()
+            if is_active:
+                active.append(product_id)
+        for row in variants.iterator():
+            variant_id, product_id = row[:2]
+            if product_id in product_values:
+                values = self._variant_values(row)
+                variant_values[variant_id] = values
+                variant_product[variant_id] = product_id
+                product_variants[product_id].add(variant_id)
+                product_values[product_id].update(values)
+
+        bitmaps = {facet: {} for facet in FACETS}
+        for (facet, value), product_ids in self._members(product_values).items():
+            bitmaps[facet][value] = self.to_bitmap(product_ids)
+        variant_bitmaps = {facet: {} for facet in VARIANT_FACETS}
+        for (facet, value), variant_ids in self._members(variant_values).items():
+            variant_bitmaps[facet][value] = self.to_bitmap(variant_ids)
+
+        with self._lock:
+            self.bitmaps = bitmaps
+            self.variant_bitmaps = variant_bitmaps
+            self.product_values = {product_id: values for product_id, values in product_values.items() if values}
+            self.variant_values = {variant_id: values for variant_id, values in variant_values.items() if values}
+            self.variant_product = variant_product
+            self.product_variants = product_variants
+            self.all_products = self.to_bitmap(product_values)
+            self.active_products = self.to_bitmap(active)
+            self.built_at = time.monotonic()
+            self.position = position
+
+    def refresh_products(self, product_ids):
+        """Re-read the given products with their variants and flip the bits whose values changed"""
+        if not self.is_built:
+            return
+        from .models import Product, ProductVariant
+
+        product_ids = list(product_ids)
+        products = {
+            product_id: (brand_id, is_active) for product_id, brand_id, is_active in
+            Product.objects.filter(pk__in=product_ids).values_list('id', 'brand_id', 'is_active')
+        }
+        variants = {}
+        for row in ProductVariant.objects.filter(product_id__in=products).values_list(*self._VARIANT_FIELDS):
+            variants.setdefault(row[1], {})[row[0]] = self._variant_values(row)
+
+        with self._lock:
+            for product_id in product_ids:
+                bit = 1 << product_id
+                if product_id in products:
+                    self.all_products |= bit
+                    if products[product_id][1]:
+                        self.active_products |= bit
+                    else:
+                        self.active_products &= ~bit
+                else:
+                    self.all_products &= ~bit
+                    self.active_products &= ~bit
+
+                product_variants = variants.get(product_id, {})
+                for variant_id in self.product_variants.pop(product_id, set()) - set(product_variants):
+                    self.variant_product.pop(variant_id, None)
+                    self._set_values(self.variant_bitmaps, self.variant_values, variant_id, set())
+                values = set()
+                for variant_id, variant_values in product_variants.items():
+                    self.variant_product[variant_id] = product_id
+                    self._set_values(self.variant_bitmaps, self.variant_values, variant_id, variant_values)
+                    values.update(variant_values)
+                if product_id in products:
+                    self.product_variants[product_id] = set(product_variants)
+                    values.add(('brand', str(products[product_id][0])))
+                self._set_values(self.bitmaps, self.product_values, product_id, values)
+
+    def refresh_variants(self, variant_ids):
+        """Refresh the products of the given variants"""
+        if not self.is_built:
+            return
+        self.refresh_products(self._products_of_variants(variant_ids))
+
+    # Internals ------------------------------------------------------------
+
+    def _products_of_variants(self, variant_ids):
+        known = self.variant_product
+        product_ids = {known[variant_id] for variant_id in variant_ids if variant_id in known}
+        unknown = [variant_id for variant_id in variant_ids if variant_id not in known]
+        if unknown:
+            from .models import ProductVariant
+
+            product_ids.update(ProductVariant.objects.filter(pk__in=unknown).values_list('product_id', flat=True))
+        return product_ids
+
+    @staticmethod
+    def _variant_values(row):
+        _, _, is_active, ram, rom, color, price, on_hand = row
+        values = set()
+        if on_hand and on_hand > 0:
+            values.add(('in_stock', '1'))
+        if not is_active:
+            return values
+        if ram:
+            values.add(('ram', ram))
+        if rom:
+            values.add(('rom', rom))
+        if color:
+            values.add(('color', color))
+        band = price_band(price)
+        if band:
+            values.add(('price_band', band))
+        return values
+
+    @staticmethod
+    def _members(values_by_id):
+        """{(facet, value): [ids]} of {id: {(facet, value)}}"""
+        members = {}
+        for member_id, values in values_by_id.items():
+            for key in values:
+                members.setdefault(key, []).append(member_id)
+        return members
+
+    @staticmethod
+    def _set_values(bitmaps, values_by_id, member_id, values):
+        bit = 1 << member_id
+        old_values = values_by_id.get(member_id, set())
+        for facet, value in old_values - values:
+            bitmap = bitmaps[facet][value] & ~bit
+            if bitmap:
+                bitmaps[facet][value] = bitmap
+            else:
+                del bitmaps[facet][value]
+        for facet, value in values - old_values:
+            bitmaps[facet][value] = bitmaps[facet].get(value, 0) | bit
+        if values:
+            values_by_id[member_id] = values
+        else:
+            values_by_id.pop(member_id, None)
+
+
+facet_index = FacetIndex()
@@ -0,0 +1,176 @@
+"""
+Product image storage helpers.
+
+Variant images live on disk under ``assets/images/products/{product_id}/{variant_id}/N.jpg``.
+The ``VariantImage`` table is the manifest of those files so that serializers never
+have to touch the filesystem.
+
+Uploads are stored by content: ``images/blobs/ab/<sha256>.<ext>``. Identical files
+(the same stock photo on every color variant) are kept once, and a blob URL never
+changes content, so it can be cached forever. ``N.jpg`` paths from before remain
+valid manifest entries.
+
+Each image also gets resized, metadata-free derivatives (``derived/N_thumb.webp`` ...)
+rendered in the background by ``apps.catalog.derivatives``.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+
+
+PRODUCT_IMAGES_DIR = 'images/products'
+BLOBS_DIR = 'images/blobs'
+
+# Derivatives rendered for every variant image: size name -> bounding box
+DERIVATIVE_SIZES = {
+    'thumb': (200, 200),
+    'medium': (800, 800),
+}
+# Derivative file extension -> Pillow format
+DERIVATIVE_FORMATS = {
+    'webp': 'WEBP',
+    'jpg': 'JPEG',
+}
+DERIVATIVE_QUALITY = 80
+
+
+def variant_image_relpath(product_id, variant_id, file_name):
+    """Path of a variant image relative to ASSETS_ROOT"""
+    return f'{PRODUCT_IMAGES_DIR}/{product_id}/{variant_id}/{file_name}'
+
+
+def variant_image_dir(product_id, variant_id):
+    """Absolute directory holding the images of a variant"""
+    return os.path.join(settings.ASSETS_ROOT, PRODUCT_IMAGES_DIR, str(product_id), str(variant_id))
+
+
+def blob_relpath(digest, extension):
+    """Path of a content-addressed file relative to ASSETS_ROOT"""
+    return f'{BLOBS_DIR}/{digest[:2]}/{digest}.{extension}'
+
+
+def is_blob(relpath):
+    return relpath.startswith(f'{BLOBS_DIR}/')
+
+
+def store_blob(chunks, extension):
+    """
+    Store content (an iterable of bytes, e.g. ``upload.chunks()``) by its SHA-256 and
+    return the relative path; an existing blob with the same content is reused.
+    """
+    blobs_root = os.path.join(settings.ASSETS_ROOT, BLOBS_DIR)
+    os.makedirs(blobs_root, exist_ok=True)
+
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=blobs_root, suffix='.part', delete=False) as temporary:
+        for chunk in chunks:
+            digest.update(chunk)
+            temporary.write(chunk)
+
+    relpath = blob_relpath(digest.hexdigest(), extension)
+    target = os.path.join(settings.ASSETS_ROOT, relpath)
+    if os.path.exists(target):
+        os.remove(temporary.name)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(temporary.name, target)
+    return relpath
+
+
+def release_file(relpath):
+    """
+    Delete an image file (and its derivatives) once nothing references it. Blobs may
+    be shared by several variants and brands; call after removing the reference.
+    """
+    from .models import Brand, VariantImage
+
+    if is_blob(relpath) and (
+        VariantImage.objects.filter(path=relpath).exists()
+        or Brand.objects.filter(logo=relpath).exists()
+    ):
+        return
+
+    path = os.path.join(settings.ASSETS_ROOT, relpath)
+    if os.path.exists(path):
+        os.remove(path)
+    remove_derivatives(relpath)
+
+
+def asset_url(relpath):
+    """Public URL of a file stored under ASSETS_ROOT"""
+    return f'{settings.ASSETS_URL}{relpath}'
+
+
+def image_number(file_name):
+    """Sequence number encoded in an image file name (``3.jpg`` -> 3), or None"""
+    stem = file_name.split('.')[0]
+    return int(stem) if stem.isdigit() else None
+
+
+def scan_variant_images(product_id, variant_id):
+    """
+    List the ``.jpg`` files of a variant directory as (file_name, sort_order) pairs.
+    Only used to (re)build the manifest - request handling reads the manifest.
+    """
+    folder = variant_image_dir(product_id, variant_id)
+    if not os.path.isdir(folder):
+        return []
+
+    entries = []
+    for file_name in sorted(os.listdir(folder)):
+        if file_name.endswith('.jpg'):
+            entries.append((file_name, image_number(file_name) or 0))
+    return entries
+
+
+def derivative_relpath(relpath, size, extension):
+    """Path of a derivative of the image at ``relpath`` (both relative to ASSETS_ROOT)"""
+    folder, file_name = relpath.rsplit('/', 1)
+    stem = file_name.rsplit('.', 1)[0]
+    return f'{folder}/derived/{stem}_{size}.{extension}'
+
+
+def derivative_urls(relpath):
+    """URLs of every derivative of an image: {size: {extension: url}}"""
+    return {
+        size: {
+            extension: asset_url(derivative_relpath(relpath, size, extension))
+            for extension in DERIVATIVE_FORMATS
+        }
+        for size in DERIVATIVE_SIZES
+    }
+
+
+def render_derivatives(assets_root, relpath):
+    """
+    Write every derivative of one image. Runs in a worker process, so it takes the
+    assets root as an argument instead of reading settings.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(os.path.join(assets_root, relpath)) as original:
+        # Apply the EXIF rotation before it is dropped with the rest of the metadata
+        image = ImageOps.exif_transpose(original).convert('RGB')
+
+    for size, box in DERIVATIVE_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail(box, Image.LANCZOS)
+        for extension, image_format in DERIVATIVE_FORMATS.items():
+            target = os.path.join(assets_root, derivative_relpath(relpath, size, extension))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Saved without exif/icc_profile, so no camera metadata is copied over;
+            # written aside and renamed so readers never see a partial file
+            partial = f'{target}.part'
+            resized.save(partial, image_format, quality=DERIVATIVE_QUALITY, optimize=True)
+            os.replace(partial, target)
+
+
+def remove_derivatives(relpath):
+    """Delete the derivative files of an image"""
+    for size in DERIVATIVE_SIZES:
+        for extension in DERIVATIVE_FORMATS:
+            path = os.path.join(settings.ASSETS_ROOT, derivative_relpath(relpath, size, extension))
+            if os.path.exists(path):
+                os.remove(path)
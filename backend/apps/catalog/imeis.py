@@ -0,0 +1,109 @@
+"""
+IMEI registration and lookup.
+
+A received shipment registers its IMEIs against the ``StockInItem`` they arrived on.
+The batch is validated in memory (15 digits, Luhn check digit, no repeats), checked
+against the IMEIs already stored with one ``imei IN (...)`` pass over the unique
+index, and written with ``bulk_create``. Nothing is written when any IMEI is invalid,
+so a scanned batch can be fixed and sent again as a whole.
+"""
+from django.db import IntegrityError, transaction
+
+
+IMEI_LENGTH = 15
+MAX_BATCH = 10000
+QUERY_CHUNK = 1000
+
+# Digit -> digit sum of the doubled digit, for the Luhn positions that are doubled
+_DOUBLED = {str(digit): sum(divmod(digit * 2, 10)) for digit in range(10)}
+
+
+class ImeiBatchError(Exception):
+    """The batch was rejected; ``errors`` lists {'imei', 'error'} entries"""
+
+    def __init__(self, errors):
+        super().__init__('Invalid IMEI batch')
+        self.errors = errors
+
+
+def normalize_imei(value):
+    """Strip the separators scanners and spreadsheets add ('35-209900-176148-1')"""
+    return ''.join(str(value).split()).replace('-', '')
+
+
+def luhn_valid(imei):
+    """Luhn check over a digit string (every second digit from the right is doubled)"""
+    body = imei[-2::-2]
+    total = sum(map(int, imei[-1::-2])) + sum(_DOUBLED[digit] for digit in body)
+    return total % 10 == 0
+
+
+def validate_batch(imeis):
+    """Normalized IMEIs and per-IMEI errors (format, check digit, repeats within the batch)"""
+    valid = []
+    errors = []
+    seen = set()
+    for raw in imeis:
+        imei = normalize_imei(raw)
+        if len(imei) != IMEI_LENGTH or not imei.isdigit():
+            errors.append({'imei': raw, 'error': f'IMEI must be {IMEI_LENGTH} digits'})
+        elif not luhn_valid(imei):
+            errors.append({'imei': raw, 'error': 'Invalid check digit'})
+        elif imei in seen:
+            errors.append({'imei': raw, 'error': 'Repeated in this batch'})
+        else:
+            seen.add(imei)
+            valid.append(imei)
+    return valid, errors
+
+
+def existing_imeis(imeis):
+    """The given IMEIs that are already registered"""
+    from .models import Imei
+
+    found = set()
+    for start in range(0, len(imeis), QUERY_CHUNK):
+        found.update(
+            Imei.objects.filter(imei__in=imeis[start:start + QUERY_CHUNK]).values_list('imei', flat=True)
+        )
+    return found
+
+
+@transaction.atomic
+def register_imeis(stock_in_item, imeis):
+    """Register a batch against a stock-in line; returns the number created or raises ImeiBatchError"""
+    from .models import Imei
+
+    valid, errors = validate_batch(imeis)
+    for imei in sorted(existing_imeis(valid)):
+        errors.append({'imei': imei, 'error': 'Already registered'})
+    if errors:
+        raise ImeiBatchError(errors)
+
+    registered = Imei.objects.filter(stock_in_item=stock_in_item).count()
+    if registered + len(valid) > stock_in_item.qty:
+        raise ImeiBatchError([{
+            'imei': None,
+            'error': f'Stock-in line has {stock_in_item.qty} units and {registered} IMEIs registered',
+        }])
+
+    try:
+        with transaction.atomic():
+            Imei.objects.bulk_create([
+                Imei(imei=imei, product_variant_id=stock_in_item.product_variant_id, stock_in_item=stock_in_item)
+                for imei in valid
+            ], batch_size=QUERY_CHUNK)
+    except IntegrityError:
+        # Registered by a concurrent request between the check and the insert
+        raise ImeiBatchError([{'imei': None, 'error': 'Some IMEIs were registered concurrently, retry'}])
+    return len(valid)
+
+
+def lookup_imei(imei):
+    """The IMEI row with its variant and product (unique-index point lookup), or None"""
+    from .models import Imei
+
+    try:
+        return Imei.objects.select_related('product_variant__product').get(imei=normalize_imei(imei))
+    except Imei.DoesNotExist:
+        return None
@@ -0,0 +1,281 @@
+"""
+Bulk catalog import from CSV or XLSX.
+
+One row per variant; rows sharing ``product_sku`` belong to the same product, which is
+created from its first valid row (or reused when the SKU already exists). Columns:
+
+    product_sku, variant_sku, price        required
+    name, brand                            required for new products (brand = name or slug)
+    barcode, description, ram, rom, color  optional
+    stock                                  optional opening stock (default 0)
+
+The file is streamed row by row. Existing SKUs are held in memory as sets, valid rows
+are buffered and written with ``bulk_create`` every ``batch_size`` rows, and the whole
+import runs in one transaction. Invalid rows are skipped and reported by row number.
+"""
+import csv
+import io
+import os
+import zipfile
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Only the first errors are kept in the report; error_count still counts every row
+MAX_REPORTED_ERRORS = 1000
+
+REQUIRED_COLUMNS = {'product_sku', 'variant_sku', 'price'}
+
+# Largest accepted price (12 digit column) and stock (integer column)
+MAX_PRICE = 10 ** 12 - 1
+MAX_STOCK = 2 ** 31 - 1
+
+# Longest accepted value per column (the model field lengths)
+MAX_LENGTHS = {
+    'product_sku': 50, 'variant_sku': 50, 'name': 200, 'barcode': 50,
+    'ram': 20, 'rom': 20, 'color': 50,
+}
+
+
+class ImportFileError(Exception):
+    """The file itself cannot be imported (format, header)"""
+
+
+def read_rows(file, file_name):
+    """Yield the rows of an uploaded/opened binary file as lists of strings"""
+    extension = os.path.splitext(file_name or '')[1].lower()
+
+    if extension == '.csv':
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        try:
+            yield from csv.reader(text)
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise ImportFileError(f'Invalid CSV file: {exc}')
+    elif extension == '.xlsx':
+        try:
+            from openpyxl import load_workbook
+            from openpyxl.utils.exceptions import InvalidFileException
+        except ImportError:
+            raise ImportFileError('XLSX import requires the openpyxl package')
+        try:
+            workbook = load_workbook(file, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, InvalidFileException, KeyError) as exc:
+            # KeyError: a zip archive without the parts of a workbook
+            raise ImportFileError(f'Invalid XLSX file: {exc}')
+        try:
+            for values in workbook.active.iter_rows(values_only=True):
+                yield ['' if value is None else str(value) for value in values]
+        finally:
+            workbook.close()
+    else:
+        raise ImportFileError('Unsupported file type (use .csv or .xlsx)')
+
+
+def _integer(value, field, maximum):
+    """Parse a whole number in [0, maximum] (spreadsheets may send '1500000.0')"""
+    try:
+        number = Decimal(value.replace(',', '')) if value else Decimal(0)
+    except InvalidOperation:
+        raise ValueError(f'{field} must be a number')
+    if number < 0 or number != number.to_integral_value():
+        raise ValueError(f'{field} must be a whole number >= 0')
+    if number > maximum:
+        raise ValueError(f'{field} must be at most {maximum}')
+    return int(number)
+
+
+def folded_key(product_sku, ram, rom, color):
+    """Case-folded (product sku, ram, rom, color) of a variant"""
+    return tuple((value or '').casefold() for value in (product_sku, ram, rom, color))
+
+
+class CatalogImporter:
+    """Streams rows into Product / ProductVariant / Inventory with bulk_create"""
+
+    def __init__(self, user=None, batch_size=DEFAULT_BATCH_SIZE):
+        from .models import Brand, Product, ProductVariant
+
+        self.user = user
+        self.batch_size = batch_size
+
+        brands = Brand.objects.values_list('id', 'name', 'slug')
+        self.brand_ids = {}
+        for brand_id, name, slug in brands:
+            self.brand_ids[name.lower()] = brand_id
+            self.brand_ids[slug.lower()] = brand_id
+
+        # SKUs and option values are keyed case-folded: MySQL compares them without case
+        self.product_ids = {
+            sku.casefold(): product_id for sku, product_id in Product.objects.values_list('sku', 'id')
+        }
+        self.variant_skus = set()
+        self.variant_keys = set()   # (product sku, ram, rom, color), case-folded
+        product_skus = {product_id: sku for sku, product_id in self.product_ids.items()}
+        for sku, product_id, ram, rom, color in ProductVariant.objects.values_list(
+            'sku', 'product_id', 'ram', 'rom', 'color'
+        ).iterator():
+            self.variant_skus.add(sku.casefold())
+            self.variant_keys.add(folded_key(product_skus[product_id], ram, rom, color))
+
+        self.new_products = {}      # case-folded product sku -> unsaved Product of the current batch
+        self.new_variants = []      # (unsaved ProductVariant, case-folded product sku, opening stock)
+        self.changed_product_ids = set()
+
+        self.rows = 0
+        self.created_products = 0
+        self.created_variants = 0
+        self.errors = []
+        self.error_count = 0
+
+    def run(self, rows, dry_run=False):
+        """Import an iterable of rows (the first one is the header); returns the report"""
+        from .signals import products_bulk_changed
+        from .models import Product, ProductVariant
+
+        rows = iter(rows)
+        header = [column.strip().lower().replace(' ', '_') for column in next(rows, [])]
+        missing = REQUIRED_COLUMNS.difference(header)
+        if missing:
+            raise ImportFileError(f'Missing columns: {", ".join(sorted(missing))}')
+
+        with transaction.atomic():
+            for row_number, values in enumerate(rows, start=2):
+                if not any(value.strip() for value in values):
+                    continue
+                self.rows += 1
+                record = {
+                    column: value.strip() for column, value in zip(header, values)
+                }
+                try:
+                    self.add_row(record)
+                except ValueError as exc:
+                    self.error_count += 1
+                    if len(self.errors) < MAX_REPORTED_ERRORS:
+                        self.errors.append({'row': row_number, 'error': str(exc)})
+                if len(self.new_variants) >= self.batch_size:
+                    self.flush()
+            self.flush()
+
+            if dry_run:
+                transaction.set_rollback(True)
+            elif self.changed_product_ids:
+                product_ids = list(self.changed_product_ids)
+                Product.refresh_summaries(product_ids)
+                ProductVariant.refresh_display_names(product_ids)
+                products_bulk_changed.send(sender=Product, product_ids=product_ids)
+
+        return self.report(dry_run)
+
+    def add_row(self, record):
+        """Validate one row and buffer its product/variant; raises ValueError"""
+        from .models import Product, ProductVariant
+
+        for field, max_length in MAX_LENGTHS.items():
+            if len(record.get(field, '')) > max_length:
+                raise ValueError(f'{field} is longer than {max_length} characters')
+
+        product_sku = record.get('product_sku', '')
+        variant_sku = record.get('variant_sku', '')
+        if not product_sku or not variant_sku:
+            raise ValueError('product_sku and variant_sku are required')
+        if variant_sku.casefold() in self.variant_skus:
+            raise ValueError(f'Variant SKU {variant_sku} already exists')
+
+        ram, rom, color = record.get('ram', ''), record.get('rom', ''), record.get('color', '')
+        key = folded_key(product_sku, ram, rom, color)
+        if key in self.variant_keys:
+            raise ValueError('A variant with the same RAM/ROM/color already exists for this product')
+
+        price = _integer(record.get('price', ''), 'price', MAX_PRICE)
+        stock = _integer(record.get('stock', ''), 'stock', MAX_STOCK)
+
+        product_key = product_sku.casefold()
+        if product_key not in self.product_ids and product_key not in self.new_products:
+            name = record.get('name', '')
+            if not name:
+                raise ValueError('name is required for a new product')
+            brand_id = self.brand_ids.get(record.get('brand', '').lower())
+            if brand_id is None:
+                raise ValueError(f'Unknown brand "{record.get("brand", "")}"')
+            self.new_products[product_key] = Product(
+                sku=product_sku,
+                name=name,
+                brand_id=brand_id,
+                barcode=record.get('barcode') or None,
+                description=record.get('description') or None,
+                created_by=self.user,
+            )
+
+        self.variant_skus.add(variant_sku.casefold())
+        self.variant_keys.add(key)
+        self.new_variants.append((
+            ProductVariant(
+                sku=variant_sku,
+                ram=ram or None,
+                rom=rom or None,
+                color=color or None,
+                price=price,
+            ),
+            product_key,
+            stock,
+        ))
+
+    def flush(self):
+        """Write the buffered batch"""
+        from apps.inventory.ledger import StockChange, apply_stock_changes
+        from apps.inventory.models import Inventory
+        from .models import Product, ProductVariant
+
+        if self.new_products:
+            Product.objects.bulk_create(self.new_products.values())
+            # MySQL does not return ids from bulk inserts, so read them back by SKU
+            self.product_ids.update(
+                (sku.casefold(), product_id) for sku, product_id in Product.objects.filter(
+                    sku__in=[product.sku for product in self.new_products.values()]
+                ).values_list('sku', 'id')
+            )
+            self.created_products += len(self.new_products)
+            self.new_products = {}
+
+        if not self.new_variants:
+            return
+
+        for variant, product_key, stock in self.new_variants:
+            variant.product_id = self.product_ids[product_key]
+            self.changed_product_ids.add(variant.product_id)
+        ProductVariant.objects.bulk_create([variant for variant, _, _ in self.new_variants])
+
+        stock_by_sku = {variant.sku: stock for variant, _, stock in self.new_variants}
+        variant_ids = dict(
+            ProductVariant.objects.filter(sku__in=list(stock_by_sku)).values_list('sku', 'id')
+        )
+        # New variants get an empty inventory row; the opening stock goes through the ledger
+        Inventory.objects.bulk_create([
+            Inventory(product_variant_id=variant_ids[sku], on_hand=0) for sku in stock_by_sku
+        ])
+        apply_stock_changes([
+            StockChange(variant_ids[sku], stock, 'CatalogImport', variant_ids[sku])
+            for sku, stock in stock_by_sku.items()
+        ])
+
+        self.created_variants += len(self.new_variants)
+        self.new_variants = []
+
+    def report(self, dry_run=False):
+        return {
+            'rows': self.rows,
+            'created_products': self.created_products,
+            'created_variants': self.created_variants,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'dry_run': dry_run,
+        }
+
+
+def import_catalog(file, file_name, user=None, dry_run=False, batch_size=DEFAULT_BATCH_SIZE):
+    """Import a CSV/XLSX file; raises ImportFileError when the file cannot be read"""
+    importer = CatalogImporter(user=user, batch_size=batch_size)
+    return importer.run(read_rows(file, file_name), dry_run=dry_run)
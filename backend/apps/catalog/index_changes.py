@@ -0,0 +1,75 @@
+"""
+Shared feed of committed catalog writes for the in-process indexes (facet index, scan
+index).
+
+Each committed write is published under a numbered entry in the cache (the number
+comes from ``incr`` on a shared counter) holding the ids of the products and variants
+it touched. An index remembers the number it is up to date with; before answering it
+reads the counter - one cache read, no database access - and when the counter moved it
+fetches the entries in between with one ``get_many`` and reloads only those products
+and variants. A missing entry (evicted, or not yet written by its publisher), a lost
+counter or a backlog over ``MAX_CATCH_UP`` entries makes the index rebuild instead.
+
+With a cache backend shared by the workers, a write made by any process is seen by the
+next read in all of them; the indexes' max age remains as a backstop for per-process
+caches.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+POSITION_KEY = 'catalog:index:position'
+ENTRY_KEY = 'catalog:index:change:{position}'
+
+# Entries an index catches up on before a rebuild is cheaper
+MAX_CATCH_UP = 500
+ENTRY_TIMEOUT = 24 * 60 * 60
+
+
+def current_position():
+    position = cache.get(POSITION_KEY)
+    if position is None:
+        # Seeded from the clock so a lost counter cannot reuse the numbers of old entries
+        cache.add(POSITION_KEY, int(time.time() * 1000), None)
+        position = cache.get(POSITION_KEY)
+    return position
+
+
+def publish(product_ids=(), variant_ids=()):
+    """Publish a committed write of the given products / variants"""
+    try:
+        position = cache.incr(POSITION_KEY)
+    except ValueError:
+        current_position()
+        position = cache.incr(POSITION_KEY)
+    cache.set(ENTRY_KEY.format(position=position), (list(product_ids), list(variant_ids)), ENTRY_TIMEOUT)
+
+
+def publish_on_commit(product_ids=(), variant_ids=()):
+    """``publish`` once the current transaction commits (readers must see the new rows)"""
+    product_ids, variant_ids = list(product_ids), list(variant_ids)
+    transaction.on_commit(lambda: publish(product_ids, variant_ids))
+
+
+def changes_since(position):
+    """
+    ``(current position, product ids, variant ids)`` written after ``position``; the ids
+    are None when the entries in between are not all available (rebuild)
+    """
+    current = current_position()
+    if current == position:
+        return current, set(), set()
+    if current < position or current - position > MAX_CATCH_UP:
+        return current, None, None
+
+    keys = [ENTRY_KEY.format(position=number) for number in range(position + 1, current + 1)]
+    entries = cache.get_many(keys)
+    if len(entries) < len(keys):
+        return current, None, None
+    product_ids, variant_ids = set(), set()
+    for entry_products, entry_variants in entries.values():
+        product_ids.update(entry_products)
+        variant_ids.update(entry_variants)
+    return current, product_ids, variant_ids
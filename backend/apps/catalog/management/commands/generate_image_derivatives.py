@@ -0,0 +1,28 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from apps.catalog.derivatives import render_images
+from apps.catalog.models import VariantImage
+
+
+class Command(BaseCommand):
+    help = 'Render thumbnails/WebP derivatives for variant images that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-render every image')
+        parser.add_argument('--workers', type=int, default=4, help='Worker processes (0 = inline)')
+
+    def handle(self, *args, **options):
+        images = VariantImage.objects.all()
+        if not options['all']:
+            images = images.filter(has_derivatives=False)
+        paths = list(images.values_list('path', flat=True).distinct())
+
+        if options['workers']:
+            with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+                done = render_images(paths, executor)
+        else:
+            done = render_images(paths)
+
+        self.stdout.write(self.style.SUCCESS(f'Rendered derivatives for {done} of {len(paths)} images'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.catalog.importer import DEFAULT_BATCH_SIZE, ImportFileError, import_catalog
+
+
+class Command(BaseCommand):
+    help = 'Import products, variants and opening stock from a CSV/XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to a .csv or .xlsx file')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, roll back all writes')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_catalog(
+                    file, options['path'],
+                    dry_run=options['dry_run'], batch_size=options['batch_size']
+                )
+        except (OSError, ImportFileError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['error']}")
+        if report['error_count'] > len(report['errors']):
+            self.stderr.write(f"... {report['error_count'] - len(report['errors'])} more errors")
+
+        prefix = '[dry run] ' if report['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{report['rows']} rows: {report['created_products']} products and "
+            f"{report['created_variants']} variants created, {report['error_count']} rows skipped"
+        ))
@@ -0,0 +1,71 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.catalog.images import BLOBS_DIR, release_file, store_blob
+from apps.catalog.models import Brand, VariantImage
+
+
+def read_chunks(path, chunk_size=64 * 1024):
+    with open(path, 'rb') as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class Command(BaseCommand):
+    help = 'Move legacy N.jpg variant images and 1.jpg/1.svg brand logos into content-addressed storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-originals', action='store_true', help='Remove the legacy files afterwards')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        moved_images = 0
+        legacy_paths = set()
+        rendered = set(
+            VariantImage.objects.filter(path__startswith=f'{BLOBS_DIR}/', has_derivatives=True)
+            .values_list('path', flat=True)
+        )
+
+        for image in VariantImage.objects.exclude(path__startswith=f'{BLOBS_DIR}/').order_by('id'):
+            source = os.path.join(settings.ASSETS_ROOT, image.path)
+            if not os.path.exists(source):
+                continue
+            legacy_paths.add(image.path)
+            blob = store_blob(read_chunks(source), image.path.rsplit('.', 1)[-1].lower())
+
+            if VariantImage.objects.filter(product_variant_id=image.product_variant_id, path=blob).exists():
+                # The variant already holds the same picture
+                image.delete()
+            else:
+                image.path = blob
+                image.has_derivatives = blob in rendered
+                image.save(update_fields=['path', 'has_derivatives'])
+            moved_images += 1
+
+        moved_logos = 0
+        for brand in Brand.objects.filter(logo__in=['', None]):
+            legacy = brand.find_logo_file()
+            if not legacy:
+                continue
+            source = os.path.join(brand.legacy_logo_dir(), legacy.rsplit('/', 1)[-1])
+            brand.logo = store_blob(read_chunks(source), legacy.rsplit('.', 1)[-1])
+            brand.save(update_fields=['logo', 'updated_at'])
+            brand.invalidate_logo_cache()
+            if options['delete_originals']:
+                brand.remove_legacy_logo_files()
+            moved_logos += 1
+
+        if options['delete_originals']:
+            for path in legacy_paths:
+                release_file(path)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved_images} variant images and {moved_logos} brand logos to {BLOBS_DIR}. '
+            'Run generate_image_derivatives for images without derivatives.'
+        ))
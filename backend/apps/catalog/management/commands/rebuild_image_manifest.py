@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.catalog.images import BLOBS_DIR, scan_variant_images, variant_image_relpath
+from apps.catalog.models import ProductVariant, VariantImage
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the legacy N.jpg entries of the variant image manifest from the files under ASSETS_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, help='Only rebuild the variants of this product')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        variants = ProductVariant.objects.all()
+        # Content-addressed entries are not discoverable from the directories - keep them
+        manifest = VariantImage.objects.exclude(path__startswith=f'{BLOBS_DIR}/')
+        if options['product']:
+            variants = variants.filter(product_id=options['product'])
+            manifest = manifest.filter(product_variant__product_id=options['product'])
+
+        rows = []
+        variants_count = 0
+        for variant_id, product_id in variants.values_list('id', 'product_id').iterator():
+            variants_count += 1
+            for file_name, sort_order in scan_variant_images(product_id, variant_id):
+                rows.append(VariantImage(
+                    product_variant_id=variant_id,
+                    path=variant_image_relpath(product_id, variant_id, file_name),
+                    sort_order=sort_order
+                ))
+
+        manifest.delete()
+        VariantImage.objects.bulk_create(rows, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(rows)} images for {variants_count} variants'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.catalog import search
+from apps.catalog.models import Product, SearchPosting
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the catalog n-gram search index'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        SearchPosting.objects.all().delete()
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        search.index_products(product_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(product_ids)} products ({SearchPosting.objects.count()} postings)'
+        ))
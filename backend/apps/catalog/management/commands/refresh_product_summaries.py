@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Backfill the denormalized price range / variant count / primary variant of products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, nargs='*', help='Only refresh these product ids')
+
+    def handle(self, *args, **options):
+        Product.refresh_summaries(options['product'] or None)
+        self.stdout.write(self.style.SUCCESS('Product summaries refreshed'))
@@ -0,0 +1,109 @@
+"""
+Variant matrix generation.
+
+Creates every RAM x ROM x color combination of a product in one transaction: the
+combinations the product already has are skipped, the rest are written with one
+``bulk_create`` for the variants and one for their (empty) inventory rows.
+
+Prices follow a simple rule: ``base_price`` plus the surcharge of the variant's RAM,
+ROM and color (``ram_prices`` / ``rom_prices`` / ``color_prices``, each value -> amount).
+"""
+import re
+from itertools import product as cartesian
+
+from django.db import transaction
+
+
+MAX_COMBINATIONS = 500
+SKU_MAX_LENGTH = 50
+
+
+def sku_part(value):
+    """Upper-case alphanumerics of an option value ('Titan Blue' -> 'TITANBLUE')"""
+    return re.sub(r'[^0-9A-Za-z]', '', value).upper()
+
+
+def variant_sku(product_sku, ram, rom, color):
+    parts = [product_sku] + [sku_part(value) for value in (ram, rom, color) if value]
+    return '-'.join(part for part in parts if part)[:SKU_MAX_LENGTH]
+
+
+def folded(combination):
+    """Case-insensitive key of a combination (MySQL compares the columns without case)"""
+    return tuple(value.casefold() if value else None for value in combination)
+
+
+def variant_price(pricing, ram, rom, color):
+    return (
+        pricing['base_price']
+        + pricing.get('ram_prices', {}).get(ram, 0)
+        + pricing.get('rom_prices', {}).get(rom, 0)
+        + pricing.get('color_prices', {}).get(color, 0)
+    )
+
+
+@transaction.atomic
+def generate_variants(product, rams, roms, colors, pricing):
+    """Create the missing combinations; returns the created variants and skipped combinations"""
+    from apps.inventory.models import Inventory
+    from .models import Product, ProductVariant, variant_display_name
+    from .signals import products_bulk_changed
+
+    # Serialize concurrent generations for the same product
+    Product.objects.select_for_update().filter(pk=product.pk).first()
+
+    existing = {
+        folded((ram, rom, color))
+        for ram, rom, color in product.variants.values_list('ram', 'rom', 'color')
+    }
+
+    combinations = list(dict.fromkeys(cartesian(rams or [None], roms or [None], colors or [None])))
+    skipped = [combination for combination in combinations if folded(combination) in existing]
+    wanted = [combination for combination in combinations if folded(combination) not in existing]
+
+    # Give SKUs already taken (by any product, in any case) a numeric suffix
+    skus = {combination: variant_sku(product.sku, *combination) for combination in wanted}
+    taken = {
+        sku.casefold() for sku in
+        ProductVariant.objects.filter(sku__in=list(skus.values())).values_list('sku', flat=True)
+    }
+    for combination, sku in skus.items():
+        if sku.casefold() not in taken:
+            taken.add(sku.casefold())
+            continue
+        stem = sku[:SKU_MAX_LENGTH - 4]
+        taken.update(
+            sku.casefold() for sku in
+            ProductVariant.objects.filter(sku__istartswith=stem).values_list('sku', flat=True)
+        )
+        number = 2
+        while f'{stem}-{number}'.casefold() in taken:
+            number += 1
+        skus[combination] = f'{stem}-{number}'
+        taken.add(skus[combination].casefold())
+
+    variants = [
+        ProductVariant(
+            product=product, ram=ram, rom=rom, color=color,
+            sku=skus[(ram, rom, color)], price=variant_price(pricing, ram, rom, color),
+            display_name=variant_display_name(product.name, ram, rom, color),
+        )
+        for ram, rom, color in wanted
+    ]
+    if variants:
+        ProductVariant.objects.bulk_create(variants)
+        # MySQL does not return ids from bulk inserts, so read them back by SKU
+        variants = list(ProductVariant.objects.filter(sku__in=list(skus.values())).order_by('id'))
+        Inventory.objects.bulk_create([
+            Inventory(product_variant_id=variant.id, on_hand=0) for variant in variants
+        ])
+
+        Product.refresh_summaries([product.pk])
+        products_bulk_changed.send(sender=Product, product_ids=[product.pk])
+
+    return {
+        'created': variants,
+        'skipped': [
+            {'ram': ram, 'rom': rom, 'color': color} for ram, rom, color in skipped
+        ],
+    }
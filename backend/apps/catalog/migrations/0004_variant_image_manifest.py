@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_manifest(apps, schema_editor):
+    """Index the images already on disk so existing variants keep their photos"""
+    from apps.catalog.images import scan_variant_images, variant_image_relpath
+
+    ProductVariant = apps.get_model('catalog', 'ProductVariant')
+    VariantImage = apps.get_model('catalog', 'VariantImage')
+
+    rows = []
+    for variant_id, product_id in ProductVariant.objects.values_list('id', 'product_id'):
+        for file_name, sort_order in scan_variant_images(product_id, variant_id):
+            rows.append(VariantImage(
+                product_variant_id=variant_id,
+                path=variant_image_relpath(product_id, variant_id, file_name),
+                sort_order=sort_order
+            ))
+    VariantImage.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_alter_brand_logo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VariantImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255)),
+                ('sort_order', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product_variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='catalog.productvariant')),
+            ],
+            options={
+                'verbose_name': 'Variant Image',
+                'verbose_name_plural': 'Variant Images',
+                'db_table': 'variant_images',
+                'ordering': ['sort_order', 'path'],
+                'unique_together': {('product_variant', 'path')},
+            },
+        ),
+        migrations.RunPython(populate_manifest, migrations.RunPython.noop),
+    ]
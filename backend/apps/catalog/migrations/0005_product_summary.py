@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_summaries(apps, schema_editor):
+    from apps.catalog.summary import summary_expressions
+
+    Product = apps.get_model('catalog', 'Product')
+    ProductVariant = apps.get_model('catalog', 'ProductVariant')
+    Product.objects.update(**summary_expressions(ProductVariant))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_variant_image_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='active_variants_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=0, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=0, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_variant',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.productvariant'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_index(apps, schema_editor):
+    from apps.catalog.search import PRODUCT_VALUES, VARIANT_VALUES, build_postings
+
+    Product = apps.get_model('catalog', 'Product')
+    ProductVariant = apps.get_model('catalog', 'ProductVariant')
+    SearchPosting = apps.get_model('catalog', 'SearchPosting')
+
+    products = list(Product.objects.values(*PRODUCT_VALUES))
+    variants = list(ProductVariant.objects.values(*VARIANT_VALUES))
+    SearchPosting.objects.bulk_create(build_postings(SearchPosting, products, variants), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_product_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('weight', models.PositiveSmallIntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.product')),
+                ('product_variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.productvariant')),
+            ],
+            options={
+                'verbose_name': 'Search Posting',
+                'verbose_name_plural': 'Search Postings',
+                'db_table': 'catalog_search_postings',
+                'indexes': [models.Index(fields=['gram', 'product', 'product_variant', 'weight'], name='catalog_sea_gram_51a105_idx')],
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_price', models.DecimalField(decimal_places=0, max_digits=12)),
+                ('new_price', models.DecimalField(decimal_places=0, max_digits=12)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('product_variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='catalog.productvariant')),
+            ],
+            options={
+                'verbose_name': 'Price History',
+                'verbose_name_plural': 'Price History',
+                'db_table': 'price_history',
+                'ordering': ['-changed_at'],
+                'indexes': [models.Index(fields=['product_variant', 'changed_at'], name='price_histo_product_ef6da3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_price_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='variantimage',
+            name='has_derivatives',
+            field=models.BooleanField(default=False),
+        ),
+    ]
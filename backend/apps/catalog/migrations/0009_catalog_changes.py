@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+def log_existing_rows(apps, schema_editor):
+    """Version every existing object so that a sync from version 0 is a full load"""
+    CatalogChange = apps.get_model('catalog', 'CatalogChange')
+    sources = [
+        ('brand', apps.get_model('catalog', 'Brand').objects.values_list('id', flat=True)),
+        ('product', apps.get_model('catalog', 'Product').objects.values_list('id', flat=True)),
+        ('variant', apps.get_model('catalog', 'ProductVariant').objects.values_list('id', flat=True)),
+        ('inventory', apps.get_model('inventory', 'Inventory').objects.values_list('product_variant_id', flat=True)),
+    ]
+    for model, object_ids in sources:
+        CatalogChange.objects.bulk_create(
+            [CatalogChange(model=model, object_id=object_id) for object_id in object_ids.iterator()],
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_variantimage_has_derivatives'),
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('brand', 'Brand'), ('product', 'Product'), ('variant', 'Product Variant'), ('inventory', 'Inventory')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Catalog Change',
+                'verbose_name_plural': 'Catalog Changes',
+                'db_table': 'catalog_changes',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['model', 'object_id'], name='catalog_cha_model_37bd23_idx')],
+            },
+        ),
+        migrations.RunPython(log_existing_rows, migrations.RunPython.noop),
+    ]
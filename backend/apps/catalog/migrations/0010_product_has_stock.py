@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:37
+
+from django.db import migrations, models
+
+
+def backfill_has_stock(apps, schema_editor):
+    from apps.catalog.summary import has_stock_expression
+
+    Product = apps.get_model('catalog', 'Product')
+    ProductVariant = apps.get_model('catalog', 'ProductVariant')
+    Product.objects.update(has_stock=has_stock_expression(ProductVariant))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_catalog_changes'),
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='has_stock',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['has_stock', '-created_at'], name='products_has_sto_34d6b7_idx'),
+        ),
+        migrations.RunPython(backfill_has_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_product_has_stock'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='imei',
+            name='imeis_imei_3978c2_idx',
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+
+def backfill_display_names(apps, schema_editor):
+    from apps.catalog.summary import display_name_expression
+
+    Product = apps.get_model('catalog', 'Product')
+    ProductVariant = apps.get_model('catalog', 'ProductVariant')
+    ProductVariant.objects.update(display_name=display_name_expression(Product))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_imei_drop_duplicate_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariant',
+            name='display_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=300),
+        ),
+        migrations.RunPython(backfill_display_names, migrations.RunPython.noop),
+    ]
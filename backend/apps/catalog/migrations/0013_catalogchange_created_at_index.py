@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_productvariant_display_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='catalogchange',
+            index=models.Index(fields=['created_at'], name='catalog_cha_created_791554_idx'),
+        ),
+    ]
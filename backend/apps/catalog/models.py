@@ -1,9 +1,14 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
+from django.core.cache import cache
 from decimal import Decimal
 
 
+BRAND_LOGO_CACHE_KEY = 'catalog:brand_logo:{}'
+BRAND_LOGO_CACHE_TIMEOUT = 60 * 60
+
+
 class Brand(models.Model):
     """Brand model"""
     name = models.CharField(max_length=100, unique=True)
@@ -16,22 +21,74 @@ class Brand(models.Model):
 
     @property
     def logo_url(self):
-        """Get logo URL from file system - support both jpg and svg"""
+        """Get logo URL: the content-addressed ``logo`` blob, else a legacy jpg/svg on disk"""
+        if not hasattr(self, '_logo_url'):
+            Brand.resolve_logo_urls([self])
+        return self._logo_url or None
+
+    def legacy_logo_dir(self):
         import os
-        base_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            'assets', 'images', 'brands',
-            str(self.id)
-        )
-        
-        # Check for jpg first, then svg
+        from django.conf import settings
+
+        return os.path.join(settings.ASSETS_ROOT, 'images', 'brands', str(self.id))
+
+    def remove_legacy_logo_files(self):
+        """Delete logos stored as images/brands/{id}/1.jpg|svg; returns whether any existed"""
+        import os
+
+        deleted = False
         for ext in ['jpg', 'svg']:
-            file_path = os.path.join(base_path, f'1.{ext}')
+            file_path = os.path.join(self.legacy_logo_dir(), f'1.{ext}')
             if os.path.exists(file_path):
+                os.remove(file_path)
+                deleted = True
+        return deleted
+
+    def find_logo_file(self):
+        """Look up a legacy logo on disk - support both jpg and svg"""
+        import os
+
+        base_path = self.legacy_logo_dir()
+
+        # Check for jpg first, then svg
+        for ext in ['jpg', 'svg']:
+            if os.path.exists(os.path.join(base_path, f'1.{ext}')):
                 return f'/assets/images/brands/{self.id}/1.{ext}'
-        
+
         return None
 
+    @classmethod
+    def resolve_logo_urls(cls, brands):
+        """Resolve logo URLs for many brands with a single cache round trip"""
+        from .images import asset_url
+
+        keys = {}
+        for brand in brands:
+            if brand.logo:
+                brand._logo_url = asset_url(brand.logo.name)
+            else:
+                keys[BRAND_LOGO_CACHE_KEY.format(brand.id)] = brand
+        if not keys:
+            return
+
+        cached = cache.get_many(keys.keys())
+
+        missing = {}
+        for key, brand in keys.items():
+            if key in cached:
+                brand._logo_url = cached[key]
+            else:
+                # Cache '' for "no logo" so missing logos are not re-checked on disk
+                brand._logo_url = missing[key] = brand.find_logo_file() or ''
+
+        if missing:
+            cache.set_many(missing, BRAND_LOGO_CACHE_TIMEOUT)
+
+    def invalidate_logo_cache(self):
+        """Forget the cached logo path (call after the logo file changes)"""
+        cache.delete(BRAND_LOGO_CACHE_KEY.format(self.id))
+        self.__dict__.pop('_logo_url', None)
+
     class Meta:
         db_table = 'brands'
         ordering = ['name']
@@ -54,6 +111,17 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized variant summary - maintained by refresh_summaries()
+    min_price = models.DecimalField(max_digits=12, decimal_places=0, null=True, blank=True, editable=False)
+    max_price = models.DecimalField(max_digits=12, decimal_places=0, null=True, blank=True, editable=False)
+    active_variants_count = models.IntegerField(default=0, editable=False)
+    primary_variant = models.ForeignKey(
+        'ProductVariant', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', editable=False
+    )
+    # Any variant has stock on hand - also maintained by Inventory.save() when stock crosses zero
+    has_stock = models.BooleanField(default=False, editable=False)
+
     class Meta:
         db_table = 'products'
         ordering = ['-created_at']
@@ -63,11 +131,70 @@ class Product(models.Model):
             models.Index(fields=['sku']),
             models.Index(fields=['barcode']),
             models.Index(fields=['brand', 'is_active']),
+            models.Index(fields=['has_stock', '-created_at']),
         ]
 
     def __str__(self):
         return f"{self.name} ({self.sku})"
 
+    # Columns written only by set-based UPDATEs, never from an instance that may be stale
+    SUMMARY_FIELDS = ('min_price', 'max_price', 'active_variants_count', 'primary_variant', 'has_stock')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.SUMMARY_FIELDS
+            ]
+        # Keep the variants' display names in the same transaction as a rename
+        with transaction.atomic():
+            renamed = self.pk is not None and Product.objects.filter(pk=self.pk).exclude(name=self.name).exists()
+            super().save(*args, **kwargs)
+            if renamed:
+                ProductVariant.refresh_display_names([self.pk])
+
+    @classmethod
+    def refresh_summaries(cls, product_ids=None):
+        """Recompute the variant summary columns and has_stock (all products when product_ids is None)"""
+        from .summary import has_stock_expression, summary_expressions
+
+        queryset = cls.objects.all()
+        if product_ids is not None:
+            queryset = queryset.filter(pk__in=product_ids)
+        queryset.update(**summary_expressions(ProductVariant), has_stock=has_stock_expression(ProductVariant))
+
+    def refresh_summary(self):
+        """Recompute and reload the variant summary of this product"""
+        Product.refresh_summaries([self.pk])
+        self.refresh_from_db(fields=self.SUMMARY_FIELDS)
+
+    @classmethod
+    def sync_stock_flag(cls, variant_id, in_stock):
+        """
+        Update ``has_stock`` of a variant's product after its stock changed. Only writes
+        when the flag flips: a variant getting stock sets it, a variant running out
+        recomputes it (other variants may still have stock).
+        """
+        cls.sync_stock_flags([variant_id], in_stock)
+
+    @classmethod
+    def sync_stock_flags(cls, variant_ids, in_stock):
+        """``sync_stock_flag`` for many variants that all gained (or all ran out of) stock, one query"""
+        from .summary import has_stock_expression
+
+        products = cls.objects.filter(
+            pk__in=ProductVariant.objects.filter(pk__in=variant_ids).values('product_id')
+        )
+        if in_stock:
+            products.filter(has_stock=False).update(has_stock=True)
+        else:
+            products.filter(has_stock=True).update(has_stock=has_stock_expression(ProductVariant))
+
+
+def variant_display_name(product_name, ram, rom, color):
+    """'iPhone 15 - 6GB - 128GB - Black' (empty attributes left out)"""
+    return ' - '.join(part for part in (product_name, ram, rom, color) if part)
+
 
 class ProductVariant(models.Model):
     """Product Variant model for RAM/ROM/Color combinations"""
@@ -80,6 +207,8 @@ class ProductVariant(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized "product - ram - rom - color", so line items render without the product
+    display_name = models.CharField(max_length=300, blank=True, default='', editable=False)
 
     class Meta:
         db_table = 'product_variants'
@@ -93,22 +222,39 @@ class ProductVariant(models.Model):
         ]
 
     def __str__(self):
-        parts = [self.product.name]
-        if self.ram:
-            parts.append(self.ram)
-        if self.rom:
-            parts.append(self.rom)
-        if self.color:
-            parts.append(self.color)
-        return ' - '.join(parts)
+        return self.display_name or variant_display_name(self.product.name, self.ram, self.rom, self.color)
+
+    def save(self, *args, **kwargs):
+        self.display_name = variant_display_name(self.product.name, self.ram, self.rom, self.color)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'display_name'}
+        # Keep the product summary in the same transaction as the variant write
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Product.refresh_summaries([self.product_id])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Product.refresh_summaries([self.product_id])
+        return result
+
+    @classmethod
+    def refresh_display_names(cls, product_ids=None):
+        """Recompute display_name of the variants of the given products (all when None)"""
+        from .summary import display_name_expression
+
+        queryset = cls.objects.all()
+        if product_ids is not None:
+            queryset = queryset.filter(product_id__in=product_ids)
+        queryset.update(display_name=display_name_expression(Product))
 
     @property
     def current_stock(self):
-        """Get current stock from inventory"""
+        """Get current stock from inventory (served from select_related/prefetch when loaded)"""
         from apps.inventory.models import Inventory
         try:
-            inventory = Inventory.objects.get(product_variant=self)
-            return inventory.on_hand
+            return self.inventory.on_hand
         except Inventory.DoesNotExist:
             return 0
 
@@ -137,6 +283,109 @@ class ProductImage(models.Model):
         super().save(*args, **kwargs)
 
 
+class VariantImage(models.Model):
+    """Manifest of the image files stored on disk for a product variant"""
+    product_variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='images')
+    path = models.CharField(max_length=255)  # Relative to ASSETS_ROOT
+    sort_order = models.IntegerField(default=0)
+    has_derivatives = models.BooleanField(default=False)  # Thumbnails/WebP rendered (see derivatives.py)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'variant_images'
+        ordering = ['sort_order', 'path']
+        verbose_name = 'Variant Image'
+        verbose_name_plural = 'Variant Images'
+        unique_together = [['product_variant', 'path']]
+
+    def __str__(self):
+        return self.path
+
+    @property
+    def file_name(self):
+        return self.path.rsplit('/', 1)[-1]
+
+    @property
+    def is_primary(self):
+        return self.sort_order == 1
+
+
+class PriceHistory(models.Model):
+    """One row per variant price change"""
+    product_variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='price_history')
+    old_price = models.DecimalField(max_digits=12, decimal_places=0)
+    new_price = models.DecimalField(max_digits=12, decimal_places=0)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'price_history'
+        ordering = ['-changed_at']
+        verbose_name = 'Price History'
+        verbose_name_plural = 'Price History'
+        indexes = [
+            models.Index(fields=['product_variant', 'changed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_variant_id}: {self.old_price} -> {self.new_price}"
+
+
+class SearchPosting(models.Model):
+    """Trigram posting of the catalog search index (see apps.catalog.search)"""
+    gram = models.CharField(max_length=3)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    # Null for the product-level document
+    product_variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    weight = models.PositiveSmallIntegerField()
+
+    class Meta:
+        db_table = 'catalog_search_postings'
+        verbose_name = 'Search Posting'
+        verbose_name_plural = 'Search Postings'
+        indexes = [
+            models.Index(fields=['gram', 'product', 'product_variant', 'weight']),
+        ]
+
+    def __str__(self):
+        return f"{self.gram!r} -> {self.product_id}/{self.product_variant_id}"
+
+
+class CatalogChange(models.Model):
+    """
+    Catalog change log for delta sync (see apps.catalog.changelog).
+    The id is the catalog version; only the latest change per object is kept.
+    """
+    BRAND = 'brand'
+    PRODUCT = 'product'
+    VARIANT = 'variant'
+    INVENTORY = 'inventory'  # object_id is the product variant id
+    MODEL_CHOICES = [
+        (BRAND, 'Brand'),
+        (PRODUCT, 'Product'),
+        (VARIANT, 'Product Variant'),
+        (INVENTORY, 'Inventory'),
+    ]
+
+    model = models.CharField(max_length=10, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'catalog_changes'
+        ordering = ['id']
+        verbose_name = 'Catalog Change'
+        verbose_name_plural = 'Catalog Changes'
+        indexes = [
+            models.Index(fields=['model', 'object_id']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"v{self.id} {self.model} {self.object_id}{' (deleted)' if self.deleted else ''}"
+
+
 class Imei(models.Model):
     """IMEI tracking model (optional feature)"""
     STATUS_CHOICES = [
@@ -159,7 +408,7 @@ class Imei(models.Model):
         verbose_name = 'IMEI'
         verbose_name_plural = 'IMEIs'
         indexes = [
-            models.Index(fields=['imei']),
+            # imei is covered by its unique index
             models.Index(fields=['product_variant', 'status']),
         ]
 
@@ -0,0 +1,84 @@
+"""
+Bulk repricing.
+
+A rule selects variants by ``brand``, ``product`` or a list of ``skus`` and either sets
+an absolute ``price`` or changes the price by ``percent`` (rounded to ``round_to``).
+Each rule is one set-based UPDATE, all rules run in one transaction, and every changed
+variant gets one PriceHistory row (price before the first rule -> after the last).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Round
+from django.utils import timezone
+
+
+def rule_queryset(rule):
+    """Variants selected by a rule"""
+    from .models import Product, ProductVariant
+
+    queryset = ProductVariant.objects.all()
+    if rule.get('brand') is not None:
+        # Subquery on products instead of a join, which MySQL cannot UPDATE in one statement
+        queryset = queryset.filter(product__in=Product.objects.filter(brand_id=rule['brand']))
+    if rule.get('product') is not None:
+        queryset = queryset.filter(product_id=rule['product'])
+    if rule.get('skus'):
+        queryset = queryset.filter(sku__in=rule['skus'])
+    return queryset
+
+
+def price_expression(rule):
+    """New price of a rule as an UPDATE expression"""
+    if rule.get('price') is not None:
+        return Value(rule['price'])
+    factor = (Decimal(100) + Decimal(str(rule['percent']))) / 100
+    round_to = rule.get('round_to') or 1
+    return Round(F('price') * factor / round_to) * round_to
+
+
+@transaction.atomic
+def apply_price_rules(rules, user=None):
+    """Apply rules in order; returns the number of variants matched per rule and changed"""
+    from .models import PriceHistory, Product
+    from .signals import products_bulk_changed
+
+    old_prices = {}     # variant id -> price before the first rule
+    new_prices = {}     # variant id -> price after the latest rule
+    product_ids = set()
+    matched = []
+    now = timezone.now()
+
+    for rule in rules:
+        queryset = rule_queryset(rule)
+        rows = list(queryset.select_for_update().values_list('id', 'product_id', 'price'))
+        for variant_id, product_id, price in rows:
+            old_prices.setdefault(variant_id, price)
+            product_ids.add(product_id)
+        matched.append(len(rows))
+
+        if rows:
+            queryset.update(price=price_expression(rule), updated_at=now)
+            new_prices.update(queryset.values_list('id', 'price'))
+
+    changed = {
+        variant_id: price for variant_id, price in new_prices.items()
+        if price != old_prices[variant_id]
+    }
+    PriceHistory.objects.bulk_create([
+        PriceHistory(
+            product_variant_id=variant_id,
+            old_price=old_prices[variant_id],
+            new_price=price,
+            changed_by=user,
+        )
+        for variant_id, price in changed.items()
+    ], batch_size=1000)
+
+    if changed:
+        product_ids = list(product_ids)
+        Product.refresh_summaries(product_ids)
+        products_bulk_changed.send(sender=Product, product_ids=product_ids, fields=['price'])
+
+    return {'matched': matched, 'changed': len(changed)}
@@ -0,0 +1,130 @@
+"""
+Read-through cache of catalog API responses (product / brand list and detail).
+
+A response is cached as its rendered JSON and headers under a key made of the catalog
+*generation*, the scheme, host and path of the request and the sorted query
+parameters (paginated bodies hold absolute next / previous URLs). Any write to catalog
+data bumps the generation (signal handlers in ``signals.py``), which orphans every
+cached response at once; orphans expire after ``CATALOG_CACHE_TIMEOUT``. The bump
+happens at the write and again after commit, so a response cached by a concurrent
+reader from pre-commit data is dropped too. Hits and misses are counted in the cache so the figures
+are shared by every worker when the cache backend is.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+
+GENERATION_KEY = 'catalog:response:generation'
+RESPONSE_KEY = 'catalog:response:{generation}:{digest}'
+COUNTER_KEY = 'catalog:response:{event}'
+
+
+def current_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Seeded from the clock so a lost counter cannot reuse an old generation
+        cache.add(GENERATION_KEY, int(time.time() * 1000), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        current_generation()
+
+
+def invalidate():
+    """Drop every cached response now and once the current transaction commits"""
+    bump_generation()
+    transaction.on_commit(bump_generation)
+
+
+def count(event):
+    key = COUNTER_KEY.format(event=event)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def stats():
+    counts = cache.get_many([COUNTER_KEY.format(event=event) for event in ('hit', 'miss')])
+    hits = counts.get(COUNTER_KEY.format(event='hit'), 0)
+    misses = counts.get(COUNTER_KEY.format(event='miss'), 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        'generation': current_generation(),
+    }
+
+
+# Set again on every response by the mixin
+UNCACHED_HEADERS = frozenset(['x-cache'])
+
+
+def response_key(request):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    url = f'{request.scheme}://{request.get_host()}{request.path}?{query}'
+    digest = hashlib.sha1(url.encode()).hexdigest()
+    return RESPONSE_KEY.format(generation=current_generation(), digest=digest)
+
+
+class CachedResponseMixin:
+    """Serve list / retrieve from the response cache (JSON responses only)"""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: self.uncached_list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: self.uncached_retrieve(request, *args, **kwargs))
+
+    # Extension points for views adding to the response (cached along with it)
+    def uncached_list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def uncached_retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def cached_response(self, request, render):
+        if request.accepted_renderer.format != 'json':
+            return render()
+
+        key = response_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            count('hit')
+            content, headers = cached
+            return self.json_response(content, headers, 'HIT')
+
+        count('miss')
+        response = render()
+        if response.status_code == 200:
+            response['X-Cache'] = 'MISS'
+            # Stored as rendered; a write meanwhile has moved on to a new generation
+            response.add_post_render_callback(lambda rendered: cache.set(
+                key, (rendered.content, cached_headers(rendered)), settings.CATALOG_CACHE_TIMEOUT
+            ))
+        return response
+
+    @staticmethod
+    def json_response(content, headers, state):
+        response = HttpResponse(content)
+        for name, value in headers:
+            response[name] = value
+        response['X-Cache'] = state
+        return response
+
+
+def cached_headers(response):
+    """(name, value) of the headers stored with a response (Content-Type, Vary, Allow ...)"""
+    return [(name, value) for name, value in response.items() if name.lower() not in UNCACHED_HEADERS]
@@ -0,0 +1,239 @@
+"""
+In-process barcode/SKU index for POS scanning.
+
+Maps ``Product.barcode``, ``Product.sku`` and ``ProductVariant.sku`` to a slot; each
+slot holds one active variant in parallel arrays (variant id, price, on hand) plus its
+display name. Product codes resolve to the product's primary variant.
+
+The index is built lazily with two queries. Each worker process owns its copy and,
+before a lookup, catches up on the shared feed of committed writes (``index_changes``):
+one cache read when nothing changed, so a hit never touches the database, and a reload
+of just the written products and variants (name, price, stock) when something did. A
+rebuild after ``SCAN_INDEX_MAX_AGE`` seconds backs the feed up when the cache is not
+shared.
+"""
+import threading
+import time
+from array import array
+
+from django.conf import settings
+
+from . import index_changes
+
+
+def _normalize_code(code):
+    return (code or '').strip().upper()
+
+
+class ScanIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.codes = {}             # code -> slot
+        self.slots = {}             # variant id -> slot
+        self.free_slots = []
+        self.variant_ids = array('q')
+        self.prices = array('q')
+        self.on_hand = array('q')
+        self.names = []
+        self.variant_codes = {}     # variant id -> its own SKU code
+        self.product_codes = {}     # product id -> (codes, primary variant id)
+        self.primary_of = {}        # primary variant id -> product id
+        self.built_at = None
+        self.position = None
+
+    # Lookup ---------------------------------------------------------------
+
+    def lookup(self, code):
+        """Return the record for a scanned code, or None"""
+        self._ensure_fresh()
+        slot = self.codes.get(_normalize_code(code))
+        if slot is None:
+            return None
+        return {
+            'variant_id': self.variant_ids[slot],
+            'name': self.names[slot],
+            'price': self.prices[slot],
+            'on_hand': self.on_hand[slot],
+        }
+
+    def resolve(self, code):
+        """
+        ``lookup`` falling back to the database on a miss, so a code whose write has not
+        reached the feed yet is found (and added) right away
+        """
+        record = self.lookup(code)
+        if record is not None:
+            return record
+
+        from django.db.models import Q
+        from .models import Product
+
+        code = (code or '').strip()
+        if not code:
+            return None
+        product_ids = list(Product.objects.filter(
+            Q(sku__iexact=code) | Q(barcode__iexact=code) | Q(variants__sku__iexact=code)
+        ).values_list('id', flat=True).distinct())
+        if not product_ids:
+            return None
+        self.refresh_products(product_ids)
+        return self.lookup(code)
+
+    @property
+    def is_built(self):
+        return self.built_at is not None
+
+    def _ensure_fresh(self):
+        max_age = getattr(settings, 'SCAN_INDEX_MAX_AGE', 300)
+        if not self.is_built or time.monotonic() - self.built_at > max_age:
+            self.build()
+            return
+        position, product_ids, variant_ids = index_changes.changes_since(self.position)
+        if product_ids is None:
+            self.build()
+        elif position != self.position:
+            # Variants first: a deleted variant leaves before its product's codes move
+            self.refresh_variants(list(variant_ids))
+            self.refresh_products(list(product_ids))
+            self.position = position
+
+    # Maintenance ----------------------------------------------------------
+
+    def build(self):
+        """Load every active variant and every product code"""
+        from .models import Product, ProductVariant
+
+        # Taken first: writes committed while loading are applied again afterwards
+        position = index_changes.current_position()
+        variants = ProductVariant.objects.filter(is_active=True).values_list(*self._VARIANT_FIELDS)
+        products = Product.objects.values_list('id', 'sku', 'barcode', 'primary_variant_id')
+
+        with self._lock:
+            self._reset()
+            for row in variants.iterator():
+                self._store_variant(row)
+            for product_id, sku, barcode, primary_variant_id in products.iterator():
+                self._store_product(product_id, (sku, barcode), primary_variant_id)
+            self.built_at = time.monotonic()
+            self.position = position
+
+    def refresh_variants(self, variant_ids):
+        """Reload the given variants (removing inactive or deleted ones)"""
+        if not self.is_built:
+            return
+        from .models import ProductVariant
+
+        rows = {
+            row[0]: row for row in
+            ProductVariant.objects.filter(pk__in=variant_ids, is_active=True).values_list(*self._VARIANT_FIELDS)
+        }
+        with self._lock:
+            for variant_id in variant_ids:
+                if variant_id in rows:
+                    self._store_variant(rows[variant_id])
+                else:
+                    self._remove_variant(variant_id)
+
+    def refresh_products(self, product_ids):
+        """Reload the codes of the given products and all of their variants"""
+        if not self.is_built:
+            return
+        from .models import Product, ProductVariant
+
+        products = Product.objects.filter(pk__in=product_ids).values_list(
+            'id', 'sku', 'barcode', 'primary_variant_id'
+        )
+        with self._lock:
+            for product_id in product_ids:
+                self._remove_product(product_id)
+            for product_id, sku, barcode, primary_variant_id in products:
+                self._store_product(product_id, (sku, barcode), primary_variant_id)
+        self.refresh_variants(list(
+            ProductVariant.objects.filter(product_id__in=product_ids).values_list('id', flat=True)
+        ))
+
+    # Internals ------------------------------------------------------------
+
+    _VARIANT_FIELDS = (
+        'id', 'sku', 'price', 'product__name', 'ram', 'rom', 'color', 'inventory__on_hand'
+    )
+
+    def _store_variant(self, row):
+        variant_id, sku, price, product_name, ram, rom, color, on_hand = row
+        name = ' - '.join(part for part in (product_name, ram, rom, color) if part)
+
+        slot = self.slots.get(variant_id)
+        if slot is None:
+            if self.free_slots:
+                slot = self.free_slots.pop()
+                self.variant_ids[slot] = variant_id
+                self.prices[slot] = int(price)
+                self.on_hand[slot] = on_hand or 0
+                self.names[slot] = name
+            else:
+                slot = len(self.variant_ids)
+                self.variant_ids.append(variant_id)
+                self.prices.append(int(price))
+                self.on_hand.append(on_hand or 0)
+                self.names.append(name)
+            self.slots[variant_id] = slot
+        else:
+            self.prices[slot] = int(price)
+            self.on_hand[slot] = on_hand or 0
+            self.names[slot] = name
+
+        old_code = self.variant_codes.get(variant_id)
+        if old_code and self.codes.get(old_code) == slot:
+            del self.codes[old_code]
+        code = _normalize_code(sku)
+        self.codes[code] = slot
+        self.variant_codes[variant_id] = code
+
+        # Re-point the codes of a product whose primary variant this is
+        product_id = self.primary_of.get(variant_id)
+        if product_id is not None:
+            for product_code in self.product_codes[product_id][0]:
+                self.codes.setdefault(product_code, slot)
+
+    def _remove_variant(self, variant_id):
+        slot = self.slots.pop(variant_id, None)
+        if slot is None:
+            return
+        codes = [self.variant_codes.pop(variant_id, None)]
+        product_id = self.primary_of.get(variant_id)
+        if product_id is not None:
+            codes.extend(self.product_codes[product_id][0])
+        for code in codes:
+            if self.codes.get(code) == slot:
+                del self.codes[code]
+        self.variant_ids[slot] = 0
+        self.names[slot] = ''
+        self.free_slots.append(slot)
+
+    def _store_product(self, product_id, codes, primary_variant_id):
+        codes = [_normalize_code(code) for code in codes if code]
+        self.product_codes[product_id] = (codes, primary_variant_id)
+        if primary_variant_id is not None:
+            self.primary_of[primary_variant_id] = product_id
+        slot = self.slots.get(primary_variant_id)
+        if slot is not None:
+            for code in codes:
+                # A variant SKU wins over a product code that happens to be equal
+                if code not in self.codes or self.codes[code] == slot:
+                    self.codes[code] = slot
+
+    def _remove_product(self, product_id):
+        codes, primary_variant_id = self.product_codes.pop(product_id, ((), None))
+        self.primary_of.pop(primary_variant_id, None)
+        slot = self.slots.get(primary_variant_id)
+        if slot is None:
+            return
+        for code in codes:
+            if self.codes.get(code) == slot and self.variant_codes.get(primary_variant_id) != code:
+                del self.codes[code]
+
+
+scan_index = ScanIndex()
@@ -0,0 +1,317 @@
+"""
+Catalog n-gram search index.
+
+Every product gets one search document (name, SKU, barcode, brand) and every variant
+gets one more (the product fields plus variant SKU and RAM/ROM/color). Documents are
+normalized (lower case, Vietnamese accents folded, "đ" -> "d"), split into word tokens
+and stored as padded trigrams in ``SearchPosting``.
+
+A query matches the documents containing all trigrams of its tokens (unpadded, so a
+fragment matches inside a word: "phone" finds "iPhone"); matches are ranked by the
+summed field weight of the matched trigrams, word starts included. One grouped query
+on the ``gram`` index answers a search, instead of ``LIKE '%term%'`` scans across joins.
+"""
+import re
+import unicodedata
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import DEFERRED, Case, Count, IntegerField, Q, Sum, When
+from rest_framework import filters
+
+
+# Field weights used for ranking
+WEIGHT_CODE = 3        # SKU / barcode
+WEIGHT_NAME = 3        # Product name
+WEIGHT_BRAND = 2       # Brand name
+WEIGHT_ATTRIBUTE = 1   # RAM / ROM / color
+
+# Upper bound on ranked hits; broader terms keep every match but rank only the best
+MAX_RESULTS = 1000
+
+GRAM_FREQUENCY_CACHE_KEY = 'catalog:search:df:{}'
+GRAM_FREQUENCY_CACHE_TIMEOUT = 60 * 60
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Lower-case, fold Vietnamese accents and keep alphanumeric tokens"""
+    text = (text or '').lower().replace('đ', 'd')
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(text)
+
+
+def text_grams(text):
+    """
+    Padded trigrams of a text (`` ip``, ``iph``, ``pho`` ... for "iPhone"), plus the
+    two-character word start (`` i``) so one-letter query tokens match as prefixes.
+    """
+    grams = set()
+    for token in normalize(text):
+        padded = f' {token}'
+        grams.add(padded[:2])
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def query_grams(term):
+    """
+    (required, boost) grams of a search term. A token of three or more characters
+    requires its unpadded trigrams, so it also matches inside words, SKUs and barcodes;
+    its word-start gram (`` ph``) only ranks word-prefix matches higher. Shorter tokens
+    match as word prefixes.
+    """
+    required = set()
+    boost = set()
+    for token in normalize(term):
+        padded = f' {token}'
+        if len(token) < 3:
+            required.add(padded)
+        else:
+            required.update(token[i:i + 3] for i in range(len(token) - 2))
+            boost.add(padded[:3])
+    return required, boost - required
+
+
+def document_postings(fields):
+    """Map gram -> weight for a document given (text, weight) pairs"""
+    postings = {}
+    for text, weight in fields:
+        for gram in text_grams(text):
+            if postings.get(gram, 0) < weight:
+                postings[gram] = weight
+    return postings
+
+
+def product_fields(product):
+    """Weighted fields of a product document; ``product`` is a dict of values"""
+    return [
+        (product['name'], WEIGHT_NAME),
+        (product['sku'], WEIGHT_CODE),
+        (product['barcode'], WEIGHT_CODE),
+        (product['brand__name'], WEIGHT_BRAND),
+    ]
+
+
+def variant_fields(product, variant):
+    """Weighted fields of a variant document; both arguments are dicts of values"""
+    return product_fields(product) + [
+        (variant['sku'], WEIGHT_CODE),
+        (variant['ram'], WEIGHT_ATTRIBUTE),
+        (variant['rom'], WEIGHT_ATTRIBUTE),
+        (variant['color'], WEIGHT_ATTRIBUTE),
+    ]
+
+
+# Model fields feeding the documents; writes touching only other fields skip reindexing
+INDEXED_FIELDS = frozenset(['name', 'sku', 'barcode', 'brand', 'ram', 'rom', 'color'])
+
+_indexed_attnames = {}
+
+
+def indexed_values(instance):
+    """Values of the indexed fields of a product or variant (``DEFERRED`` when not loaded)"""
+    attnames = _indexed_attnames.get(type(instance))
+    if attnames is None:
+        attnames = _indexed_attnames[type(instance)] = [
+            field.attname for field in instance._meta.concrete_fields if field.name in INDEXED_FIELDS
+        ]
+    return {attname: instance.__dict__.get(attname, DEFERRED) for attname in attnames}
+
+
+def needs_reindex(instance, created, update_fields):
+    """
+    Whether a saved product / variant changed its search document, judged against the
+    values it was loaded with (a price or stock save skips reindexing)
+    """
+    loaded = getattr(instance, '_indexed_values', None)
+    instance._indexed_values = current = indexed_values(instance)
+    if created:
+        return True
+    if update_fields is not None and INDEXED_FIELDS.isdisjoint(update_fields):
+        return False
+    return loaded is None or DEFERRED in loaded.values() or loaded != current
+
+
+PRODUCT_VALUES = ['id', 'name', 'sku', 'barcode', 'brand__name']
+VARIANT_VALUES = ['id', 'product_id', 'sku', 'ram', 'rom', 'color']
+
+
+def posting_rows(products, variants):
+    """
+    Yield (gram, weight, product id, variant id) for ``values()`` rows of products
+    and their variants (variant id is None for product documents)
+    """
+    by_id = {product['id']: product for product in products}
+    for product in products:
+        for gram, weight in document_postings(product_fields(product)).items():
+            yield gram, weight, product['id'], None
+    for variant in variants:
+        product = by_id[variant['product_id']]
+        for gram, weight in document_postings(variant_fields(product, variant)).items():
+            yield gram, weight, product['id'], variant['id']
+
+
+def build_postings(posting_model, products, variants):
+    """
+    Build unsaved postings from ``values()`` rows of products and their variants.
+    Takes the model as an argument so migrations can pass the historical model.
+    """
+    return [
+        posting_model(gram=gram, weight=weight, product_id=product_id, product_variant_id=variant_id)
+        for gram, weight, product_id, variant_id in posting_rows(products, variants)
+    ]
+
+
+def index_products(product_ids, batch_size=500):
+    """(Re)index the documents of the given products and all of their variants"""
+    from .models import Product, ProductVariant, SearchPosting
+
+    # Postings are inserted as plain tuples: building millions of model instances
+    # for bulk_create dominated large imports and index rebuilds
+    meta = SearchPosting._meta
+    columns = [meta.get_field(name).column for name in ('gram', 'weight', 'product', 'product_variant')]
+    insert_sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(meta.db_table),
+        ', '.join(connection.ops.quote_name(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start:start + batch_size]
+        products = list(Product.objects.filter(pk__in=chunk).values(*PRODUCT_VALUES))
+        variants = list(ProductVariant.objects.filter(product_id__in=chunk).values(*VARIANT_VALUES))
+
+        SearchPosting.objects.filter(product_id__in=chunk).delete()
+        with connection.cursor() as cursor:
+            cursor.executemany(insert_sql, list(posting_rows(products, variants)))
+
+
+def gram_frequencies(grams):
+    """Posting counts per gram, cached (only used to pick the most selective gram)"""
+    from .models import SearchPosting
+
+    # Grams only hold [a-z0-9 ]; swap the padding space for a memcached-safe key
+    keys = {GRAM_FREQUENCY_CACHE_KEY.format(gram.replace(' ', '_')): gram for gram in grams}
+    cached = cache.get_many(keys.keys())
+    frequencies = {keys[key]: count for key, count in cached.items()}
+
+    missing = [gram for gram in grams if gram not in frequencies]
+    if missing:
+        counted = dict(
+            SearchPosting.objects.filter(gram__in=missing).values('gram')
+            .annotate(count=Count('id')).values_list('gram', 'count')
+        )
+        fresh = {gram: counted.get(gram, 0) for gram in missing}
+        cache.set_many(
+            {GRAM_FREQUENCY_CACHE_KEY.format(gram.replace(' ', '_')): count for gram, count in fresh.items()},
+            GRAM_FREQUENCY_CACHE_TIMEOUT
+        )
+        frequencies.update(fresh)
+    return frequencies
+
+
+def matching_documents(term, target='product'):
+    """
+    Grouped ``values()`` queryset of the documents matching ``term``, best first, with
+    ``product_id``, ``product_variant_id`` and ``score``; None when the term has no
+    searchable characters. Usable as an ``__in`` subquery through ``.values(key)``.
+    """
+    from .models import SearchPosting
+
+    required, boost = query_grams(term)
+    if not required:
+        return None
+
+    # Only group the products holding the rarest gram instead of every posting of
+    # common grams such as "pho"
+    rarest = min(required, key=gram_frequencies(required).get)
+    postings = SearchPosting.objects.filter(
+        gram__in=required | boost,
+        product_id__in=SearchPosting.objects.filter(gram=rarest).values('product_id')
+    )
+    if target == 'variant':
+        postings = postings.filter(product_variant__isnull=False)
+
+    return postings.values('product_id', 'product_variant_id').annotate(
+        hits=Count('id', filter=Q(gram__in=required)), score=Sum('weight')
+    ).filter(hits=len(required)).order_by('-score')
+
+
+def document_key(target):
+    """Field of a matching document holding the id of a ``target`` object"""
+    return 'product_variant_id' if target == 'variant' else 'product_id'
+
+
+def ranked_ids(documents, target):
+    """Distinct object ids of matching documents, in rank order"""
+    key = document_key(target)
+    ranked = []
+    seen = set()
+    for document in documents:
+        object_id = document[key]
+        if object_id not in seen:
+            seen.add(object_id)
+            ranked.append(object_id)
+    return ranked
+
+
+def search(term, target='product', limit=MAX_RESULTS):
+    """
+    Ranked ids matching ``term``: product ids when target is 'product', variant ids
+    when target is 'variant'. Returns None when the term has no searchable characters
+    or matches more than ``limit`` documents (``limit=None`` returns every match).
+    """
+    documents = matching_documents(term, target)
+    if documents is None:
+        return None
+    if limit is not None:
+        documents = list(documents[:limit + 1])
+        if len(documents) > limit:
+            return None
+    return ranked_ids(documents, target)
+
+
+class CatalogSearchFilter(filters.SearchFilter):
+    """
+    ``search=`` backed by the catalog n-gram index.
+
+    Views set ``catalog_search_target`` ('product' or 'variant') and optionally
+    ``catalog_search_field`` (the queryset field holding that id, default 'pk').
+    Results keep their rank order unless an explicit ``ordering`` is requested. A
+    term matching more than ``MAX_RESULTS`` documents keeps every match (filtered by
+    a subquery, so the paginated count stays exact) with the ``MAX_RESULTS`` best
+    ranked first. Only terms without searchable characters fall back to the regular
+    SearchFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = ' '.join(self.get_search_terms(request))
+        if not terms:
+            return queryset
+
+        target = getattr(view, 'catalog_search_target', 'product')
+        documents = matching_documents(terms, target)
+        if documents is None:
+            return super().filter_queryset(request, queryset, view)
+
+        field = getattr(view, 'catalog_search_field', 'pk')
+        best = list(documents[:MAX_RESULTS + 1])
+        if len(best) > MAX_RESULTS:
+            # Broad term: the same matching rules as a subquery, only the best are ranked
+            queryset = queryset.filter(**{f'{field}__in': documents.values(document_key(target))})
+            ranked = ranked_ids(best[:MAX_RESULTS], target)
+        else:
+            ranked = ranked_ids(best, target)
+            queryset = queryset.filter(**{f'{field}__in': ranked})
+
+        if ranked and not request.query_params.get(filters.OrderingFilter.ordering_param):
+            # Matches past the ranked ones follow in id order
+            queryset = queryset.order_by(Case(
+                *[When(**{field: object_id}, then=rank) for rank, object_id in enumerate(ranked)],
+                default=len(ranked), output_field=IntegerField()
+            ), field)
+        return queryset
@@ -1,5 +1,34 @@
+from django.db import models
 from rest_framework import serializers
-from .models import Brand, Product, ProductVariant, ProductImage, Imei
+from apps.procurement.models import StockInItem
+from .models import Brand, Product, ProductVariant, ProductImage, Imei, PriceHistory
+from .images import asset_url, derivative_urls
+from .imeis import MAX_BATCH
+
+
+def image_derivatives(image):
+    """Derivative URLs of a VariantImage, None until they are rendered"""
+    return derivative_urls(image.path) if image.has_derivatives else None
+
+
+def variant_image_data(variant, image):
+    """Serialize a VariantImage manifest row"""
+    derivatives = image_derivatives(image)
+    return {
+        'id': f"{variant.product_id}_{variant.id}_{image.sort_order}",
+        'image': asset_url(image.path),
+        'thumbnail': derivatives['thumb']['webp'] if derivatives else asset_url(image.path),
+        'derivatives': derivatives,
+        'is_primary': image.is_primary,
+        'sort_order': image.sort_order
+    }
+
+
+class BrandListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        brands = list(data.all() if isinstance(data, models.Manager) else data)
+        Brand.resolve_logo_urls(brands)
+        return super().to_representation(brands)
 
 
 class BrandSerializer(serializers.ModelSerializer):
@@ -8,15 +37,19 @@ class BrandSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Brand
+        list_serializer_class = BrandListSerializer
         fields = ['id', 'name', 'slug', 'description', 'logo', 'is_active', 
                   'products_count', 'created_at', 'updated_at']
         read_only_fields = ['id', 'slug', 'created_at', 'updated_at', 'logo']
 
     def get_products_count(self, obj):
+        # Annotated by BrandViewSet; fall back to a query for single instances
+        if hasattr(obj, 'active_products_count'):
+            return obj.active_products_count
         return obj.products.filter(is_active=True).count()
     
     def get_logo(self, obj):
-        """Get logo URL from file system"""
+        """Get logo URL (cached)"""
         return obj.logo_url
     
     def create(self, validated_data):
@@ -42,7 +75,7 @@ class ProductImageSerializer(serializers.ModelSerializer):
 
 
 class ProductVariantSerializer(serializers.ModelSerializer):
-    current_stock = serializers.ReadOnlyField()
+    current_stock = serializers.SerializerMethodField()
     product_detail = serializers.SerializerMethodField(read_only=True)
     images = serializers.SerializerMethodField()
 
@@ -66,32 +99,27 @@ class ProductVariantSerializer(serializers.ModelSerializer):
             'brand': brand_data
         }
     
+    def get_current_stock(self, obj):
+        """Stock annotated by ProductVariantViewSet, falling back to the inventory row"""
+        stock = getattr(obj, 'stock', None)
+        return obj.current_stock if stock is None else stock
+
     def get_images(self, obj):
-        """Generate image URLs based on file system structure"""
-        import os
-        from django.conf import settings
-        
-        images = []
-        # Path: products/{product_id}/{variant_id}/
-        variant_folder = os.path.join(
-            settings.BASE_DIR,
-            'apps', 'assets', 'images', 'products',
-            str(obj.product.id),
-            str(obj.id)
-        )
-        
-        if os.path.exists(variant_folder):
-            # Get all .jpg files and sort them
-            image_files = sorted([f for f in os.listdir(variant_folder) if f.endswith('.jpg')])
-            for img_file in image_files:
-                images.append({
-                    'id': f"{obj.product.id}_{obj.id}_{img_file}",
-                    'image': f'/assets/images/products/{obj.product.id}/{obj.id}/{img_file}',
-                    'is_primary': img_file == '1.jpg',
-                    'sort_order': int(img_file.split('.')[0]) if img_file.split('.')[0].isdigit() else 0
-                })
-        
-        return images
+        """Image URLs from the variant image manifest (prefetched, no disk access)"""
+        return [variant_image_data(obj, image) for image in obj.images.all()]
+
+
+class ProductVariantOptionSerializer(serializers.ModelSerializer):
+    """Slim variant row for order-entry dropdowns"""
+    name = serializers.SerializerMethodField()
+    available = serializers.IntegerField(source='stock', read_only=True)
+
+    class Meta:
+        model = ProductVariant
+        fields = ['id', 'name', 'price', 'available']
+
+    def get_name(self, obj):
+        return str(obj)
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -110,54 +138,42 @@ class ProductSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_by', 'created_at', 'updated_at']
 
     def get_primary_image(self, obj):
-        """Get the first image from the first active variant"""
-        import os
-        from django.conf import settings
-        
-        # Get first active variant
-        first_variant = obj.variants.filter(is_active=True).first()
-        if not first_variant:
-            # Fallback to any variant
-            first_variant = obj.variants.first()
-        
-        if first_variant:
-            # Path: products/{product_id}/{variant_id}/1.jpg
-            image_path = f'/assets/images/products/{obj.id}/{first_variant.id}/1.jpg'
-            variant_folder = os.path.join(
-                settings.BASE_DIR,
-                'apps', 'assets', 'images', 'products',
-                str(obj.id),
-                str(first_variant.id)
-            )
-            
-            # Check if the image file exists
-            if os.path.exists(os.path.join(variant_folder, '1.jpg')):
-                return {
-                    'id': f"{obj.id}_{first_variant.id}_1",
-                    'image': image_path,
-                    'is_primary': True,
-                    'sort_order': 0,
-                    'created_at': obj.created_at
-                }
+        """Get the first image of the product's primary variant"""
+        if obj.primary_variant_id:
+            # Variants are prefetched by ProductViewSet - pick the primary one in Python
+            primary_variant = next((v for v in obj.variants.all() if v.id == obj.primary_variant_id), None)
+            if primary_variant:
+                primary = next((image for image in primary_variant.images.all() if image.is_primary), None)
+                if primary:
+                    derivatives = image_derivatives(primary)
+                    return {
+                        'id': f"{obj.id}_{primary_variant.id}_1",
+                        'image': asset_url(primary.path),
+                        'thumbnail': derivatives['thumb']['webp'] if derivatives else asset_url(primary.path),
+                        'derivatives': derivatives,
+                        'is_primary': True,
+                        'sort_order': 0,
+                        'created_at': obj.created_at
+                    }
         
         # Fallback to default image
         return {
             'id': None,
             'image': '/assets/images/1.jpg',
+            'thumbnail': '/assets/images/1.jpg',
+            'derivatives': None,
             'is_primary': True,
             'sort_order': 0,
             'created_at': obj.created_at
         }
     
     def get_price_range(self, obj):
-        """Get price range from variants"""
-        variants = obj.variants.filter(is_active=True)
-        if not variants.exists():
+        """Get price range from the denormalized min/max active variant price"""
+        if obj.min_price is None:
             return None
         
-        prices = variants.values_list('price', flat=True)
-        min_price = min(prices)
-        max_price = max(prices)
+        min_price = obj.min_price
+        max_price = obj.max_price
         
         if min_price == max_price:
             return {
@@ -174,11 +190,86 @@ class ProductSerializer(serializers.ModelSerializer):
     
     def get_variants_count(self, obj):
         """Get count of active variants"""
-        return obj.variants.filter(is_active=True).count()
+        return obj.active_variants_count
 
 
 class ImeiSerializer(serializers.ModelSerializer):
+    sku = serializers.CharField(source='product_variant.sku', read_only=True)
+    product_name = serializers.CharField(source='product_variant.product.name', read_only=True)
+
     class Meta:
         model = Imei
-        fields = ['id', 'product_variant', 'imei', 'status', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at'] 
\ No newline at end of file
+        fields = ['id', 'product_variant', 'sku', 'product_name', 'imei', 'status',
+                  'stock_in_item', 'stock_out_item', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+
+class ImeiRegistrationSerializer(serializers.Serializer):
+    """A scanned batch of IMEIs received on one stock-in line"""
+    stock_in_item = serializers.PrimaryKeyRelatedField(queryset=StockInItem.objects.all())
+    imeis = serializers.ListField(
+        child=serializers.CharField(max_length=32), allow_empty=False, max_length=MAX_BATCH
+    )
+
+
+class PriceRuleSerializer(serializers.Serializer):
+    """One repricing rule: a selector (brand / product / skus) and a price change"""
+    brand = serializers.IntegerField(required=False)
+    product = serializers.IntegerField(required=False)
+    skus = serializers.ListField(child=serializers.CharField(max_length=50), required=False, allow_empty=False)
+    price = serializers.DecimalField(max_digits=12, decimal_places=0, min_value=0, required=False)
+    percent = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=-99, required=False)
+    round_to = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        if not any(key in attrs for key in ('brand', 'product', 'skus')):
+            raise serializers.ValidationError('One of brand, product or skus is required')
+        if ('price' in attrs) == ('percent' in attrs):
+            raise serializers.ValidationError('Exactly one of price or percent is required')
+        return attrs
+
+
+class RepriceSerializer(serializers.Serializer):
+    rules = PriceRuleSerializer(many=True, allow_empty=False)
+
+
+class VariantMatrixSerializer(serializers.Serializer):
+    """Option values to combine and the pricing rule of the generated variants"""
+    ram = serializers.ListField(child=serializers.CharField(max_length=20), required=False, default=list)
+    rom = serializers.ListField(child=serializers.CharField(max_length=20), required=False, default=list)
+    color = serializers.ListField(child=serializers.CharField(max_length=50), required=False, default=list)
+    base_price = serializers.DecimalField(max_digits=12, decimal_places=0, min_value=0)
+    ram_prices = serializers.DictField(
+        child=serializers.DecimalField(max_digits=12, decimal_places=0, min_value=0), required=False
+    )
+    rom_prices = serializers.DictField(
+        child=serializers.DecimalField(max_digits=12, decimal_places=0, min_value=0), required=False
+    )
+    color_prices = serializers.DictField(
+        child=serializers.DecimalField(max_digits=12, decimal_places=0, min_value=0), required=False
+    )
+
+    def validate(self, attrs):
+        from .matrix import MAX_COMBINATIONS
+
+        size = 1
+        for field in ('ram', 'rom', 'color'):
+            attrs[field] = list(dict.fromkeys(value.strip() for value in attrs[field] if value.strip()))
+            # The database compares option values without case
+            if len({value.casefold() for value in attrs[field]}) < len(attrs[field]):
+                raise serializers.ValidationError({field: 'Values must differ by more than letter case'})
+            size *= len(attrs[field]) or 1
+        if not (attrs['ram'] or attrs['rom'] or attrs['color']):
+            raise serializers.ValidationError('At least one ram, rom or color value is required')
+        if size > MAX_COMBINATIONS:
+            raise serializers.ValidationError(f'At most {MAX_COMBINATIONS} combinations per request')
+        return attrs
+
+
+class PriceHistorySerializer(serializers.ModelSerializer):
+    changed_by_name = serializers.CharField(source='changed_by.username', read_only=True, default=None)
+
+    class Meta:
+        model = PriceHistory
+        fields = ['id', 'product_variant', 'old_price', 'new_price', 'changed_by', 'changed_by_name', 'changed_at']
+        read_only_fields = fields
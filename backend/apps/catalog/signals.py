@@ -0,0 +1,179 @@
+"""
+Signal handlers keeping derived catalog data (search index, scan index, facet
+index, change log, response cache) in sync with writes.
+Connected in CatalogConfig.ready().
+"""
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from apps.inventory.signals import stock_changed
+
+from . import changelog, index_changes, response_cache, search
+from .models import Brand, CatalogChange, Product, ProductImage, ProductVariant, VariantImage
+
+
+# Sent by bulk writers (bulk_create / queryset.update bypass the model signals)
+# with the ids of every product whose rows or variants they changed, and the
+# names of the changed fields when known (fields=None means anything changed)
+products_bulk_changed = Signal()
+
+
+@receiver(pre_save, sender=Brand)
+def remember_brand_rename(sender, instance, **kwargs):
+    """Flag renames so only then the brand's products are re-indexed"""
+    if instance.pk:
+        old_name = Brand.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+        instance._renamed = old_name is not None and old_name != instance.name
+    else:
+        instance._renamed = False
+
+
+@receiver(post_save, sender=Brand)
+def reindex_brand_products(sender, instance, raw=False, **kwargs):
+    if not raw and getattr(instance, '_renamed', False):
+        search.index_products(instance.products.values_list('id', flat=True))
+
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=ProductVariant)
+def remember_indexed_values(sender, instance, **kwargs):
+    """Baseline for telling saves that change a search document from the rest"""
+    instance._indexed_values = search.indexed_values(instance)
+
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    if not raw and search.needs_reindex(instance, created, update_fields):
+        search.index_products([instance.pk])
+
+
+@receiver(post_save, sender=ProductVariant)
+def reindex_variant(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    if not raw and search.needs_reindex(instance, created, update_fields):
+        search.index_products([instance.product_id])
+
+
+@receiver(products_bulk_changed)
+def reindex_bulk_products(sender, product_ids, fields=None, **kwargs):
+    if fields is None or not search.INDEXED_FIELDS.isdisjoint(fields):
+        search.index_products(product_ids)
+
+
+# Scan and facet indexes (process memory): committed writes go to the shared feed,
+# from which every worker's copy catches up before its next read
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def publish_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_changes.publish_on_commit(product_ids=[instance.pk])
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def publish_variant(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_changes.publish_on_commit(product_ids=[instance.product_id], variant_ids=[instance.pk])
+
+
+@receiver(post_save, sender='inventory.Inventory')
+@receiver(post_delete, sender='inventory.Inventory')
+def publish_stock(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_changes.publish_on_commit(variant_ids=[instance.product_variant_id])
+
+
+@receiver(stock_changed)
+def publish_ledger_stock(sender, on_hand, **kwargs):
+    index_changes.publish_on_commit(variant_ids=list(on_hand))
+
+
+@receiver(products_bulk_changed)
+def publish_bulk_products(sender, product_ids, **kwargs):
+    index_changes.publish_on_commit(product_ids=product_ids)
+
+
+# Change log for delta sync; a variant write also changes its product's summary
+
+@receiver(post_save, sender=Brand)
+def log_brand(sender, instance, raw=False, **kwargs):
+    if not raw:
+        changelog.record_changes(CatalogChange.BRAND, [instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def log_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        changelog.record_changes(CatalogChange.PRODUCT, [instance.pk])
+
+
+@receiver(post_save, sender=ProductVariant)
+def log_variant(sender, instance, raw=False, **kwargs):
+    if not raw:
+        changelog.record_changes(CatalogChange.VARIANT, [instance.pk])
+        changelog.record_changes(CatalogChange.PRODUCT, [instance.product_id])
+
+
+@receiver(post_save, sender='inventory.Inventory')
+def log_inventory(sender, instance, raw=False, **kwargs):
+    if not raw:
+        changelog.record_changes(CatalogChange.INVENTORY, [instance.product_variant_id])
+
+
+@receiver(stock_changed)
+def log_ledger_stock(sender, on_hand, **kwargs):
+    changelog.record_changes(CatalogChange.INVENTORY, list(on_hand))
+
+
+@receiver(post_delete, sender=Brand)
+def log_brand_deleted(sender, instance, **kwargs):
+    changelog.record_changes(CatalogChange.BRAND, [instance.pk], deleted=True)
+
+
+@receiver(post_delete, sender=Product)
+def log_product_deleted(sender, instance, **kwargs):
+    changelog.record_changes(CatalogChange.PRODUCT, [instance.pk], deleted=True)
+
+
+@receiver(post_delete, sender=ProductVariant)
+def log_variant_deleted(sender, instance, **kwargs):
+    changelog.record_changes(CatalogChange.VARIANT, [instance.pk], deleted=True)
+    changelog.record_changes(CatalogChange.PRODUCT, [instance.product_id])
+
+
+@receiver(post_delete, sender='inventory.Inventory')
+def log_inventory_deleted(sender, instance, **kwargs):
+    changelog.record_changes(CatalogChange.INVENTORY, [instance.product_variant_id], deleted=True)
+
+
+@receiver(products_bulk_changed)
+def log_bulk_products(sender, product_ids, fields=None, **kwargs):
+    variant_ids = list(ProductVariant.objects.filter(product_id__in=product_ids).values_list('id', flat=True))
+    changelog.record_changes(CatalogChange.PRODUCT, product_ids)
+    changelog.record_changes(CatalogChange.VARIANT, variant_ids)
+    if fields is None:
+        changelog.record_changes(CatalogChange.INVENTORY, variant_ids)
+
+
+# Response cache: any committed catalog write starts a new cache generation
+CACHED_MODELS = (Brand, Product, ProductVariant, ProductImage, VariantImage, 'inventory.Inventory')
+
+
+def invalidate_responses(sender, raw=False, **kwargs):
+    if not raw:
+        response_cache.invalidate()
+
+
+for model in CACHED_MODELS:
+    post_save.connect(invalidate_responses, sender=model, dispatch_uid=f'response_cache_save_{model}')
+    post_delete.connect(invalidate_responses, sender=model, dispatch_uid=f'response_cache_delete_{model}')
+
+
+@receiver(products_bulk_changed)
+def invalidate_bulk_responses(sender, product_ids, **kwargs):
+    response_cache.invalidate()
+
+
+@receiver(stock_changed)
+def invalidate_stock_responses(sender, on_hand, **kwargs):
+    response_cache.invalidate()
@@ -0,0 +1,60 @@
+"""
+Denormalized catalog columns: the product summary (price range, active variant count,
+primary variant), the product stock flag and the variant display name.
+
+The summary columns on ``Product`` are recomputed with a single set-based UPDATE whose
+values are correlated subqueries over ``product_variants``, so the figures are always
+computed inside the writing transaction and the same code serves one product or a
+whole backfill.
+"""
+from django.db.models import (
+    Case, CharField, Count, Exists, F, IntegerField, Max, Min, OuterRef, Q, Subquery, Value, When
+)
+from django.db.models.functions import Coalesce, Concat
+
+
+def summary_expressions(variant_model):
+    """
+    UPDATE expressions for the product summary columns.
+    Takes the variant model as an argument so migrations can pass the historical model.
+    """
+    variants = variant_model.objects.filter(product=OuterRef('pk')).order_by()
+    active = variants.filter(is_active=True)
+
+    def aggregate(queryset, expression):
+        return Subquery(
+            queryset.values('product').annotate(value=expression).values('value')[:1]
+        )
+
+    def first_id(queryset):
+        return Subquery(queryset.order_by('ram', 'rom', 'color', 'id').values('id')[:1])
+
+    return {
+        'min_price': aggregate(active, Min('price')),
+        'max_price': aggregate(active, Max('price')),
+        'active_variants_count': Coalesce(
+            aggregate(active, Count('id')), 0, output_field=IntegerField()
+        ),
+        # First active variant, falling back to any variant
+        'primary_variant': Coalesce(first_id(active), first_id(variants)),
+    }
+
+
+def has_stock_expression(variant_model):
+    """UPDATE expression for ``has_stock``: any variant of the product has stock on hand"""
+    return Exists(
+        variant_model.objects.filter(product=OuterRef('pk'), inventory__on_hand__gt=0).order_by()
+    )
+
+
+def display_name_expression(product_model):
+    """
+    UPDATE expression for ``ProductVariant.display_name``, the SQL twin of
+    ``variant_display_name``: product name and the non-empty RAM / ROM / color.
+    """
+    def part(field):
+        filled = Q(**{f'{field}__isnull': False}) & ~Q(**{field: ''})
+        return Case(When(filled, then=Concat(Value(' - '), F(field))), default=Value(''))
+
+    name = Subquery(product_model.objects.filter(pk=OuterRef('product_id')).values('name')[:1])
+    return Concat(name, part('ram'), part('rom'), part('color'), output_field=CharField())
@@ -0,0 +1,1208 @@
+"""
+Test suite for the catalog API
+Run with: python manage.py test apps.catalog.tests
+"""
+import io
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.catalog.models import Brand, CatalogChange, PriceHistory, Product, ProductVariant, VariantImage
+from apps.catalog import index_changes
+from apps.catalog import search as catalog_search
+from apps.catalog.facets import facet_index
+from apps.catalog.scan_index import scan_index
+from apps.catalog.search import search
+from apps.inventory.models import Inventory, StockMovement
+
+
+class TestProductListQueryBudget(TestCase):
+    """GET /api/products/ must run a fixed number of queries"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='catalog', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.brand = Brand.objects.create(name='Test Brand', slug='test-brand')
+        self.next_product = 0
+
+    def create_products(self, count, variants_per_product):
+        for _ in range(count):
+            self.next_product += 1
+            product = Product.objects.create(
+                name=f'Phone {self.next_product}',
+                sku=f'PHONE-{self.next_product}',
+                brand=self.brand
+            )
+            for v in range(variants_per_product):
+                variant = ProductVariant.objects.create(
+                    product=product,
+                    rom=f'{128 * (v + 1)}GB',
+                    sku=f'PHONE-{self.next_product}-{v}',
+                    price=1000000 * (v + 1)
+                )
+                Inventory.objects.create(product_variant=variant, on_hand=v)
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/', {'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_is_constant(self):
+        """Query count does not grow with products or variants"""
+        self.create_products(2, 1)
+        small = self.count_list_queries()
+
+        self.create_products(30, 4)
+        large = self.count_list_queries()
+
+        self.assertEqual(small, large)
+
+    def test_query_budget(self):
+        """count + page + variants (with inventory) + variant images + product images"""
+        self.create_products(10, 3)
+        self.assertEqual(self.count_list_queries(), 5)
+
+    def test_list_payload_uses_prefetched_data(self):
+        """Serialized values match the underlying rows"""
+        self.create_products(1, 3)
+        response = self.client.get('/api/products/')
+        product = response.data['results'][0]
+
+        self.assertEqual(product['variants_count'], 3)
+        self.assertEqual(product['price_range']['min'], 1000000)
+        self.assertEqual(product['price_range']['max'], 3000000)
+        self.assertEqual(sorted(v['current_stock'] for v in product['variants']), [0, 1, 2])
+
+
+class TestBrandList(TestCase):
+    """GET /api/brands/ runs one annotated query and reads logos through the cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.assets = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(ASSETS_ROOT=self.assets.name)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(username='brands', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.brand = Brand.objects.create(name='Apple', slug='apple')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.assets.cleanup()
+
+    def add_brands(self, count):
+        for _ in range(count):
+            number = Brand.objects.count()
+            brand = Brand.objects.create(name=f'Brand {number}', slug=f'brand-{number}')
+            Product.objects.create(name=f'Phone {brand.id}', sku=f'P{brand.id}', brand=brand)
+
+    def list_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/brands/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def logo(self):
+        brand = Brand.objects.get(pk=self.brand.pk)
+        Brand.resolve_logo_urls([brand])
+        return brand.logo_url
+
+    def test_query_count_is_constant(self):
+        self.add_brands(2)
+        few = self.list_queries()
+        self.add_brands(5)
+        self.assertEqual(self.list_queries(), few)
+
+        response = self.client.get('/api/brands/')
+        counts = {row['name']: row['products_count'] for row in response.json()['results']}
+        self.assertEqual(counts['Apple'], 0)
+        self.assertEqual(counts['Brand 1'], 1)
+
+    def test_logo_cache_follows_logo_and_brand_changes(self):
+        legacy_dir = self.brand.legacy_logo_dir()
+        os.makedirs(legacy_dir)
+        with open(os.path.join(legacy_dir, '1.jpg'), 'wb') as file:
+            file.write(b'x')
+        self.assertEqual(self.logo(), f'/assets/images/brands/{self.brand.id}/1.jpg')
+
+        # Served from the cache: the disk is not checked again
+        os.remove(os.path.join(legacy_dir, '1.jpg'))
+        self.assertEqual(self.logo(), f'/assets/images/brands/{self.brand.id}/1.jpg')
+
+        logo = SimpleUploadedFile('logo.svg', b'<svg xmlns="http://www.w3.org/2000/svg"/>', 'image/svg+xml')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/brands/{self.brand.id}/upload_logo/', {'logo': logo}, format='multipart'
+            )
+        self.assertEqual(self.logo(), response.data['logo'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/brands/{self.brand.id}/', {'name': 'Apple Inc'}, format='json')
+        row = self.client.get('/api/brands/').json()['results'][0]
+        self.assertEqual((row['name'], row['logo']), ('Apple Inc', response.data['logo']))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'/api/brands/{self.brand.id}/delete_logo/').status_code, 200)
+        self.assertIsNone(self.logo())
+        self.assertIsNone(self.client.get('/api/brands/').json()['results'][0]['logo'])
+
+
+class TestCatalogSearch(TestCase):
+    """search= is served by the n-gram index"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='search', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        brand = Brand.objects.create(name='Samsung', slug='samsung')
+        self.product = Product.objects.create(name='Galaxy S24 Ultra', sku='SS-S24U', brand=brand)
+        self.black = ProductVariant.objects.create(
+            product=self.product, sku='SS-S24U-256-BLK', rom='256GB', color='Đen', price=30000000
+        )
+        self.purple = ProductVariant.objects.create(
+            product=self.product, sku='SS-S24U-512-TIM', rom='512GB', color='Tím', price=35000000
+        )
+
+    def search_variants(self, term):
+        response = self.client.get('/api/products/variants/', {'search': term})
+        return [variant['id'] for variant in response.data['results']]
+
+    def test_accent_insensitive(self):
+        self.assertEqual(self.search_variants('den'), [self.black.id])
+        self.assertEqual(self.search_variants('TÍM'), [self.purple.id])
+
+    def test_matches_across_fields(self):
+        self.assertEqual(self.search_variants('samsung 512'), [self.purple.id])
+        self.assertEqual(self.search_variants('s24u-512'), [self.purple.id])
+
+    def test_index_follows_renames(self):
+        self.product.name = 'Galaxy Z Fold'
+        self.product.save()
+        self.assertEqual(self.search_variants('ultra'), [])
+        self.assertEqual(len(self.search_variants('fold')), 2)
+
+    def test_saves_outside_the_indexed_fields_skip_reindexing(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.black.price = 29000000
+            self.black.save()
+            self.product.description = 'Flagship'
+            self.product.save()
+        self.assertFalse(any('search_postings' in query['sql'] for query in queries.captured_queries))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.black.color = 'Xám'
+            self.black.save()
+        self.assertTrue(any('search_postings' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(self.search_variants('xam'), [self.black.id])
+
+    def test_product_search(self):
+        response = self.client.get('/api/products/', {'search': 'galaxy'})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.product.id])
+
+    def test_fragments_match_inside_names_and_codes(self):
+        self.product.barcode = '8806095412345'
+        self.product.save()
+        self.assertEqual(len(self.search_variants('laxy')), 2)
+        self.assertEqual(self.search_variants('24u 512'), [self.purple.id])
+        self.assertEqual(self.search_variants('256-blk'), [self.black.id])
+        response = self.client.get('/api/products/', {'search': '0954123'})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.product.id])
+
+    def test_word_start_ranks_first(self):
+        brand = Brand.objects.create(name='Apple', slug='apple')
+        iphone = Product.objects.create(name='iPhone 15', sku='IP15', brand=brand)
+        stand = Product.objects.create(name='Phone Stand', sku='STAND', brand=brand)
+
+        response = self.client.get('/api/products/', {'search': 'phone'})
+
+        self.assertEqual([p['id'] for p in response.data['results']], [stand.id, iphone.id])
+
+    def test_broad_terms_fall_back_with_exact_count(self):
+        self.assertIsNone(search('s24u', 'variant', limit=1))
+        self.assertEqual(len(search('s24u', 'variant', limit=None)), 2)
+
+    def test_broad_terms_keep_the_index_matching(self):
+        black_1tb = ProductVariant.objects.create(
+            product=self.product, sku='SS-S24U-1TB-BLK', rom='1TB', color='Đen', price=40000000
+        )
+        with mock.patch.object(catalog_search, 'MAX_RESULTS', 1):
+            response = self.client.get('/api/products/variants/', {'search': 'den'})
+            self.assertEqual(response.data['count'], 2)
+            self.assertEqual(
+                sorted(variant['id'] for variant in response.data['results']), sorted([self.black.id, black_1tb.id])
+            )
+            self.assertEqual(self.search_variants('tím'), [self.purple.id])
+
+
+class TestScanIndex(TestCase):
+    """Barcode/SKU scans are answered from the in-memory index"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='scan', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        brand = Brand.objects.create(name='Apple', slug='apple')
+        self.product = Product.objects.create(
+            name='iPhone 15', sku='IP15', barcode='8935000000015', brand=brand
+        )
+        self.variant = ProductVariant.objects.create(
+            product=self.product, sku='IP15-128-BLK', rom='128GB', color='Black', price=20000000
+        )
+        self.inventory = Inventory.objects.create(product_variant=self.variant, on_hand=5)
+        scan_index.build()
+
+    def test_hit_does_not_query(self):
+        with self.assertNumQueries(0):
+            record = scan_index.lookup('ip15-128-blk')
+        self.assertEqual(record, {
+            'variant_id': self.variant.id, 'name': 'iPhone 15 - 128GB - Black',
+            'price': 20000000, 'on_hand': 5,
+        })
+
+    def test_product_codes_resolve_to_primary_variant(self):
+        self.assertEqual(scan_index.lookup('8935000000015')['variant_id'], self.variant.id)
+        self.assertEqual(scan_index.lookup('IP15')['variant_id'], self.variant.id)
+
+    def test_writes_keep_index_fresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inventory.on_hand = 2
+            self.inventory.save()
+            self.variant.sku = 'IP15-128-BLACK'
+            self.variant.price = 19000000
+            self.variant.save()
+
+        self.assertIsNone(scan_index.lookup('IP15-128-BLK'))
+        record = scan_index.lookup('IP15-128-BLACK')
+        self.assertEqual((record['price'], record['on_hand']), (19000000, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.variant.is_active = False
+            self.variant.save()
+        self.assertIsNone(scan_index.lookup('IP15-128-BLACK'))
+        self.assertIsNone(scan_index.lookup('IP15'))
+
+    def test_writes_from_another_process_reach_the_index(self):
+        # Written by another worker: no signal handler ran here, only the feed entry arrives
+        ProductVariant.objects.filter(pk=self.variant.pk).update(price=18000000)
+        Inventory.objects.filter(pk=self.inventory.pk).update(on_hand=1)
+        index_changes.publish(variant_ids=[self.variant.pk])
+
+        record = scan_index.lookup('IP15')
+        self.assertEqual((record['price'], record['on_hand']), (18000000, 1))
+
+        ProductVariant.objects.filter(pk=self.variant.pk).update(is_active=False)
+        index_changes.publish(product_ids=[self.product.pk], variant_ids=[self.variant.pk])
+        self.assertIsNone(scan_index.lookup('IP15-128-BLK'))
+        self.assertIsNone(scan_index.lookup('IP15'))
+
+    def test_endpoint_hit_does_not_query(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/variants/scan/', {'code': 'IP15'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['price'], 20000000)
+
+    def test_scan_endpoint(self):
+        response = self.client.get('/api/products/variants/scan/', {'code': 'IP15-128-BLK'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['variant_id'], self.variant.id)
+
+        response = self.client.get('/api/products/variants/scan/', {'code': 'UNKNOWN'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/products/variants/scan/')
+        self.assertEqual(response.status_code, 400)
+
+
+class TestCatalogImport(TestCase):
+    """POST /api/products/import/ bulk-creates products, variants and stock"""
+
+    HEADER = 'product_sku,name,brand,ram,rom,color,variant_sku,price,stock\n'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='import', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.brand = Brand.objects.create(name='Xiaomi', slug='xiaomi')
+        existing = Product.objects.create(name='Redmi 12', sku='RM12', brand=self.brand)
+        ProductVariant.objects.create(product=existing, sku='RM12-128', rom='128GB', price=4000000)
+
+    def upload(self, body, **data):
+        file = SimpleUploadedFile('catalog.csv', (self.HEADER + body).encode('utf-8'), 'text/csv')
+        return self.client.post('/api/products/import/', {'file': file, **data}, format='multipart')
+
+    def test_import_creates_rows(self):
+        response = self.upload(
+            'RN13,Redmi Note 13,xiaomi,8GB,256GB,Đen,RN13-256-BLK,5990000,7\n'
+            'RN13,,,8GB,256GB,Xanh,RN13-256-BLU,5990000,0\n'
+            'RM12,,,,256GB,,RM12-256,4500000,3\n'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created_products'], 1)
+        self.assertEqual(response.data['created_variants'], 3)
+        self.assertEqual(response.data['error_count'], 0)
+
+        product = Product.objects.get(sku='RN13')
+        self.assertEqual(product.created_by, self.user)
+        self.assertEqual(product.active_variants_count, 2)
+        self.assertEqual(Inventory.objects.get(product_variant__sku='RN13-256-BLK').on_hand, 7)
+        self.assertEqual(Product.objects.get(sku='RM12').max_price, 4500000)
+        self.assertEqual(
+            StockMovement.objects.filter(ref_type='CatalogImport').count(), 2
+        )
+
+        response = self.client.get('/api/products/variants/', {'search': 'note 13 xanh'})
+        self.assertEqual([v['sku'] for v in response.data['results']], ['RN13-256-BLU'])
+
+    def test_invalid_rows_are_reported(self):
+        response = self.upload(
+            'RN13,Redmi Note 13,xiaomi,8GB,256GB,,RN13-256,5990000,1\n'
+            'RN13,,,8GB,256GB,,RN13-256-B,5990000,1\n'
+            'RM12,,,,128GB,,RM12-128,4000000,1\n'
+            'P1,Phone,unknown,,,,P1-1,100,0\n'
+            'RN13,,,8GB,512GB,,RN13-512,abc,0\n'
+        )
+        self.assertEqual(response.data['created_variants'], 1)
+        self.assertEqual([e['row'] for e in response.data['errors']], [3, 4, 5, 6])
+
+    def test_duplicates_are_found_regardless_of_case(self):
+        response = self.upload(
+            'rm12,,,,256GB,,rm12-128,4500000,1\n'
+            'rm12,,,,128gb,,RM12-128B,4000000,1\n'
+            'rm12,,,,512GB,,RM12-512,5000000,1\n'
+            'RM12,,,,512gb,,RM12-512B,5000000,1\n'
+        )
+        self.assertEqual(response.data['created_variants'], 1)
+        self.assertEqual([e['row'] for e in response.data['errors']], [2, 3, 5])
+        self.assertEqual(Product.objects.get(sku='RM12').variants.count(), 2)
+
+    def test_dry_run_rolls_back(self):
+        response = self.upload('RN13,Redmi Note 13,xiaomi,,,,RN13-1,100,1\n', dry_run='true')
+        self.assertEqual(response.data['created_variants'], 1)
+        self.assertFalse(Product.objects.filter(sku='RN13').exists())
+
+    def test_rejects_bad_files(self):
+        file = SimpleUploadedFile('catalog.txt', b'x', 'text/plain')
+        response = self.client.post('/api/products/import/', {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+        file = SimpleUploadedFile('catalog.csv', b'sku,name\n', 'text/csv')
+        response = self.client.post('/api/products/import/', {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+        file = SimpleUploadedFile('catalog.xlsx', b'not a workbook', 'application/octet-stream')
+        response = self.client.post('/api/products/import/', {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_oversized_numbers_are_reported_per_row(self):
+        response = self.upload(
+            'RN13,Redmi Note 13,xiaomi,,128GB,,RN13-128,1000000000000,1\n'
+            'RN13,Redmi Note 13,xiaomi,,256GB,,RN13-256,5990000,99999999999\n'
+            'RN13,Redmi Note 13,xiaomi,,512GB,,RN13-512,999999999999,1\n'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([e['row'] for e in response.data['errors']], [2, 3])
+        self.assertEqual(response.data['created_variants'], 1)
+
+
+class TestBulkReprice(TestCase):
+    """POST /api/products/variants/reprice/ applies rules with set-based updates"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='pricing', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.apple = Brand.objects.create(name='Apple', slug='apple')
+        oppo = Brand.objects.create(name='Oppo', slug='oppo')
+        self.iphone = Product.objects.create(name='iPhone 15', sku='IP15', brand=self.apple)
+        self.ip128 = ProductVariant.objects.create(product=self.iphone, sku='IP15-128', rom='128GB', price=20000000)
+        self.ip256 = ProductVariant.objects.create(product=self.iphone, sku='IP15-256', rom='256GB', price=23000000)
+        reno = Product.objects.create(name='Reno 11', sku='RENO11', brand=oppo)
+        self.reno = ProductVariant.objects.create(product=reno, sku='RENO11-256', rom='256GB', price=10000000)
+
+    def reprice(self, rules):
+        return self.client.post('/api/products/variants/reprice/', {'rules': rules}, format='json')
+
+    def test_rules_apply_in_order(self):
+        response = self.reprice([
+            {'brand': self.apple.id, 'percent': -10, 'round_to': 100000},
+            {'skus': ['IP15-256'], 'price': 21500000},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'matched': [2, 1], 'changed': 2})
+
+        self.ip128.refresh_from_db()
+        self.ip256.refresh_from_db()
+        self.reno.refresh_from_db()
+        self.assertEqual((self.ip128.price, self.ip256.price, self.reno.price), (18000000, 21500000, 10000000))
+
+        self.iphone.refresh_from_db()
+        self.assertEqual((self.iphone.min_price, self.iphone.max_price), (18000000, 21500000))
+
+        history = PriceHistory.objects.get(product_variant=self.ip256)
+        self.assertEqual((history.old_price, history.new_price), (23000000, 21500000))
+        self.assertEqual(history.changed_by, self.user)
+
+    def test_unchanged_prices_have_no_history(self):
+        response = self.reprice([{'product': self.iphone.id, 'percent': 0}])
+        self.assertEqual(response.data, {'matched': [2], 'changed': 0})
+        self.assertFalse(PriceHistory.objects.exists())
+
+    def test_invalid_rules(self):
+        self.assertEqual(self.reprice([{'price': 100}]).status_code, 400)
+        self.assertEqual(self.reprice([{'brand': self.apple.id}]).status_code, 400)
+        self.assertEqual(self.reprice([{'brand': self.apple.id, 'percent': -100}]).status_code, 400)
+        self.assertEqual(self.reprice([]).status_code, 400)
+
+    def test_patch_records_history(self):
+        response = self.client.patch(
+            f'/api/products/variants/{self.reno.id}/', {'price': 9500000}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(f'/api/products/variants/{self.reno.id}/price_history/')
+        self.assertEqual(response.data['results'][0]['new_price'], '9500000')
+
+
+@override_settings(IMAGE_DERIVATIVE_WORKERS=0)
+class TestVariantImageManifest(TestCase):
+    """Uploads and deletes keep the VariantImage manifest; rebuild_image_manifest re-indexes the disk"""
+
+    def setUp(self):
+        self.assets = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(ASSETS_ROOT=self.assets.name)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(username='manifest', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        brand = Brand.objects.create(name='Oppo', slug='oppo')
+        self.product = Product.objects.create(name='Oppo Reno 11', sku='RENO11', brand=brand)
+        self.variant = ProductVariant.objects.create(product=self.product, sku='RENO11-256', price=10000000)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.assets.cleanup()
+
+    def photo(self, color):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile(f'{color}.jpg', buffer.getvalue(), 'image/jpeg')
+
+    def test_upload_and_delete_write_the_manifest(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/products/variants/{self.variant.id}/upload_images/',
+                {'images': [self.photo('red'), self.photo('blue')]}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 201)
+        rows = list(self.variant.images.order_by('sort_order').values_list('sort_order', 'path'))
+        self.assertEqual([sort_order for sort_order, _ in rows], [1, 2])
+        self.assertTrue(all(os.path.exists(os.path.join(self.assets.name, path)) for _, path in rows))
+
+        response = self.client.delete(
+            f'/api/products/variants/{self.variant.id}/delete_image/', {'image_number': 1}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(self.variant.images.values_list('sort_order', flat=True)), [2])
+        self.assertFalse(os.path.exists(os.path.join(self.assets.name, rows[0][1])))
+
+        response = self.client.delete(
+            f'/api/products/variants/{self.variant.id}/delete_image/', {'image_number': 1}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_rebuild_command_indexes_the_disk(self):
+        from apps.catalog.images import variant_image_dir, variant_image_relpath
+
+        folder = variant_image_dir(self.product.id, self.variant.id)
+        os.makedirs(folder)
+        for file_name in ('1.jpg', '3.jpg', 'notes.txt'):
+            with open(os.path.join(folder, file_name), 'wb') as file:
+                file.write(b'x')
+        blob = VariantImage.objects.create(
+            product_variant=self.variant, path='images/blobs/ab/abc.jpg', sort_order=5
+        )
+        VariantImage.objects.create(
+            product_variant=self.variant, path=variant_image_relpath(self.product.id, self.variant.id, '9.jpg'),
+            sort_order=9,
+        )
+
+        call_command('rebuild_image_manifest', stdout=io.StringIO())
+
+        self.assertEqual(
+            set(self.variant.images.values_list('path', 'sort_order')),
+            {
+                (variant_image_relpath(self.product.id, self.variant.id, '1.jpg'), 1),
+                (variant_image_relpath(self.product.id, self.variant.id, '3.jpg'), 3),
+                (blob.path, 5),
+            }
+        )
+
+
+@override_settings(IMAGE_DERIVATIVE_WORKERS=0)
+class TestImageDerivatives(TestCase):
+    """Uploaded variant images get metadata-free thumbnails and WebP copies"""
+
+    def setUp(self):
+        self.assets = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(ASSETS_ROOT=self.assets.name)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(username='images', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        brand = Brand.objects.create(name='Vivo', slug='vivo')
+        product = Product.objects.create(name='Vivo V30', sku='V30', brand=brand)
+        self.variant = ProductVariant.objects.create(product=product, sku='V30-256', rom='256GB', price=9000000)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.assets.cleanup()
+
+    def photo(self):
+        from PIL import Image
+
+        exif = Image.Exif()
+        exif[0x010F] = 'CameraMaker'
+        buffer = io.BytesIO()
+        Image.new('RGB', (1600, 1200), 'red').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), 'image/jpeg')
+
+    def test_upload_renders_derivatives(self):
+        from PIL import Image
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/products/variants/{self.variant.id}/upload_images/',
+                {'images': [self.photo()]}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 201)
+
+        image = self.variant.images.get()
+        self.assertTrue(image.has_derivatives)
+        folder, file_name = image.path.rsplit('/', 1)
+        stem = file_name.split('.')[0]
+        with Image.open(os.path.join(self.assets.name, folder, 'derived', f'{stem}_thumb.webp')) as thumb:
+            self.assertEqual(thumb.size, (200, 150))
+            self.assertEqual(len(thumb.getexif()), 0)
+
+        response = self.client.get(f'/api/products/variants/{self.variant.id}/')
+        data = response.data['images'][0]
+        self.assertTrue(data['thumbnail'].endswith(f'/derived/{stem}_thumb.webp'))
+        self.assertTrue(data['derivatives']['medium']['jpg'].endswith(f'/derived/{stem}_medium.jpg'))
+
+    def test_identical_uploads_share_one_blob(self):
+        other = ProductVariant.objects.create(
+            product=self.variant.product, sku='V30-256-B', rom='256GB', color='Blue', price=9000000
+        )
+        photo = self.photo().read()
+        for variant in (self.variant, other):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    f'/api/products/variants/{variant.id}/upload_images/',
+                    {'images': [SimpleUploadedFile('a.jpg', photo, 'image/jpeg')]}, format='multipart'
+                )
+
+        paths = set(VariantImage.objects.values_list('path', flat=True))
+        self.assertEqual(len(paths), 1)
+        path = paths.pop()
+        self.assertTrue(path.startswith('images/blobs/'))
+        self.assertTrue(other.images.get().has_derivatives)
+        blob_file = os.path.join(self.assets.name, path)
+
+        response = self.client.get(f'/assets/{path}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        # The blob stays while another variant still uses it
+        self.client.delete(f'/api/products/variants/{self.variant.id}/delete_image/', {'image_number': 1})
+        self.assertTrue(os.path.exists(blob_file))
+        self.client.delete(f'/api/products/variants/{other.id}/delete_image/', {'image_number': 1})
+        self.assertFalse(os.path.exists(blob_file))
+
+    def test_brand_logo_is_content_addressed(self):
+        brand = self.variant.product.brand
+        logo = SimpleUploadedFile('logo.svg', b'<svg xmlns="http://www.w3.org/2000/svg"/>', 'image/svg+xml')
+        response = self.client.post(f'/api/brands/{brand.id}/upload_logo/', {'logo': logo}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertRegex(response.data['logo'], r'^/assets/images/blobs/[0-9a-f]{2}/[0-9a-f]{64}\.svg$')
+
+        response = self.client.get(f'/api/brands/{brand.id}/')
+        self.assertTrue(response.data['logo'].endswith('.svg'))
+
+
+@override_settings(CATALOG_SYNC_SETTLE_SECONDS=0)
+class TestCatalogSync(TestCase):
+    """GET /api/products/sync/ returns what changed after a catalog version"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sync', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            brand = Brand.objects.create(name='Nokia', slug='nokia')
+            self.product = Product.objects.create(name='Nokia G42', sku='G42', brand=brand)
+            self.variant = ProductVariant.objects.create(product=self.product, sku='G42-128', rom='128GB', price=4000000)
+            self.inventory = Inventory.objects.create(product_variant=self.variant, on_hand=3)
+
+    def sync(self, since, **params):
+        response = self.client.get('/api/products/sync/', {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_full_then_delta(self):
+        full = self.sync(0)
+        self.assertEqual([b['name'] for b in full['brands']], ['Nokia'])
+        self.assertEqual([p['sku'] for p in full['products']], ['G42'])
+        self.assertEqual(full['inventory'], [{'product_variant_id': self.variant.id, 'on_hand': 3}])
+        self.assertEqual(self.sync(full['version'])['products'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inventory.on_hand = 1
+            self.inventory.save()
+        delta = self.sync(full['version'])
+        self.assertEqual(delta['inventory'], [{'product_variant_id': self.variant.id, 'on_hand': 1}])
+        self.assertEqual((delta['brands'], delta['products'], delta['variants']), ([], [], []))
+
+    def test_tombstones(self):
+        version = self.sync(0)['version']
+        with self.captureOnCommitCallbacks(execute=True):
+            other = ProductVariant.objects.create(product=self.product, sku='G42-256', rom='256GB', price=5000000)
+        other_id = other.id
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+
+        delta = self.sync(version)
+        self.assertEqual(delta['deleted'], {'variant': [other_id]})
+        self.assertEqual([p['max_price'] for p in delta['products']], [4000000])
+
+    def test_paging_and_reset(self):
+        first = self.sync(0, limit=2)
+        self.assertTrue(first['has_more'])
+        rest = self.sync(first['version'])
+        self.assertFalse(rest['has_more'])
+        self.assertTrue(self.sync(rest['version'] + 100)['reset'])
+
+    @override_settings(CATALOG_SYNC_SETTLE_SECONDS=60)
+    def test_recent_changes_wait_for_earlier_commits(self):
+        CatalogChange.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        version = self.sync(0)['version']
+        # Numbered first but committed last: still recent when the next entry is old enough
+        late = CatalogChange.objects.create(model=CatalogChange.PRODUCT, object_id=self.product.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inventory.on_hand = 1
+            self.inventory.save()
+        CatalogChange.objects.exclude(pk=late.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+
+        self.assertEqual(self.sync(version)['version'], version)
+
+        CatalogChange.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        delta = self.sync(version)
+        self.assertEqual(delta['version'], CatalogChange.objects.order_by('-id').first().id)
+        self.assertEqual([p['id'] for p in delta['products']], [self.product.id])
+        self.assertEqual(delta['inventory'], [{'product_variant_id': self.variant.id, 'on_hand': 1}])
+
+
+class TestProductFacets(TestCase):
+    """GET /api/products/ filters by variant facets and returns facet counts"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='facets', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.apple = Brand.objects.create(name='Apple', slug='apple')
+        self.samsung = Brand.objects.create(name='Samsung', slug='samsung')
+        self.iphone = Product.objects.create(name='iPhone 15', sku='IP15', brand=self.apple)
+        self.galaxy = Product.objects.create(name='Galaxy A55', sku='A55', brand=self.samsung)
+        self.iphone_128 = ProductVariant.objects.create(
+            product=self.iphone, sku='IP15-128', ram='6GB', rom='128GB', color='Black', price=22000000,
+        )
+        ProductVariant.objects.create(
+            product=self.iphone, sku='IP15-256', ram='6GB', rom='256GB', color='Blue', price=25000000,
+        )
+        self.galaxy_128 = ProductVariant.objects.create(
+            product=self.galaxy, sku='A55-128', ram='8GB', rom='128GB', color='Black', price=9000000,
+        )
+        Inventory.objects.create(product_variant=self.iphone_128, on_hand=2)
+        facet_index.build()
+
+    def list_skus(self, **params):
+        response = self.client.get('/api/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(product['sku'] for product in response.data['results'])
+
+    def test_filter_by_variant_facets(self):
+        self.assertEqual(self.list_skus(rom='128GB'), ['A55', 'IP15'])
+        self.assertEqual(self.list_skus(rom='256GB'), ['IP15'])
+        self.assertEqual(self.list_skus(ram='8GB', color='Blue'), [])
+        self.assertEqual(self.list_skus(ram='6GB,8GB', price_band='5m-10m'), ['A55'])
+        self.assertEqual(self.list_skus(brand=f'{self.apple.id},{self.samsung.id}'), ['A55', 'IP15'])
+
+    def test_variant_facets_match_on_one_variant(self):
+        # The iPhone has a 128GB variant and a Blue one, but no Blue 128GB variant
+        self.assertEqual(self.list_skus(rom='128GB', color='Blue'), [])
+        self.assertEqual(self.list_skus(rom='256GB', color='Blue'), ['IP15'])
+        # Only the Black 128GB iPhone is in stock
+        self.assertEqual(self.list_skus(rom='256GB', in_stock='1'), [])
+        self.assertEqual(self.list_skus(rom='128GB', in_stock='1'), ['IP15'])
+
+        response = self.client.get('/api/products/', {'color': 'Blue', 'in_stock': '1', 'facets': '1'})
+        facets = response.data['facets']
+        self.assertEqual(response.data['count'], 0)
+        # In stock and Blue on one variant: none; the colors of the variants in stock
+        self.assertEqual(facets['in_stock'], {})
+        self.assertEqual(facets['color'], {'Black': 1})
+        self.assertEqual(facets['rom'], {})
+
+    def test_in_stock_facet_agrees_with_has_stock(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.galaxy_128.is_active = False
+            self.galaxy_128.save()
+            Inventory.objects.create(product_variant=self.galaxy_128, on_hand=4)
+        self.galaxy.refresh_from_db(fields=['has_stock'])
+        self.assertTrue(self.galaxy.has_stock)
+
+        self.assertEqual(self.list_skus(in_stock='1'), ['A55', 'IP15'])
+        response = self.client.get('/api/products/', {'facets': '1'})
+        self.assertEqual(response.data['facets']['in_stock'], {'1': 2})
+
+    def test_writes_from_another_process_reach_the_index(self):
+        # A worker that did not run the signal handlers catches up from the shared feed
+        ProductVariant.objects.filter(pk=self.galaxy_128.pk).update(color='Green')
+        index_changes.publish(product_ids=[self.galaxy.pk])
+
+        self.assertEqual(self.list_skus(color='Green'), ['A55'])
+
+    def test_counts_keep_alternatives_of_selected_facet(self):
+        response = self.client.get('/api/products/', {'rom': '256GB', 'facets': '1'})
+        facets = response.data['facets']
+        self.assertEqual(response.data['count'], 1)
+        # ROM is counted without its own selection; the other facets on 256GB variants
+        self.assertEqual(facets['rom'], {'128GB': 2, '256GB': 1})
+        self.assertEqual(facets['brand'], {str(self.apple.id): 1})
+        self.assertEqual(facets['color'], {'Blue': 1})
+        self.assertEqual(facets['in_stock'], {})
+
+    def test_counts_follow_search(self):
+        response = self.client.get('/api/products/', {'search': 'galaxy', 'facets': '1'})
+        self.assertEqual(response.data['facets']['brand'], {str(self.samsung.id): 1})
+
+    def test_index_follows_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.galaxy_128.color = 'Green'
+            self.galaxy_128.save()
+            Inventory.objects.create(product_variant=self.galaxy_128, on_hand=5)
+        self.assertEqual(self.list_skus(color='Green'), ['A55'])
+        self.assertEqual(self.list_skus(color='Black'), ['IP15'])
+        facets = self.client.get('/api/products/', {'facets': '1'}).data['facets']
+        self.assertEqual(facets['in_stock'], {'1': 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.galaxy_128.is_active = False
+            self.galaxy_128.save()
+        self.assertEqual(self.list_skus(color='Green'), [])
+
+
+class TestProductStockFlag(TestCase):
+    """Product.has_stock follows its variants' stock and backs ?in_stock=1"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='stock', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        brand = Brand.objects.create(name='Oppo', slug='oppo')
+        self.product = Product.objects.create(name='Reno 11', sku='RENO11', brand=brand)
+        self.black = ProductVariant.objects.create(product=self.product, sku='RENO11-B', color='Black', price=10000000)
+        self.green = ProductVariant.objects.create(product=self.product, sku='RENO11-G', color='Green', price=10000000)
+        Product.objects.create(name='Reno 10', sku='RENO10', brand=brand)
+
+    def in_stock_skus(self):
+        response = self.client.get('/api/products/', {'in_stock': '1'})
+        self.assertEqual(response.status_code, 200)
+        return [product['sku'] for product in response.data['results']]
+
+    def has_stock(self):
+        self.product.refresh_from_db(fields=['has_stock'])
+        return self.product.has_stock
+
+    def test_flag_follows_stock_crossing_zero(self):
+        self.assertFalse(self.has_stock())
+        self.assertEqual(self.in_stock_skus(), [])
+
+        black = Inventory.objects.create(product_variant=self.black, on_hand=2)
+        green = Inventory.objects.create(product_variant=self.green, on_hand=1)
+        self.assertTrue(self.has_stock())
+        self.assertEqual(self.in_stock_skus(), ['RENO11'])
+
+        # Still in stock while another variant has units
+        black.on_hand = 0
+        black.save()
+        self.assertTrue(self.has_stock())
+
+        green.on_hand = 0
+        green.save()
+        self.assertFalse(self.has_stock())
+        self.assertEqual(self.in_stock_skus(), [])
+
+    def test_saving_a_stale_product_keeps_the_flag(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        Inventory.objects.create(product_variant=self.black, on_hand=2)
+
+        stale.name = 'Reno 11 5G'
+        stale.save()
+
+        self.assertTrue(self.has_stock())
+        self.assertEqual(self.in_stock_skus(), ['RENO11'])
+
+    def test_summary_refresh_recomputes_flag(self):
+        Inventory.objects.create(product_variant=self.black, on_hand=3)
+        Product.objects.filter(pk=self.product.pk).update(has_stock=False)
+        Product.refresh_summaries([self.product.pk])
+        self.assertTrue(self.has_stock())
+
+
+class TestProductSummaries(TestCase):
+    """Price range, active variant count and primary variant follow the variant writes"""
+
+    def setUp(self):
+        brand = Brand.objects.create(name='Vivo', slug='vivo')
+        self.product = Product.objects.create(name='Vivo V30', sku='V30', brand=brand)
+        self.other = Product.objects.create(name='Vivo Y36', sku='Y36', brand=brand)
+        self.small = ProductVariant.objects.create(
+            product=self.product, sku='V30-128', ram='8GB', rom='128GB', price=9000000,
+        )
+        self.large = ProductVariant.objects.create(
+            product=self.product, sku='V30-256', ram='8GB', rom='256GB', price=11000000,
+        )
+        ProductVariant.objects.create(product=self.other, sku='Y36-128', rom='128GB', price=5000000)
+
+    def summary(self, product=None):
+        product = product or self.product
+        product.refresh_from_db(fields=['min_price', 'max_price', 'active_variants_count', 'primary_variant'])
+        return product.min_price, product.max_price, product.active_variants_count, product.primary_variant_id
+
+    def test_summary_follows_variant_writes(self):
+        self.assertEqual(self.summary(), (9000000, 11000000, 2, self.small.id))
+
+        self.large.price = 12000000
+        self.large.save()
+        self.assertEqual(self.summary(), (9000000, 12000000, 2, self.small.id))
+
+        self.small.is_active = False
+        self.small.save()
+        self.assertEqual(self.summary(), (12000000, 12000000, 1, self.large.id))
+
+        self.large.delete()
+        # Only the inactive variant is left: no price range, still the primary variant
+        self.assertEqual(self.summary(), (None, None, 0, self.small.id))
+
+        self.small.delete()
+        self.assertEqual(self.summary(), (None, None, 0, None))
+        self.assertEqual(self.summary(self.other), (5000000, 5000000, 1, self.other.variants.get().id))
+
+    def test_saving_a_stale_product_keeps_the_summary(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        ProductVariant.objects.create(product=self.product, sku='V30-512', ram='8GB', rom='512GB', price=13000000)
+
+        stale.description = 'Updated'
+        stale.save()
+
+        self.assertEqual(self.summary(), (9000000, 13000000, 3, self.small.id))
+        self.product.refresh_from_db(fields=['description'])
+        self.assertEqual(self.product.description, 'Updated')
+
+    def test_backfill_command(self):
+        stale = {'min_price': None, 'max_price': None, 'active_variants_count': 0, 'primary_variant': None}
+        Product.objects.update(**stale)
+
+        call_command('refresh_product_summaries', '--product', str(self.product.pk), stdout=io.StringIO())
+        self.assertEqual(self.summary(), (9000000, 11000000, 2, self.small.id))
+        self.assertEqual(self.summary(self.other), (None, None, 0, None))
+
+        Product.objects.update(**stale)
+        call_command('refresh_product_summaries', stdout=io.StringIO())
+        self.assertEqual(self.summary(), (9000000, 11000000, 2, self.small.id))
+        self.assertEqual(self.summary(self.other), (5000000, 5000000, 1, self.other.variants.get().id))
+
+
+class TestVariantList(TestCase):
+    """GET /api/products/variants/ is paginated with the stock annotated"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='variants', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.brand = Brand.objects.create(name='Xiaomi', slug='xiaomi')
+        self.product = Product.objects.create(name='Redmi Note 13', sku='RN13', brand=self.brand)
+        for number in range(15):
+            variant = ProductVariant.objects.create(
+                product=self.product, sku=f'RN13-{number}', rom=f'{number}GB', price=5000000,
+            )
+            if number % 2:
+                Inventory.objects.create(product_variant=variant, on_hand=number)
+
+    def test_paginated_with_fixed_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/variants/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 15)
+        self.assertEqual(len(response.data['results']), 10)
+        # Count, page (stock joined) and the image manifest prefetch
+        self.assertEqual(len(queries), 3)
+        stock = {row['sku']: row['current_stock'] for row in response.data['results']}
+        self.assertEqual(stock['RN13-1'], 1)
+        self.assertEqual(stock['RN13-2'], 0)
+
+    def test_slim_rows(self):
+        response = self.client.get('/api/products/variants/', {
+            'slim': '1', 'page_size': '500', 'brand': self.brand.id, 'search': 'RN13-3',
+        })
+        self.assertEqual(response.status_code, 200)
+        row = next(row for row in response.data['results'] if row['name'].endswith('3GB'))
+        self.assertEqual(set(row), {'id', 'name', 'price', 'available'})
+        self.assertEqual(row['name'], 'Redmi Note 13 - 3GB')
+        self.assertEqual(row['available'], 3)
+
+        response = self.client.get('/api/products/variants/', {'slim': '1', 'page_size': '500'})
+        self.assertEqual(len(response.data['results']), 15)
+
+
+class TestVariantMatrix(TestCase):
+    """POST /api/products/<id>/generate_variants/ creates the missing combinations"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='matrix', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        brand = Brand.objects.create(name='Apple', slug='apple')
+        self.product = Product.objects.create(name='iPhone 15', sku='IP15', brand=brand)
+        ProductVariant.objects.create(product=self.product, sku='IP15-OLD', rom='128GB', color='Black', price=1)
+        # Another product already uses the SKU the matrix would generate
+        other = Product.objects.create(name='iPhone 15 demo', sku='IP15D', brand=brand)
+        ProductVariant.objects.create(product=other, sku='IP15-256GB-BLUE', price=1)
+
+    def generate(self, **data):
+        return self.client.post(f'/api/products/{self.product.id}/generate_variants/', data, format='json')
+
+    def test_generates_missing_combinations(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.generate(
+                rom=['128GB', '256GB'], color=['Black', 'Blue', 'Titan Blue'],
+                base_price='20000000', rom_prices={'256GB': '3000000'}, color_prices={'Titan Blue': '500000'},
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['skipped'], [{'ram': None, 'rom': '128GB', 'color': 'Black'}])
+        created = {row['sku']: row['price'] for row in response.data['created']}
+        self.assertEqual(len(created), 5)
+        self.assertEqual(created['IP15-128GB-BLUE'], 20000000)
+        self.assertEqual(created['IP15-256GB-TITANBLUE'], 23500000)
+        self.assertIn('IP15-256GB-BLUE-2', created)
+
+        self.assertEqual(Inventory.objects.filter(product_variant__product=self.product).count(), 5)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.active_variants_count, 6)
+
+        # Running it again creates nothing
+        response = self.generate(rom=['128GB', '256GB'], color=['Black', 'Blue', 'Titan Blue'], base_price='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], len(response.data['skipped'])), ([], 6))
+
+    def test_validation(self):
+        self.assertEqual(self.generate(base_price='1').status_code, 400)
+        self.assertEqual(self.generate(color=[str(n) for n in range(501)], base_price='1').status_code, 400)
+        self.assertEqual(self.generate(color=['Blue'], base_price='1', color_prices={'Blue': '-1'}).status_code, 400)
+        self.assertEqual(self.generate(color=['Blue', 'BLUE'], base_price='1').status_code, 400)
+
+    def test_case_insensitive_matches(self):
+        ProductVariant.objects.create(product=self.product, sku='ip15-256gb-red', rom='256GB', color='Red', price=1)
+
+        response = self.generate(rom=['128gb', '256GB'], color=['black', 'red', 'Red2'], base_price='1')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(response.data['skipped']), 2)
+        created = sorted(row['sku'] for row in response.data['created'])
+        self.assertIn('IP15-256GB-RED2', created)
+        self.assertNotIn('IP15-256GB-RED', created)
+
+
+@override_settings(ENABLE_IMEI_TRACKING=True)
+class TestImeiRegistration(TestCase):
+    """POST /api/products/imeis/register/ and GET /api/products/imeis/lookup/"""
+
+    def setUp(self):
+        from apps.procurement.models import StockIn, StockInItem
+
+        self.user = User.objects.create_user(username='imei', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        brand = Brand.objects.create(name='Apple', slug='apple')
+        product = Product.objects.create(name='iPhone 15', sku='IP15', brand=brand)
+        self.variant = ProductVariant.objects.create(product=product, sku='IP15-128', price=20000000)
+        stock_in = StockIn.objects.create(code='SI-IMEI')
+        self.item = StockInItem.objects.create(
+            stock_in=stock_in, product_variant=self.variant, qty=3, unit_cost=18000000
+        )
+
+    def register(self, imeis):
+        return self.client.post(
+            '/api/products/imeis/register/', {'stock_in_item': self.item.id, 'imeis': imeis}, format='json'
+        )
+
+    def test_register_and_lookup(self):
+        response = self.register(['490154203237518', '35-209900-176148-1'])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+
+        response = self.client.get('/api/products/imeis/lookup/', {'imei': '352099001761481'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['sku'], 'IP15-128')
+        self.assertEqual(response.data['stock_in_item'], self.item.id)
+        self.assertEqual(response.data['status'], 'in_stock')
+
+        response = self.client.get('/api/products/imeis/lookup/', {'imei': '490154203237519'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_batch_writes_nothing(self):
+        self.register(['490154203237518'])
+        response = self.register(['490154203237518', '490154203237519', '12345', '352099001761481', '352099001761481'])
+        self.assertEqual(response.status_code, 400)
+        errors = {(error['imei'], error['error']) for error in response.data['errors']}
+        self.assertEqual(errors, {
+            ('490154203237519', 'Invalid check digit'),
+            ('12345', 'IMEI must be 15 digits'),
+            ('352099001761481', 'Repeated in this batch'),
+            ('490154203237518', 'Already registered'),
+        })
+        self.assertEqual(self.item.imei_set.count(), 1)
+
+    def test_batch_limited_to_received_quantity(self):
+        response = self.register(['490154203237518', '352099001761481', '356938035643809', '013654004203120'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.item.imei_set.count(), 0)
+
+    @override_settings(ENABLE_IMEI_TRACKING=False)
+    def test_disabled(self):
+        self.assertEqual(self.client.get('/api/products/imeis/').status_code, 404)
+
+
+class TestVariantDisplayName(TestCase):
+    """ProductVariant.display_name follows renames and serves line items"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='names', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        brand = Brand.objects.create(name='Vivo', slug='vivo')
+        self.product = Product.objects.create(name='Vivo V30', sku='V30', brand=brand)
+        self.variant = ProductVariant.objects.create(
+            product=self.product, sku='V30-256', ram='12GB', rom='256GB', price=12000000,
+        )
+
+    def display_name(self):
+        self.variant.refresh_from_db(fields=['display_name'])
+        return self.variant.display_name
+
+    def test_kept_in_sync(self):
+        self.assertEqual(self.display_name(), 'Vivo V30 - 12GB - 256GB')
+
+        self.variant.color = 'Purple'
+        self.variant.save(update_fields=['color'])
+        self.assertEqual(self.display_name(), 'Vivo V30 - 12GB - 256GB - Purple')
+
+        self.product.name = 'Vivo V30 5G'
+        self.product.save()
+        self.assertEqual(self.display_name(), 'Vivo V30 5G - 12GB - 256GB - Purple')
+
+        # The SQL expression used by bulk writers matches the Python one
+        ProductVariant.objects.update(display_name='')
+        ProductVariant.refresh_display_names([self.product.id])
+        self.assertEqual(self.display_name(), 'Vivo V30 5G - 12GB - 256GB - Purple')
+
+    def test_line_items_render_without_products(self):
+        from apps.procurement.models import StockIn, StockInItem
+
+        stock_in = StockIn.objects.create(code='SI-NAMES', created_by=self.user)
+        StockInItem.objects.create(stock_in=stock_in, product_variant=self.variant, qty=2, unit_cost=10000000)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/stock-in/{stock_in.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['items'][0]['product_variant_name'], 'Vivo V30 - 12GB - 256GB')
+        self.assertFalse([query for query in queries if '"products"' in query['sql']])
+
+
+class TestCatalogResponseCache(TestCase):
+    """Product / brand GETs are served from the response cache until a write"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cache', password='testpass123', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.brand = Brand.objects.create(name='Realme', slug='realme')
+        self.product = Product.objects.create(name='Realme 12', sku='RM12', brand=self.brand)
+
+    def test_hit_until_write(self):
+        first = self.client.get('/api/products/', {'brand': self.brand.id})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/api/products/', {'brand': self.brand.id})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(len(queries), 0)
+
+        # Other parameters are another entry
+        self.assertEqual(self.client.get('/api/products/', {'brand': self.brand.id, 'page': 2})['X-Cache'], 'MISS')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Realme 12 Pro'
+            self.product.save()
+        response = self.client.get('/api/products/', {'brand': self.brand.id})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['name'], 'Realme 12 Pro')
+
+        stats = self.client.get('/api/products/cache_stats/').data
+        self.assertEqual((stats['hits'], stats['misses']), (1, 3))
+
+    def test_hits_keep_headers_and_host(self):
+        first = self.client.get('/api/products/')
+        second = self.client.get('/api/products/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        for header in ('Content-Type', 'Vary', 'Allow'):
+            self.assertEqual(second[header], first[header])
+
+        # Absolute pagination links differ per host, so each host has its own entry
+        other = self.client.get('/api/products/', HTTP_HOST='localhost')
+        self.assertEqual(other['X-Cache'], 'MISS')
+
+    def test_detail_invalidated_by_stock_and_brand_writes(self):
+        variant = ProductVariant.objects.create(product=self.product, sku='RM12-256', price=8000000)
+        url = f'/api/products/{self.product.id}/'
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Inventory.objects.create(product_variant=variant, on_hand=4)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['variants'][0]['current_stock'], 4)
+
+        brand_url = f'/api/brands/{self.brand.id}/'
+        self.assertEqual(self.client.get(brand_url)['X-Cache'], 'MISS')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.description = 'Updated'
+            self.brand.save()
+        self.assertEqual(self.client.get(brand_url).json()['description'], 'Updated')
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from ..views import ProductViewSet, ProductVariantViewSet, ProductImageViewSet
+from ..views import ProductViewSet, ProductVariantViewSet, ProductImageViewSet, ImeiViewSet
 
 # Router for products
 product_router = DefaultRouter()
@@ -14,8 +14,13 @@ variant_router.register(r'', ProductVariantViewSet, basename='product-variant')
 image_router = DefaultRouter()
 image_router.register(r'', ProductImageViewSet, basename='product-image')
 
+# Router for IMEIs
+imei_router = DefaultRouter()
+imei_router.register(r'', ImeiViewSet, basename='imei')
+
 urlpatterns = [
     path('variants/', include(variant_router.urls)),
     path('images/', include(image_router.urls)),
+    path('imeis/', include(imei_router.urls)),
     path('', include(product_router.urls)),
 ] 
\ No newline at end of file
@@ -1,24 +1,42 @@
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.db.models import Q
-import os
+from rest_framework.exceptions import NotFound
 from django.conf import settings
+from django.db.models import Q, Count, Prefetch
+from django.db.models.functions import Coalesce
 
-from .models import Brand, Product, ProductVariant, ProductImage, Imei
+from .models import Brand, Product, ProductVariant, ProductImage, VariantImage, Imei, PriceHistory
 from .serializers import (
-    BrandSerializer, ProductSerializer, ProductVariantSerializer,
-    ProductImageSerializer, ImeiSerializer
+    BrandSerializer, ProductSerializer, ProductVariantSerializer, ProductVariantOptionSerializer,
+    ProductImageSerializer, ImeiSerializer, ImeiRegistrationSerializer, RepriceSerializer,
+    PriceHistorySerializer, VariantMatrixSerializer, variant_image_data
 )
-from config.pagination import StandardResultsSetPagination
+from .images import store_blob, release_file, asset_url
+from . import derivatives
+from .search import CatalogSearchFilter, search
+from .facets import facet_index
+from . import facets
+from .scan_index import scan_index
+from .importer import ImportFileError, import_catalog
+from .pricing import apply_price_rules
+from .matrix import generate_variants
+from .imeis import ImeiBatchError, lookup_imei, register_imeis
+from . import changelog
+from . import response_cache
+from .response_cache import CachedResponseMixin
+from config.pagination import OptionsResultsSetPagination, StandardResultsSetPagination
 
 
-class BrandViewSet(viewsets.ModelViewSet):
-    queryset = Brand.objects.all()
+class BrandViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = Brand.objects.annotate(
+        active_products_count=Count('products', filter=Q(products__is_active=True))
+    ).order_by('name')
     serializer_class = BrandSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = StandardResultsSetPagination
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'slug']
     ordering_fields = ['name', 'created_at']
@@ -64,31 +82,18 @@ class BrandViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create directory structure: brands/{brand_id}/
-        upload_path = os.path.join(
-            settings.BASE_DIR,
-            'apps', 'assets', 'images', 'brands',
-            str(brand.id)
-        )
-        
-        # Create directories if they don't exist
-        os.makedirs(upload_path, exist_ok=True)
-        
-        # Remove old logo files (both jpg and svg) before saving new one
-        for ext in ['jpg', 'svg']:
-            old_file = os.path.join(upload_path, f'1.{ext}')
-            if os.path.exists(old_file):
-                os.remove(old_file)
+        # Store by content hash and point the logo field at the blob
+        old_logo = brand.logo.name if brand.logo else None
+        brand.logo = store_blob(logo.chunks(), file_ext)
+        brand.save(update_fields=['logo', 'updated_at'])
         
-        # Save logo as 1.jpg or 1.svg
-        file_path = os.path.join(upload_path, f'1.{file_ext}')
+        # Drop the previous logo (a legacy 1.jpg/1.svg or an unreferenced blob)
+        brand.remove_legacy_logo_files()
+        if old_logo and old_logo != brand.logo.name:
+            release_file(old_logo)
+        brand.invalidate_logo_cache()
         
-        # Save the file
-        with open(file_path, 'wb+') as destination:
-            for chunk in logo.chunks():
-                destination.write(chunk)
-        
-        logo_url = f'/assets/images/brands/{brand.id}/1.{file_ext}'
+        logo_url = asset_url(brand.logo.name)
         
         return Response({
             'message': 'Logo uploaded successfully',
@@ -100,19 +105,14 @@ class BrandViewSet(viewsets.ModelViewSet):
         """Delete logo for a brand - support both jpg and svg"""
         brand = self.get_object()
         
-        deleted = False
-        # Try to delete both jpg and svg
-        for ext in ['jpg', 'svg']:
-            file_path = os.path.join(
-                settings.BASE_DIR,
-                'apps', 'assets', 'images', 'brands',
-                str(brand.id),
-                f'1.{ext}'
-            )
-            
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                deleted = True
+        deleted = brand.remove_legacy_logo_files()
+        if brand.logo:
+            old_logo = brand.logo.name
+            brand.logo = None
+            brand.save(update_fields=['logo', 'updated_at'])
+            release_file(old_logo)
+            deleted = True
+        brand.invalidate_logo_cache()
         
         if deleted:
             return Response(
@@ -126,57 +126,187 @@ class BrandViewSet(viewsets.ModelViewSet):
             )
 
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all().select_related('brand').prefetch_related('variants', 'images')
+class ProductViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.all().select_related('brand').prefetch_related(
+        Prefetch(
+            'variants',
+            queryset=ProductVariant.objects.select_related('inventory').prefetch_related('images')
+        ),
+        'images'
+    )
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [CatalogSearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'sku', 'barcode']
+    catalog_search_target = 'product'
     ordering_fields = ['name', 'created_at', 'sku']
 
     def get_queryset(self):
         queryset = super().get_queryset()
         
-        # Filter by brand
+        # Filter by brand (one id or a comma-separated list)
         brand = self.request.query_params.get('brand', None)
         if brand:
-            queryset = queryset.filter(brand_id=brand)
+            queryset = queryset.filter(brand_id__in=brand.split(','))
         
         # Filter by is_active
         is_active = self.request.query_params.get('is_active', None)
         if is_active is not None:
             queryset = queryset.filter(is_active=is_active.lower() == 'true')
         
-        # Filter by in_stock
+        # Filter by in_stock (maintained flag, no join)
         in_stock = self.request.query_params.get('in_stock', None)
         if in_stock == '1':
-            from apps.inventory.models import Inventory
-            variant_ids_in_stock = Inventory.objects.filter(on_hand__gt=0).values_list('product_variant_id', flat=True)
-            queryset = queryset.filter(variants__id__in=variant_ids_in_stock).distinct()
+            queryset = queryset.filter(has_stock=True)
+        
+        # Filter by RAM / ROM / color / price band through the facet index bitmaps; stock
+        # asked for with them has to be on the same variant
+        selection = {
+            facet: values for facet, values in facets.parse_selection(self.request.query_params).items()
+            if facet in facets.VARIANT_FACETS and (facet != 'in_stock' or in_stock == '1')
+        }
+        if set(selection) - {'in_stock'}:
+            matched = facet_index.match(selection, facet_index.base())
+            queryset = queryset.filter(pk__in=facets.bitmap_ids(matched))
         
         return queryset
 
+    def uncached_list(self, request, *args, **kwargs):
+        response = super().uncached_list(request, *args, **kwargs)
+        if request.query_params.get('facets') == '1':
+            response.data['facets'] = self.get_facet_counts()
+        return response
+
+    def get_facet_counts(self):
+        """Product count per facet value for the current filters (from the facet index)"""
+        params = self.request.query_params
+        
+        is_active = params.get('is_active', None)
+        if is_active is not None:
+            is_active = is_active.lower() == 'true'
+        
+        # Respect ?search= by limiting the counts to the matching products
+        product_ids = None
+        terms = ' '.join(CatalogSearchFilter().get_search_terms(self.request))
+        if terms:
+            product_ids = search(terms, 'product', limit=None)
+        
+        base = facet_index.base(is_active=is_active, product_ids=product_ids)
+        return facet_index.counts(facets.parse_selection(params), base)
+
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsAdminUser])
+    def cache_stats(self, request):
+        """Hit / miss counters of the catalog response cache"""
+        return Response(response_cache.stats())
+    
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """Catalog rows changed since ?since=<version>, with tombstones for deletions"""
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', changelog.SYNC_LIMIT))
+        except ValueError:
+            return Response(
+                {'error': 'since and limit must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        limit = max(1, min(limit, changelog.MAX_SYNC_LIMIT))
+        return Response(changelog.changes_since(since, limit))
+    
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def import_file(self, request):
+        """Bulk import products/variants/opening stock from a CSV or XLSX file"""
+        upload = request.FILES.get('file')
+        
+        if not upload:
+            return Response(
+                {'error': 'No file provided'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        dry_run = request.data.get('dry_run', '').lower() in ('1', 'true')
+        
+        try:
+            report = import_catalog(upload.file, upload.name, user=request.user, dry_run=dry_run)
+        except ImportFileError as exc:
+            return Response(
+                {'error': str(exc)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(report, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['post'])
+    def generate_variants(self, request, pk=None):
+        """Create the RAM x ROM x color variants the product does not have yet"""
+        product = self.get_object()
+        serializer = VariantMatrixSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        data = serializer.validated_data
+        result = generate_variants(product, data['ram'], data['rom'], data['color'], pricing=data)
+        
+        return Response({
+            'created': [
+                {'id': variant.id, 'sku': variant.sku, 'ram': variant.ram, 'rom': variant.rom,
+                 'color': variant.color, 'price': variant.price}
+                for variant in result['created']
+            ],
+            'skipped': result['skipped'],
+        }, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
 
 
 class ProductVariantViewSet(viewsets.ModelViewSet):
-    queryset = ProductVariant.objects.all().select_related('product', 'product__brand')
+    queryset = ProductVariant.objects.all().select_related(
+        'product', 'product__brand'
+    ).prefetch_related('images').annotate(stock=Coalesce('inventory__on_hand', 0))
     serializer_class = ProductVariantSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = StandardResultsSetPagination
+    filter_backends = [CatalogSearchFilter, filters.OrderingFilter]
     search_fields = ['sku', 'product__name']
+    catalog_search_target = 'variant'
     ordering_fields = ['price', 'created_at']
 
+    @property
+    def is_slim(self):
+        """?slim=1 lists only id, name, price and available stock (order-entry dropdowns)"""
+        return self.action == 'list' and self.request.query_params.get('slim') == '1'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = OptionsResultsSetPagination() if self.is_slim else self.pagination_class()
+        return self._paginator
+
+    def get_serializer_class(self):
+        if self.is_slim:
+            return ProductVariantOptionSerializer
+        return super().get_serializer_class()
+
     def get_queryset(self):
-        queryset = super().get_queryset()
+        if self.is_slim:
+            queryset = ProductVariant.objects.select_related('product').only(
+                'id', 'ram', 'rom', 'color', 'price', 'product__name'
+            ).annotate(stock=Coalesce('inventory__on_hand', 0))
+        else:
+            queryset = super().get_queryset()
         
         # Filter by product
         product = self.request.query_params.get('product', None)
         if product:
             queryset = queryset.filter(product_id=product)
         
+        # Filter by brand
+        brand = self.request.query_params.get('brand', None)
+        if brand:
+            queryset = queryset.filter(product__brand_id=brand)
+        
         # Filter by is_active
         is_active = self.request.query_params.get('is_active', None)
         if is_active is not None:
@@ -184,6 +314,57 @@ class ProductVariantViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def perform_update(self, serializer):
+        old_price = serializer.instance.price
+        variant = serializer.save()
+        if variant.price != old_price:
+            PriceHistory.objects.create(
+                product_variant=variant, old_price=old_price,
+                new_price=variant.price, changed_by=self.request.user
+            )
+    
+    @action(detail=False, methods=['post'])
+    def reprice(self, request):
+        """Apply a list of repricing rules in one transaction"""
+        serializer = RepriceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        result = apply_price_rules(serializer.validated_data['rules'], user=request.user)
+        
+        return Response(result, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['get'])
+    def price_history(self, request, pk=None):
+        """Price changes of a variant, newest first"""
+        variant = self.get_object()
+        history = variant.price_history.select_related('changed_by')
+        
+        page = self.paginate_queryset(history)
+        if page is not None:
+            return self.get_paginated_response(PriceHistorySerializer(page, many=True).data)
+        return Response(PriceHistorySerializer(history, many=True).data)
+    
+    @action(detail=False, methods=['get'])
+    def scan(self, request):
+        """Resolve a scanned barcode/SKU from the in-memory scan index"""
+        code = request.query_params.get('code', '').strip()
+        
+        if not code:
+            return Response(
+                {'error': 'code is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        record = scan_index.resolve(code)
+        
+        if record is None:
+            return Response(
+                {'error': 'Product not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response({'code': code, **record})
+    
     @action(detail=True, methods=['post'], parser_classes=[MultiPartParser, FormParser])
     def upload_images(self, request, pk=None):
         """Upload multiple images for a product variant"""
@@ -198,49 +379,35 @@ class ProductVariantViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create directory structure: products/{product_id}/{variant_id}/
-        product_id = variant.product.id
-        variant_id = variant.id
-        
-        upload_path = os.path.join(
-            settings.BASE_DIR,
-            'apps', 'assets', 'images', 'products',
-            str(product_id),
-            str(variant_id)
-        )
+        # Find next available number from the manifest
+        existing_paths = set(variant.images.values_list('path', flat=True))
+        existing_numbers = variant.images.values_list('sort_order', flat=True)
+        next_number = max(existing_numbers, default=0) + 1
         
-        # Create directories if they don't exist
-        os.makedirs(upload_path, exist_ok=True)
-        
-        # Find next available number for images
-        existing_files = [f for f in os.listdir(upload_path) if f.endswith('.jpg')] if os.path.exists(upload_path) else []
-        existing_numbers = []
-        for f in existing_files:
-            try:
-                num = int(f.split('.')[0])
-                existing_numbers.append(num)
-            except ValueError:
+        # Store each file by content hash; a file the variant already has is skipped
+        manifest_rows = []
+        for image in images:
+            path = store_blob(image.chunks(), 'jpg')
+            if path in existing_paths:
                 continue
-        
-        next_number = max(existing_numbers) + 1 if existing_numbers else 1
-        
-        # Save images with sequential numbering
-        saved_images = []
-        for idx, image in enumerate(images):
-            file_number = next_number + idx
-            file_path = os.path.join(upload_path, f'{file_number}.jpg')
+            existing_paths.add(path)
             
-            # Save the file
-            with open(file_path, 'wb+') as destination:
-                for chunk in image.chunks():
-                    destination.write(chunk)
-            
-            saved_images.append({
-                'id': f"{product_id}_{variant_id}_{file_number}",
-                'image': f'/assets/images/products/{product_id}/{variant_id}/{file_number}.jpg',
-                'is_primary': file_number == 1,
-                'sort_order': file_number
-            })
+            manifest_rows.append(VariantImage(
+                product_variant=variant,
+                path=path,
+                sort_order=next_number + len(manifest_rows)
+            ))
+        
+        # Blobs shared with other variants may already have their derivatives
+        rendered = set(VariantImage.objects.filter(
+            path__in=[row.path for row in manifest_rows], has_derivatives=True
+        ).values_list('path', flat=True))
+        for row in manifest_rows:
+            row.has_derivatives = row.path in rendered
+        
+        VariantImage.objects.bulk_create(manifest_rows)
+        derivatives.enqueue(row.path for row in manifest_rows if not row.has_derivatives)
+        saved_images = [variant_image_data(variant, row) for row in manifest_rows]
         
         return Response({
             'message': f'Successfully uploaded {len(saved_images)} images',
@@ -259,30 +426,21 @@ class ProductVariantViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Construct file path
-        product_id = variant.product.id
-        variant_id = variant.id
+        manifest_row = variant.images.filter(sort_order=image_number).first()
         
-        file_path = os.path.join(
-            settings.BASE_DIR,
-            'apps', 'assets', 'images', 'products',
-            str(product_id),
-            str(variant_id),
-            f'{image_number}.jpg'
-        )
-        
-        # Delete the file if it exists
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            return Response(
-                {'message': 'Image deleted successfully'},
-                status=status.HTTP_200_OK
-            )
-        else:
+        if manifest_row is None:
             return Response(
                 {'error': 'Image not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        manifest_row.delete()
+        release_file(manifest_row.path)
+        
+        return Response(
+            {'message': 'Image deleted successfully'},
+            status=status.HTTP_200_OK
+        )
 
 
 class ProductImageViewSet(viewsets.ModelViewSet):
@@ -295,4 +453,67 @@ class ProductImageViewSet(viewsets.ModelViewSet):
         product = self.request.query_params.get('product', None)
         if product:
             queryset = queryset.filter(product_id=product)
-        return queryset 
\ No newline at end of file
+        return queryset
+
+
+class ImeiViewSet(viewsets.ReadOnlyModelViewSet):
+    """IMEIs of received units (only when ENABLE_IMEI_TRACKING is on)"""
+    queryset = Imei.objects.all().select_related('product_variant__product')
+    serializer_class = ImeiSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = StandardResultsSetPagination
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not settings.ENABLE_IMEI_TRACKING:
+            raise NotFound('IMEI tracking is disabled')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        
+        # Filter by variant, stock-in line and status
+        for param in ('product_variant', 'stock_in_item', 'status'):
+            value = self.request.query_params.get(param, None)
+            if value:
+                queryset = queryset.filter(**{param: value})
+        
+        return queryset
+    
+    @action(detail=False, methods=['post'])
+    def register(self, request):
+        """Register a scanned batch of IMEIs against a stock-in line"""
+        serializer = ImeiRegistrationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        try:
+            created = register_imeis(
+                serializer.validated_data['stock_in_item'], serializer.validated_data['imeis']
+            )
+        except ImeiBatchError as exc:
+            return Response(
+                {'error': 'Invalid IMEI batch', 'errors': exc.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({'created': created}, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['get'])
+    def lookup(self, request):
+        """Find one IMEI exactly (?imei=)"""
+        imei = request.query_params.get('imei', '').strip()
+        
+        if not imei:
+            return Response(
+                {'error': 'imei is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        record = lookup_imei(imei)
+        
+        if record is None:
+            return Response(
+                {'error': 'IMEI not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response(ImeiSerializer(record).data)
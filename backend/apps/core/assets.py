@@ -0,0 +1,202 @@
+"""
+Asset file serving (``/assets/``) for every environment.
+
+``serve_asset`` answers from a stat() call and an open file handle:
+
+* strong ``ETag`` (size + mtime) and ``Last-Modified``; ``If-None-Match`` /
+  ``If-Modified-Since`` are answered with 304 without opening the file;
+* a single ``Range: bytes=...`` is answered with 206 (``If-Range`` honoured), an
+  unsatisfiable one with 416;
+* for compressible types a precompressed ``.br`` / ``.gz`` sibling is served when
+  the client accepts that encoding;
+* the body is a ``FileResponse``, which the WSGI server's ``wsgi.file_wrapper``
+  sends with ``sendfile()`` (gunicorn), so bytes are not copied through Python.
+
+With ``ASSETS_SENDFILE_HEADER`` set (``X-Accel-Redirect`` for nginx, ``X-Sendfile``
+for Apache / lighttpd) the response carries no body at all: the front server
+streams ``ASSETS_SENDFILE_PREFIX + path`` itself.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+
+# Encodings of precompressed siblings, in preference order
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+# Types worth precompressing; images such as JPEG / WebP are compressed already
+COMPRESSIBLE_TYPES = {
+    'image/svg+xml', 'application/json', 'application/javascript', 'text/javascript',
+    'text/css', 'text/plain', 'text/csv', 'application/xml', 'text/xml',
+}
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """
+    Read-only view of ``length`` bytes of an open file from its current position.
+    Keeps ``fileno()`` so the WSGI server can still ``sendfile()`` it (gunicorn sends
+    Content-Length bytes from the current offset).
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def etag_for(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """(start, end) inclusive of a single byte range, 'unsatisfiable', or None to ignore it"""
+    match = _RANGE.match(header.replace(' ', ''))
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        start, end = max(size - length, 0), size - 1
+    if start >= size:
+        return 'unsatisfiable'
+    return start, end
+
+
+def range_applies(request, etag, mtime):
+    """False when If-Range names another version of the file"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and int(mtime) <= date
+
+
+def select_encoding(request, full_path, content_type):
+    """(path, stat, encoding) of the representation to send"""
+    if content_type in COMPRESSIBLE_TYPES:
+        accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        for encoding, suffix in PRECOMPRESSED:
+            if encoding in accepted:
+                try:
+                    return full_path + suffix, os.stat(full_path + suffix), encoding
+                except OSError:
+                    continue
+    return full_path, os.stat(full_path), None
+
+
+def serve_asset(request, path, document_root=None, cache_control=None):
+    """Serve ``path`` below ``document_root`` (ASSETS_ROOT by default)"""
+    document_root = str(document_root or settings.ASSETS_ROOT)
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404('Asset not found')
+    if not os.path.isfile(full_path) or os.path.basename(full_path).startswith('.'):
+        raise Http404('Asset not found')
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    file_path, stat, encoding = select_encoding(request, full_path, content_type)
+    etag = etag_for(stat)
+
+    headers = {
+        'Content-Type': content_type,
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+    }
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    if content_type in COMPRESSIBLE_TYPES:
+        headers['Vary'] = 'Accept-Encoding'
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        for header, value in headers.items():
+            if header not in ('Content-Type', 'Content-Encoding'):
+                not_modified[header] = value
+        return not_modified
+
+    sendfile_header = getattr(settings, 'ASSETS_SENDFILE_HEADER', '')
+    if sendfile_header and request.method != 'HEAD':
+        # The front server sends the file and handles Range itself
+        response = HttpResponse()
+        if sendfile_header == 'X-Accel-Redirect':
+            served = os.path.relpath(file_path, document_root).replace(os.sep, '/')
+            response[sendfile_header] = quote(settings.ASSETS_SENDFILE_PREFIX + served)
+        else:
+            response[sendfile_header] = file_path
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    size = stat.st_size
+    start, end = 0, size - 1
+    status = 200
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and range_applies(request, etag, stat.st_mtime):
+        byte_range = parse_range(range_header, size)
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    length = max(end - start + 1, 0)
+
+    if request.method == 'HEAD':
+        response = HttpResponse(status=status)
+        for header, value in headers.items():
+            response[header] = value
+        response['Content-Length'] = length
+        return response
+
+    file = open(file_path, 'rb')
+    if start:
+        file.seek(start)
+    body = FileRange(file, length) if status == 206 else file
+    response = FileResponse(body, status=status, content_type=content_type)
+    for header, value in headers.items():
+        response[header] = value
+    response['Content-Length'] = length
+    return response
@@ -0,0 +1,90 @@
+"""
+Test suite for asset serving
+Run with: python manage.py test apps.core.tests
+"""
+import gzip
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+
+
+class TestAssetServing(TestCase):
+    """GET /assets/<path> validators, ranges and precompressed siblings"""
+
+    def setUp(self):
+        self.assets = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(ASSETS_ROOT=self.assets.name)
+        self.settings_override.enable()
+        os.makedirs(os.path.join(self.assets.name, 'images'))
+        self.write('images/photo.jpg', bytes(range(256)) * 4)
+        self.svg = b'<svg xmlns="http://www.w3.org/2000/svg"></svg>'
+        self.write('images/logo.svg', self.svg)
+        self.write('images/logo.svg.gz', gzip.compress(self.svg))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.assets.cleanup()
+
+    def write(self, path, data):
+        with open(os.path.join(self.assets.name, path), 'wb') as f:
+            f.write(data)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_validators_and_304(self):
+        response = self.client.get('/assets/images/photo.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], '1024')
+        self.assertEqual(self.body(response), bytes(range(256)) * 4)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+
+        response = self.client.get('/assets/images/photo.jpg', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(
+            '/assets/images/photo.jpg', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get('/assets/images/photo.jpg', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(self.body(response), bytes(range(10, 20)))
+
+        response = self.client.get('/assets/images/photo.jpg', HTTP_RANGE='bytes=-4')
+        self.assertEqual(self.body(response), bytes(range(252, 256)))
+
+        response = self.client.get('/assets/images/photo.jpg', HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+        # A stale If-Range gets the whole file
+        response = self.client.get('/assets/images/photo.jpg', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_precompressed_sibling(self):
+        response = self.client.get('/assets/images/logo.svg', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(self.body(response)), self.svg)
+
+        response = self.client.get('/assets/images/logo.svg')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(self.body(response), self.svg)
+
+    def test_outside_root(self):
+        self.assertEqual(self.client.get('/assets/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/assets/images/missing.jpg').status_code, 404)
+
+    @override_settings(ASSETS_SENDFILE_HEADER='X-Accel-Redirect')
+    def test_sendfile_handoff(self):
+        response = self.client.get('/assets/images/photo.jpg')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-assets/images/photo.jpg')
+        self.assertEqual(response.content, b'')
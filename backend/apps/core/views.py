@@ -0,0 +1,17 @@
+from django.conf import settings
+
+from .assets import serve_asset
+
+
+# Content-addressed files never change, so clients and proxies may keep them forever
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def asset(request, path):
+    """Serve a file from ASSETS_ROOT (validators, ranges, precompressed siblings)"""
+    return serve_asset(request, path, settings.ASSETS_ROOT, cache_control=settings.ASSETS_CACHE_CONTROL)
+
+
+def immutable_asset(request, path):
+    """Serve a content-addressed file from ASSETS_ROOT with far-future cache headers"""
+    return serve_asset(request, path, settings.ASSETS_ROOT, cache_control=IMMUTABLE_CACHE_CONTROL)
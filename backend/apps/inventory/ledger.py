@@ -0,0 +1,126 @@
+"""
+Stock ledger: the one write path for on-hand and reserved quantities.
+
+``apply_stock_changes`` takes a batch of ``StockChange`` and, in one transaction:
+
+* locks every affected ``inventory`` row with a single ``SELECT ... FOR UPDATE``
+  ordered by variant id, so two batches touching the same variants always lock them
+  in the same order and cannot deadlock each other; rows missing for received stock
+  are inserted (in the same order) only after that read, and locked in turn;
+* checks that no on-hand quantity goes below zero (``InsufficientStock`` otherwise);
+* writes all rows with one ``UPDATE ... SET on_hand = on_hand + CASE ...``;
+* records a ``StockMovement`` per change with one ``bulk_create``.
+
+The ``UPDATE`` bypasses ``Inventory.save``, so the ledger keeps the products'
+``has_stock`` flag itself and sends ``stock_changed`` for the derived catalog data.
+"""
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+
+class StockChange(NamedTuple):
+    """``delta`` on hand (negative takes stock out) and ``reserved`` change of a variant"""
+    variant_id: int
+    delta: int
+    ref_type: Optional[str] = None
+    ref_id: Optional[int] = None
+    reserved: int = 0
+
+
+class InsufficientStock(Exception):
+    """The batch was rejected; ``errors`` lists {'product_variant', 'on_hand', 'requested'} entries"""
+
+    def __init__(self, errors):
+        super().__init__('Insufficient stock')
+        self.errors = errors
+
+
+def per_variant_case(values):
+    """CASE product_variant_id WHEN ... THEN value ... ELSE 0 END"""
+    return Case(
+        *[When(product_variant_id=variant_id, then=Value(value)) for variant_id, value in values.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+@transaction.atomic
+def apply_stock_changes(changes):
+    """Apply a batch of stock changes; returns {variant id: new on-hand quantity}"""
+    from apps.catalog.models import Product
+    from .models import Inventory, StockMovement
+    from .signals import stock_changed
+
+    changes = [change for change in changes if change.delta or change.reserved]
+    if not changes:
+        return {}
+
+    deltas = defaultdict(int)
+    reserved = defaultdict(int)
+    for change in changes:
+        deltas[change.variant_id] += change.delta
+        reserved[change.variant_id] += change.reserved
+
+    def lock(variant_ids):
+        # One locking read in a fixed order (the unique variant index is scanned in this order)
+        return dict(
+            Inventory.objects.select_for_update()
+            .filter(product_variant_id__in=variant_ids)
+            .order_by('product_variant_id')
+            .values_list('product_variant_id', 'on_hand')
+        )
+
+    before = lock(list(deltas))
+
+    # Receiving stock creates the inventory row of a variant that has none yet: inserted
+    # only after the existing rows are locked, in variant order, then locked as well
+    missing = sorted(variant_id for variant_id, delta in deltas.items() if delta > 0 and variant_id not in before)
+    if missing:
+        Inventory.objects.bulk_create(
+            [Inventory(product_variant_id=variant_id, on_hand=0) for variant_id in missing],
+            ignore_conflicts=True,
+        )
+        before.update(lock(missing))
+
+    errors = [
+        {'product_variant': variant_id, 'on_hand': before.get(variant_id), 'requested': -delta}
+        for variant_id, delta in sorted(deltas.items())
+        if delta < 0 and (variant_id not in before or before[variant_id] + delta < 0)
+    ]
+    if errors:
+        raise InsufficientStock(errors)
+
+    deltas = {variant_id: delta for variant_id, delta in deltas.items() if variant_id in before}
+    reserved = {variant_id: value for variant_id, value in reserved.items() if variant_id in before and value}
+    updates = {'updated_at': timezone.now()}
+    moved = {variant_id: delta for variant_id, delta in deltas.items() if delta}
+    if moved:
+        updates['on_hand'] = F('on_hand') + per_variant_case(moved)
+    if reserved:
+        updates['reserved'] = Greatest(F('reserved') + per_variant_case(reserved), 0)
+    Inventory.objects.filter(product_variant_id__in=list(deltas)).update(**updates)
+
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            type='IN' if change.delta > 0 else 'OUT', product_variant_id=change.variant_id,
+            qty=abs(change.delta), ref_type=change.ref_type, ref_id=change.ref_id,
+        )
+        for change in changes if change.delta and change.variant_id in before
+    ])
+
+    on_hand = {variant_id: before[variant_id] + delta for variant_id, delta in moved.items()}
+    # Only a variant crossing zero can flip its product's has_stock flag
+    gained = [variant_id for variant_id, quantity in on_hand.items() if before[variant_id] <= 0 < quantity]
+    ran_out = [variant_id for variant_id, quantity in on_hand.items() if quantity <= 0 < before[variant_id]]
+    if gained:
+        Product.sync_stock_flags(gained, True)
+    if ran_out:
+        Product.sync_stock_flags(ran_out, False)
+    if on_hand:
+        stock_changed.send(sender=Inventory, on_hand=on_hand)
+    return on_hand
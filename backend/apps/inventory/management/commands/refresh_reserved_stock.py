@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.inventory.models import Inventory
+
+
+class Command(BaseCommand):
+    help = 'Recompute the reserved quantity of inventory rows from the pending orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--variant', type=int, nargs='*', help='Only refresh these product variant ids')
+
+    def handle(self, *args, **options):
+        updated = Inventory.refresh_reserved(options['variant'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Reserved quantities refreshed for {updated} inventory rows'))
@@ -0,0 +1,16 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from apps.inventory.snapshots import take_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Store the end-of-day on-hand stock of every variant (run nightly, defaults to yesterday)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help='Day to snapshot (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        created = take_snapshot(options['date'])
+        self.stdout.write(self.style.SUCCESS(f'Snapshot stored for {created} variants'))
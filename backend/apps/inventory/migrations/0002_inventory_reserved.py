@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:51
+
+from django.db import migrations, models
+
+
+def backfill_reserved(apps, schema_editor):
+    from apps.inventory.models import reserved_expression
+
+    Inventory = apps.get_model('inventory', 'Inventory')
+    OrderItem = apps.get_model('sales', 'OrderItem')
+    Inventory.objects.update(reserved=reserved_expression(OrderItem))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+        ('sales', '0004_order_paid_at_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='reserved',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_reserved, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_productvariant_display_name'),
+        ('inventory', '0002_inventory_reserved'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('on_hand', models.IntegerField()),
+                ('product_variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.productvariant')),
+            ],
+            options={
+                'verbose_name': 'Inventory Snapshot',
+                'verbose_name_plural': 'Inventory Snapshots',
+                'db_table': 'inventory_snapshots',
+                'ordering': ['-date'],
+                'unique_together': {('date', 'product_variant')},
+            },
+        ),
+    ]
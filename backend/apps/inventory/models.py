@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 
 
@@ -6,6 +8,8 @@ class Inventory(models.Model):
     """Inventory model to track stock levels"""
     product_variant = models.OneToOneField('catalog.ProductVariant', on_delete=models.PROTECT, related_name='inventory')
     on_hand = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    # Quantity in pending orders, kept up to date by apps.sales (see Order.save)
+    reserved = models.IntegerField(default=0, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -16,6 +20,76 @@ class Inventory(models.Model):
     def __str__(self):
         return f"{self.product_variant} - Stock: {self.on_hand}"
 
+    def save(self, *args, **kwargs):
+        from apps.catalog.models import Product
+
+        # Keep the product's has_stock flag in the same transaction as the stock write
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Product.sync_stock_flag(self.product_variant_id, self.on_hand > 0)
+
+    def delete(self, *args, **kwargs):
+        from apps.catalog.models import Product
+
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Product.sync_stock_flag(self.product_variant_id, False)
+        return result
+
+    @property
+    def available(self):
+        return max(0, self.on_hand - self.reserved)
+
+    @classmethod
+    def reserve(cls, quantities):
+        """Add {variant id: qty} to the reserved quantities"""
+        from .ledger import StockChange, apply_stock_changes
+
+        apply_stock_changes([StockChange(variant_id, 0, reserved=qty) for variant_id, qty in quantities.items()])
+
+    @classmethod
+    def release(cls, quantities):
+        """Take {variant id: qty} off the reserved quantities"""
+        from .ledger import StockChange, apply_stock_changes
+
+        apply_stock_changes([StockChange(variant_id, 0, reserved=-qty) for variant_id, qty in quantities.items()])
+
+    @classmethod
+    def refresh_reserved(cls, variant_ids=None):
+        """Recompute reserved from the pending orders (all rows, or only these variants)"""
+        queryset = cls.objects.all()
+        if variant_ids is not None:
+            queryset = queryset.filter(product_variant_id__in=variant_ids)
+        return queryset.update(reserved=reserved_expression())
+
+
+class InventorySnapshot(models.Model):
+    """On-hand quantity of a variant at the end of a day (variants with stock only)"""
+    date = models.DateField()
+    product_variant = models.ForeignKey('catalog.ProductVariant', on_delete=models.CASCADE, related_name='+')
+    on_hand = models.IntegerField()
+
+    class Meta:
+        db_table = 'inventory_snapshots'
+        ordering = ['-date']
+        verbose_name = 'Inventory Snapshot'
+        verbose_name_plural = 'Inventory Snapshots'
+        unique_together = [['date', 'product_variant']]
+
+    def __str__(self):
+        return f"{self.date} - {self.product_variant_id}: {self.on_hand}"
+
+
+def reserved_expression(order_item_model=None):
+    """Quantity of the row's variant in pending orders"""
+    if order_item_model is None:
+        from apps.sales.models import OrderItem as order_item_model
+
+    pending = order_item_model.objects.filter(
+        product_variant_id=OuterRef('product_variant_id'), order__status='pending'
+    ).values('product_variant_id').annotate(total=Sum('qty')).values('total')
+    return Coalesce(Subquery(pending), 0)
+
 
 class StockMovement(models.Model):
     """Stock Movement model to track all stock changes"""
@@ -1,8 +1,30 @@
 from rest_framework import serializers
-from django.db.models import Sum
+from django.conf import settings
 from .models import Inventory, StockMovement
 
 
+def stock_status(on_hand, threshold):
+    """Status badge of an on-hand quantity"""
+    if on_hand == 0:
+        return {
+            'value': 'out_of_stock',
+            'label': 'Hết hàng',
+            'color': 'error'
+        }
+    elif on_hand <= threshold:
+        return {
+            'value': 'low_stock',
+            'label': 'Sắp hết',
+            'color': 'warning'
+        }
+    else:
+        return {
+            'value': 'in_stock',
+            'label': 'Còn hàng',
+            'color': 'success'
+        }
+
+
 class InventorySerializer(serializers.ModelSerializer):
     # Product info
     product_name = serializers.CharField(source='product_variant.product.name', read_only=True)
@@ -19,8 +41,7 @@ class InventorySerializer(serializers.ModelSerializer):
     variant_display = serializers.SerializerMethodField()
     
     # Stock info
-    reserved = serializers.SerializerMethodField()
-    available = serializers.SerializerMethodField()
+    available = serializers.IntegerField(read_only=True)
     low_stock_threshold = serializers.SerializerMethodField()
     status = serializers.SerializerMethodField()
     
@@ -32,7 +53,7 @@ class InventorySerializer(serializers.ModelSerializer):
             'on_hand', 'reserved', 'available', 'low_stock_threshold',
             'status', 'updated_at'
         ]
-        read_only_fields = ['id', 'updated_at']
+        read_only_fields = ['id', 'reserved', 'updated_at']
     
     def get_variant_display(self, obj):
         """Get formatted variant display string"""
@@ -46,48 +67,13 @@ class InventorySerializer(serializers.ModelSerializer):
         
         return ' / '.join(parts) if parts else '-'
     
-    def get_reserved(self, obj):
-        """Get quantity reserved in pending orders"""
-        from apps.sales.models import OrderItem
-        
-        reserved_qty = OrderItem.objects.filter(
-            product_variant=obj.product_variant,
-            order__status='pending'
-        ).aggregate(total=Sum('qty'))['total'] or 0
-        
-        return int(reserved_qty)
-    
-    def get_available(self, obj):
-        """Calculate available quantity (on_hand - reserved)"""
-        reserved = self.get_reserved(obj)
-        return max(0, obj.on_hand - reserved)
-    
     def get_low_stock_threshold(self, obj):
-        """Default low stock threshold (can be customized per product later)"""
-        return 10
+        """Store-wide low stock threshold (can be customized per product later)"""
+        return settings.LOW_STOCK_THRESHOLD
     
     def get_status(self, obj):
         """Determine stock status"""
-        threshold = self.get_low_stock_threshold(obj)
-        
-        if obj.on_hand == 0:
-            return {
-                'value': 'out_of_stock',
-                'label': 'Hết hàng',
-                'color': 'error'
-            }
-        elif obj.on_hand <= threshold:
-            return {
-                'value': 'low_stock',
-                'label': 'Sắp hết',
-                'color': 'warning'
-            }
-        else:
-            return {
-                'value': 'in_stock',
-                'label': 'Còn hàng',
-                'color': 'success'
-            }
+        return stock_status(obj.on_hand, self.get_low_stock_threshold(obj))
 
 
 class StockMovementSerializer(serializers.ModelSerializer):
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+
+# Sent by the stock ledger (its queryset.update bypasses the Inventory signals) with
+# on_hand={variant id: new on-hand quantity} of every variant whose stock it changed
+stock_changed = Signal()
@@ -0,0 +1,139 @@
+"""
+Daily inventory snapshots and stock as of a past date.
+
+``take_snapshot`` stores the on-hand quantity of every variant with stock at the end
+of a day: the current ``on_hand`` minus the net of the movements recorded after that
+day, computed in one query (so it can also be run for a past day). Variants without
+a row on a snapshot date had no stock.
+
+``stock_as_of`` answers from the latest snapshot on or before the requested day and
+replays only the movements between the two, one aggregate query each; without any
+snapshot it replays from the first movement. ``valuation`` prices that stock at the
+last stock-in unit cost up to the day and at the current selling price.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+WRITE_BATCH = 2000
+QUERY_CHUNK = 1000
+
+
+def day_end(day):
+    """Aware datetime at which ``day`` ends (midnight after it, local time)"""
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def net_movement():
+    """Signed movement quantity (IN adds, OUT takes away) summed per group"""
+    return Sum(Case(When(type='IN', then=F('qty')), default=-F('qty')))
+
+
+def net_movements(start=None, end=None, variant_ids=None):
+    """{variant id: net quantity moved} of the movements in [start, end)"""
+    from .models import StockMovement
+
+    movements = StockMovement.objects.all()
+    if start is not None:
+        movements = movements.filter(created_at__gte=start)
+    if end is not None:
+        movements = movements.filter(created_at__lt=end)
+    if variant_ids is not None:
+        movements = movements.filter(product_variant_id__in=variant_ids)
+    return dict(
+        movements.order_by().values('product_variant_id').annotate(net=net_movement())
+        .values_list('product_variant_id', 'net')
+    )
+
+
+@transaction.atomic
+def take_snapshot(day=None):
+    """Store the end-of-day stock of ``day`` (yesterday by default), replacing an earlier run"""
+    from .models import Inventory, InventorySnapshot, StockMovement
+
+    if day is None:
+        day = timezone.localdate() - timedelta(days=1)
+
+    later = StockMovement.objects.filter(
+        product_variant_id=OuterRef('product_variant_id'), created_at__gte=day_end(day)
+    ).order_by().values('product_variant_id').annotate(net=net_movement()).values('net')
+    rows = Inventory.objects.annotate(
+        snapshot=F('on_hand') - Coalesce(Subquery(later), 0)
+    ).filter(snapshot__gt=0).values_list('product_variant_id', 'snapshot')
+
+    InventorySnapshot.objects.filter(date=day).delete()
+    batch = []
+    created = 0
+    for variant_id, on_hand in rows.iterator(chunk_size=WRITE_BATCH):
+        batch.append(InventorySnapshot(date=day, product_variant_id=variant_id, on_hand=on_hand))
+        if len(batch) == WRITE_BATCH:
+            InventorySnapshot.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    InventorySnapshot.objects.bulk_create(batch)
+    return created + len(batch)
+
+
+def stock_as_of(day, variant_ids=None):
+    """{variant id: on-hand quantity} at the end of ``day`` (variants with stock only)"""
+    from .models import InventorySnapshot
+
+    snapshot_date = InventorySnapshot.objects.filter(date__lte=day).order_by('-date').values_list(
+        'date', flat=True
+    ).first()
+
+    stock = {}
+    start = None
+    if snapshot_date is not None:
+        rows = InventorySnapshot.objects.filter(date=snapshot_date)
+        if variant_ids is not None:
+            rows = rows.filter(product_variant_id__in=variant_ids)
+        stock = dict(rows.values_list('product_variant_id', 'on_hand'))
+        start = day_end(snapshot_date)
+
+    for variant_id, net in net_movements(start, day_end(day), variant_ids).items():
+        stock[variant_id] = stock.get(variant_id, 0) + net
+    return {variant_id: on_hand for variant_id, on_hand in stock.items() if on_hand > 0}
+
+
+def valuation(day, variant_ids=None):
+    """Stock as of ``day`` with unit cost and value per variant, and the totals"""
+    from apps.catalog.models import ProductVariant
+    from apps.procurement.models import StockInItem
+
+    stock = stock_as_of(day, variant_ids)
+    last_cost = StockInItem.objects.filter(
+        product_variant_id=OuterRef('pk'), stock_in__created_at__lt=day_end(day)
+    ).order_by('-stock_in__created_at', '-id').values('unit_cost')[:1]
+
+    rows = []
+    ids = sorted(stock)
+    for start in range(0, len(ids), QUERY_CHUNK):
+        variants = ProductVariant.objects.filter(pk__in=ids[start:start + QUERY_CHUNK]).annotate(
+            unit_cost=Subquery(last_cost)
+        ).values_list('id', 'sku', 'display_name', 'price', 'unit_cost')
+        for variant_id, sku, name, price, unit_cost in variants:
+            on_hand = stock[variant_id]
+            rows.append({
+                'product_variant': variant_id,
+                'sku': sku,
+                'name': name,
+                'on_hand': on_hand,
+                'unit_cost': unit_cost,
+                'cost_value': unit_cost * on_hand if unit_cost is not None else None,
+                'retail_value': price * on_hand,
+            })
+
+    return {
+        'date': day,
+        'total_units': sum(row['on_hand'] for row in rows),
+        'total_cost_value': sum((row['cost_value'] for row in rows if row['cost_value'] is not None), Decimal('0')),
+        'total_retail_value': sum((row['retail_value'] for row in rows), Decimal('0')),
+        'uncosted_variants': sum(1 for row in rows if row['unit_cost'] is None),
+        'items': rows,
+    }
@@ -0,0 +1,33 @@
+"""
+Stock summaries computed by the database.
+
+Each summary is one aggregate query over the filtered queryset: per-type movement
+totals are conditional sums (``SUM(CASE WHEN type = 'IN' THEN qty END)``) and the
+stock buckets conditional counts, so no row is loaded into Python and memory use does
+not depend on the size of the table.
+"""
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+def movement_totals(movements):
+    """total_movements / total_in / total_out / net_change of a StockMovement queryset"""
+    totals = movements.order_by().aggregate(
+        total_movements=Count('id'),
+        total_in=Coalesce(Sum('qty', filter=Q(type='IN')), 0),
+        total_out=Coalesce(Sum('qty', filter=Q(type='OUT')), 0),
+    )
+    totals['net_change'] = totals['total_in'] - totals['total_out']
+    return totals
+
+
+def inventory_totals(inventory, low_stock_threshold):
+    """Item / stock counts of an Inventory queryset, bucketed by on-hand quantity"""
+    totals = inventory.order_by().aggregate(
+        total_items=Count('id'),
+        total_stock=Coalesce(Sum('on_hand'), 0),
+        out_of_stock_count=Count('id', filter=Q(on_hand=0)),
+        low_stock_count=Count('id', filter=Q(on_hand__gt=0, on_hand__lte=low_stock_threshold)),
+    )
+    totals['in_stock_count'] = totals['total_items'] - totals['out_of_stock_count']
+    return totals
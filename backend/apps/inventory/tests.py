@@ -0,0 +1,351 @@
+"""
+Test suite for the inventory API
+Run with: python manage.py test apps.inventory.tests
+"""
+import tracemalloc
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.catalog.models import Brand, Product, ProductVariant
+from apps.inventory.ledger import InsufficientStock, StockChange, apply_stock_changes
+from apps.inventory.models import Inventory, InventorySnapshot, StockMovement
+from apps.inventory.snapshots import stock_as_of, take_snapshot
+from apps.procurement.models import StockIn, StockInItem
+
+
+class TestInventoryByProduct(TestCase):
+    """GET /api/inventory/by_product/ groups variants under their product in a fixed number of queries"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='stock', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.brand = Brand.objects.create(name='Test Brand', slug='test-brand')
+        self.next_product = 0
+
+    def create_product(self, *stock, active=True):
+        self.next_product += 1
+        product = Product.objects.create(
+            name=f'Phone {self.next_product}', sku=f'PHONE-{self.next_product}',
+            brand=self.brand, is_active=active
+        )
+        for number, on_hand in enumerate(stock):
+            variant = ProductVariant.objects.create(
+                product=product, rom=f'{128 * (number + 1)}GB',
+                sku=f'PHONE-{self.next_product}-{number}', price=1000000
+            )
+            Inventory.objects.create(product_variant=variant, on_hand=on_hand)
+        return product
+
+    def get(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/inventory/by_product/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_is_constant(self):
+        for _ in range(2):
+            self.create_product(1, 2)
+        _, small = self.get(page_size=100)
+        for _ in range(6):
+            self.create_product(1, 2, 3, 4)
+        _, large = self.get(page_size=100)
+        self.assertEqual(small, large)
+
+    @override_settings(LOW_STOCK_THRESHOLD=5)
+    def test_totals_and_status(self):
+        product = self.create_product(3, 0)
+        self.create_product(7, active=False)
+        self.create_product()
+        variant = product.variants.get(sku=f'{product.sku}-0')
+        Inventory.objects.filter(product_variant=variant).update(reserved=2)
+
+        response, _ = self.get()
+
+        self.assertEqual(response.data['count'], 1)
+        row = response.data['results'][0]
+        self.assertEqual(row['id'], product.id)
+        self.assertEqual(
+            (row['total_on_hand'], row['total_reserved'], row['total_available'], row['variants_count']),
+            (3, 2, 1, 2)
+        )
+        self.assertEqual(row['status']['value'], 'low_stock')
+        self.assertEqual([v['display'] for v in row['variants']], ['128GB', '256GB'])
+        self.assertEqual(row['variants'][0]['available'], 1)
+
+    def test_search_and_pagination(self):
+        for _ in range(3):
+            self.create_product(5)
+
+        response, _ = self.get(page_size=2)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+        response, _ = self.get(search='Phone 2')
+        self.assertEqual([row['name'] for row in response.data['results']], ['Phone 2'])
+
+
+class TestStockSummaries(TestCase):
+    """Inventory / movement summaries are single aggregate queries honouring the filters"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='stock', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        brand = Brand.objects.create(name='Test Brand', slug='test-brand')
+        self.products = []
+        self.variants = []
+        for number, on_hand in enumerate([0, 4, 50]):
+            product = Product.objects.create(name=f'Phone {number}', sku=f'PHONE-{number}', brand=brand)
+            variant = ProductVariant.objects.create(product=product, sku=f'PHONE-{number}-0', price=1000000)
+            Inventory.objects.create(product_variant=variant, on_hand=on_hand)
+            self.products.append(product)
+            self.variants.append(variant)
+
+    def add_movements(self, count, variant=None):
+        variant = variant or self.variants[0]
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                type='IN' if number % 3 else 'OUT', product_variant=variant,
+                qty=number % 5 + 1, ref_type='StockIn' if number % 3 else 'Order', ref_id=number
+            )
+            for number in range(count)
+        ], batch_size=1000)
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_inventory_summary(self):
+        data, queries = self.get('/api/inventory/summary/')
+        self.assertEqual(queries, 1)
+        self.assertEqual(data, {
+            'total_items': 3, 'total_stock': 54, 'out_of_stock_count': 1,
+            'low_stock_count': 1, 'in_stock_count': 2,
+        })
+
+        data, _ = self.get('/api/inventory/summary/', product=self.products[2].id)
+        self.assertEqual((data['total_items'], data['total_stock']), (1, 50))
+
+    def test_movement_summary_and_report(self):
+        self.add_movements(30)
+        self.add_movements(6, variant=self.variants[1])
+        expected_in = sum(number % 5 + 1 for number in range(30) if number % 3)
+        expected_out = sum(number % 5 + 1 for number in range(30) if not number % 3)
+
+        data, queries = self.get('/api/inventory/movements/summary/', variant=self.variants[0].id)
+        self.assertEqual(queries, 1)
+        self.assertEqual(data, {
+            'total_movements': 30, 'total_in': expected_in, 'total_out': expected_out,
+            'net_change': expected_in - expected_out,
+        })
+
+        data, _ = self.get('/api/inventory/movements/summary/', type='out', ref_type='Order')
+        self.assertEqual(data['total_in'], 0)
+        self.assertEqual(data['total_movements'], 10 + 2)
+
+        data, _ = self.get('/api/reports/stock-movements/', type='in')
+        self.assertEqual(data['summary']['total_out'], 0)
+        self.assertEqual(data['summary']['total_movements'], 20 + 4)
+
+    def test_movement_summary_memory_is_flat(self):
+        """Peak memory of the summary does not grow with the movement table"""
+        def peak_memory():
+            tracemalloc.start()
+            try:
+                self.get('/api/inventory/movements/summary/')
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        self.add_movements(200)
+        peak_memory()  # warm up imports and caches
+        small = peak_memory()
+        self.add_movements(20000)
+        large = peak_memory()
+
+        self.assertLess(large, small * 1.5)
+
+
+class TestStockLedger(TestCase):
+    """apply_stock_changes writes a whole batch with a fixed number of queries"""
+
+    def setUp(self):
+        brand = Brand.objects.create(name='Test Brand', slug='test-brand')
+        self.product = Product.objects.create(name='Phone', sku='PHONE', brand=brand)
+        self.variants = [
+            ProductVariant.objects.create(product=self.product, sku=f'PHONE-{number}', price=1000000)
+            for number in range(12)
+        ]
+        for variant in self.variants[:10]:
+            Inventory.objects.create(product_variant=variant, on_hand=5)
+
+    def on_hand(self, variant):
+        return Inventory.objects.filter(product_variant=variant).values_list('on_hand', 'reserved').first()
+
+    def test_batch_updates_rows_and_movements(self):
+        changes = [
+            StockChange(self.variants[0].id, -2, 'Order', 1, reserved=2),
+            StockChange(self.variants[1].id, 3, 'StockIn', 1),
+            StockChange(self.variants[0].id, -1, 'Order', 1, reserved=1),
+        ]
+
+        result = apply_stock_changes(changes)
+
+        self.assertEqual(result, {self.variants[0].id: 2, self.variants[1].id: 8})
+        self.assertEqual(self.on_hand(self.variants[0]), (2, 3))
+        self.assertEqual(self.on_hand(self.variants[1]), (8, 0))
+        self.assertEqual(
+            sorted(StockMovement.objects.values_list('product_variant_id', 'type', 'qty')),
+            sorted([(self.variants[0].id, 'OUT', 2), (self.variants[0].id, 'OUT', 1), (self.variants[1].id, 'IN', 3)])
+        )
+
+    def test_query_count_does_not_grow_with_batch(self):
+        def count(variants):
+            with CaptureQueriesContext(connection) as queries:
+                apply_stock_changes([StockChange(variant.id, -1, 'StockOut', 1) for variant in variants])
+            return len(queries)
+
+        self.assertEqual(count(self.variants[:2]), count(self.variants[2:10]))
+
+    def test_insufficient_stock_rejects_the_batch(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            apply_stock_changes([
+                StockChange(self.variants[0].id, -1, 'StockOut', 1),
+                StockChange(self.variants[1].id, -6, 'StockOut', 1),
+                StockChange(self.variants[11].id, -1, 'StockOut', 1),
+            ])
+
+        self.assertEqual(raised.exception.errors, [
+            {'product_variant': self.variants[1].id, 'on_hand': 5, 'requested': 6},
+            {'product_variant': self.variants[11].id, 'on_hand': None, 'requested': 1},
+        ])
+        self.assertEqual(self.on_hand(self.variants[0]), (5, 0))
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_stock_in_creates_missing_rows_and_keeps_has_stock(self):
+        Inventory.objects.filter(product_variant__in=self.variants[:10]).update(on_hand=0)
+        Product.refresh_summaries([self.product.id])
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.has_stock)
+
+        apply_stock_changes([StockChange(self.variants[11].id, 4, 'StockIn', 7)])
+        self.product.refresh_from_db()
+        self.assertEqual(self.on_hand(self.variants[11]), (4, 0))
+        self.assertTrue(self.product.has_stock)
+
+        apply_stock_changes([StockChange(self.variants[11].id, -4, 'StockOut', 8)])
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.has_stock)
+
+    def test_reserved_never_goes_negative(self):
+        Inventory.release({self.variants[0].id: 3})
+        self.assertEqual(self.on_hand(self.variants[0]), (5, 0))
+        self.assertFalse(StockMovement.objects.exists())
+
+
+class TestInventorySnapshots(TestCase):
+    """Stock as of a day = nearest snapshot + the movements after it"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='stock', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        brand = Brand.objects.create(name='Test Brand', slug='test-brand')
+        product = Product.objects.create(name='Phone', sku='PHONE', brand=brand)
+        self.phone = ProductVariant.objects.create(product=product, sku='PHONE-1', price=1000)
+        self.case = ProductVariant.objects.create(product=product, sku='PHONE-2', price=100)
+        self.next_ref = 0
+
+    def move(self, variant, delta, day):
+        self.next_ref += 1
+        apply_stock_changes([StockChange(variant.id, delta, 'Test', self.next_ref)])
+        StockMovement.objects.filter(ref_id=self.next_ref).update(
+            created_at=timezone.make_aware(datetime.combine(day, time(12)))
+        )
+
+    def receive(self, variant, qty, unit_cost, day):
+        stock_in = StockIn.objects.create(code=f'IN-{self.next_ref}')
+        StockIn.objects.filter(pk=stock_in.pk).update(created_at=timezone.make_aware(datetime.combine(day, time(9))))
+        StockInItem.objects.create(stock_in=stock_in, product_variant=variant, qty=qty, unit_cost=unit_cost)
+        self.move(variant, qty, day)
+
+    def build_history(self):
+        self.receive(self.phone, 10, 700, date(2026, 1, 5))
+        self.receive(self.case, 4, 50, date(2026, 1, 6))
+        self.move(self.phone, -3, date(2026, 1, 20))
+        self.receive(self.phone, 5, 800, date(2026, 2, 3))
+        self.move(self.case, -4, date(2026, 2, 10))
+        self.move(self.phone, -1, date(2026, 2, 15))
+
+    def test_snapshot_of_a_past_day(self):
+        self.build_history()
+
+        created = take_snapshot(date(2026, 1, 31))
+
+        self.assertEqual(created, 2)
+        self.assertEqual(
+            dict(InventorySnapshot.objects.filter(date=date(2026, 1, 31)).values_list('product_variant_id', 'on_hand')),
+            {self.phone.id: 7, self.case.id: 4}
+        )
+        # Running it again replaces the day
+        take_snapshot(date(2026, 1, 31))
+        self.assertEqual(InventorySnapshot.objects.count(), 2)
+
+    def test_as_of_matches_full_replay(self):
+        self.build_history()
+        days = [date(2026, 1, 4), date(2026, 1, 10), date(2026, 1, 31), date(2026, 2, 12), date(2026, 3, 1)]
+        replayed = {day: stock_as_of(day) for day in days}
+
+        take_snapshot(date(2026, 1, 31))
+        take_snapshot(date(2026, 2, 10))
+
+        for day in days:
+            self.assertEqual(stock_as_of(day), replayed[day], day)
+        self.assertEqual(replayed[date(2026, 2, 12)], {self.phone.id: 12})
+        self.assertEqual(stock_as_of(date(2026, 2, 12), [self.case.id]), {})
+
+    def test_as_of_replays_only_movements_after_the_snapshot(self):
+        self.build_history()
+        take_snapshot(date(2026, 2, 28))
+        InventorySnapshot.objects.filter(product_variant=self.phone).update(on_hand=100)
+
+        self.assertEqual(stock_as_of(date(2026, 3, 5)), {self.phone.id: 100})
+
+    def test_as_of_and_valuation_endpoints(self):
+        self.build_history()
+        take_snapshot(date(2026, 1, 31))
+
+        response = self.client.get('/api/inventory/as_of/', {
+            'date': '2026-02-12', 'variants': f'{self.phone.id},{self.case.id}'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'product_variant': self.phone.id, 'on_hand': 12},
+            {'product_variant': self.case.id, 'on_hand': 0},
+        ])
+
+        response = self.client.get('/api/inventory/valuation/', {'date': '2026-01-31', 'items': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_units'], 11)
+        self.assertEqual(response.data['total_cost_value'], Decimal(7 * 700 + 4 * 50))
+        self.assertEqual(response.data['total_retail_value'], Decimal(7 * 1000 + 4 * 100))
+        self.assertEqual(len(response.data['items']), 2)
+
+        # The cost of the last stock-in up to the day
+        response = self.client.get('/api/inventory/valuation/', {'date': '2026-02-28', 'variants': self.phone.id})
+        self.assertEqual(response.data['total_cost_value'], Decimal(11 * 800))
+        self.assertNotIn('items', response.data)
+
+        response = self.client.get('/api/inventory/as_of/', {'date': '2026-02-30'})
+        self.assertEqual(response.status_code, 400)
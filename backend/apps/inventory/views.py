@@ -1,13 +1,20 @@
 from rest_framework import viewsets, filters, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, F, Sum, Count
-from django.db.models.functions import Coalesce
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+from django.db.models import Q, Exists, OuterRef
 
 from .models import Inventory, StockMovement
-from .serializers import InventorySerializer, StockMovementSerializer
-from apps.catalog.models import Product
+from .serializers import InventorySerializer, StockMovementSerializer, stock_status
+from .snapshots import stock_as_of, valuation
+from .summary import inventory_totals, movement_totals
+from apps.catalog.models import Product, ProductVariant
+from apps.catalog.search import CatalogSearchFilter
+from config.pagination import StandardResultsSetPagination
 
 
 class InventoryViewSet(viewsets.ReadOnlyModelViewSet):
@@ -20,8 +27,10 @@ class InventoryViewSet(viewsets.ReadOnlyModelViewSet):
     )
     serializer_class = InventorySerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [CatalogSearchFilter, filters.OrderingFilter]
     search_fields = ['product_variant__product__name', 'product_variant__sku']
+    catalog_search_target = 'variant'
+    catalog_search_field = 'product_variant_id'
     ordering_fields = ['on_hand', 'updated_at']
     
     def get_queryset(self):
@@ -59,21 +68,19 @@ class InventoryViewSet(viewsets.ReadOnlyModelViewSet):
     def by_product(self, request):
         """
         Get inventory grouped by product (not variant)
-        Each row shows total inventory across all variants of a product
+        Each row shows total inventory across all variants of a product.
+        Runs a fixed number of queries: count, product page, variants of the page.
         """
-        from apps.sales.models import OrderItem
-        
-        # Get search term
         search = request.query_params.get('search', '')
+        threshold = settings.LOW_STOCK_THRESHOLD
         
-        # Get all products with active variants
+        stocked_variants = ProductVariant.objects.filter(
+            product_id=OuterRef('pk'), is_active=True, inventory__isnull=False
+        )
         products_query = Product.objects.filter(
-            is_active=True,
-            variants__is_active=True,
-            variants__inventory__isnull=False
-        ).select_related('brand').distinct()
+            Exists(stocked_variants), is_active=True
+        ).select_related('brand').order_by('-created_at', '-id')
         
-        # Apply search filter
         if search:
             products_query = products_query.filter(
                 Q(name__icontains=search) |
@@ -81,88 +88,36 @@ class InventoryViewSet(viewsets.ReadOnlyModelViewSet):
                 Q(brand__name__icontains=search)
             )
         
-        # Paginate
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 10))
-        
-        total_count = products_query.count()
-        start = (page - 1) * page_size
-        end = start + page_size
+        paginator = StandardResultsSetPagination()
+        products = paginator.paginate_queryset(products_query, request, view=self)
         
-        products = products_query[start:end]
+        # Variant rows of the whole page in one query
+        variants_by_product = {product.id: [] for product in products}
+        variant_rows = ProductVariant.objects.filter(
+            product_id__in=list(variants_by_product), is_active=True, inventory__isnull=False
+        ).order_by('product_id', 'ram', 'rom', 'color', 'id').values_list(
+            'product_id', 'id', 'sku', 'ram', 'rom', 'color', 'price',
+            'inventory__on_hand', 'inventory__reserved'
+        )
+        for product_id, variant_id, sku, ram, rom, color, price, on_hand, reserved in variant_rows:
+            variants_by_product[product_id].append({
+                'id': variant_id,
+                'sku': sku,
+                'display': ' / '.join(part for part in (ram, rom, color) if part) or '-',
+                'ram': ram or '',
+                'rom': rom or '',
+                'color': color or '',
+                'price': float(price),
+                'on_hand': on_hand,
+                'reserved': reserved,
+                'available': max(0, on_hand - reserved)
+            })
         
-        # Build response data
         result_data = []
-        low_stock_threshold = 10
-        
         for product in products:
-            # Get all variants with inventory
-            variants = product.variants.filter(
-                is_active=True,
-                inventory__isnull=False
-            ).select_related('inventory')
-            
-            # Calculate totals
-            total_on_hand = 0
-            total_reserved = 0
-            variants_data = []
-            
-            for variant in variants:
-                inventory = variant.inventory
-                
-                # Calculate reserved quantity
-                reserved = OrderItem.objects.filter(
-                    product_variant=variant,
-                    order__status='pending'
-                ).aggregate(total=Sum('qty'))['total'] or 0
-                
-                total_on_hand += inventory.on_hand
-                total_reserved += reserved
-                
-                # Build variant detail
-                variant_parts = []
-                if variant.ram:
-                    variant_parts.append(variant.ram)
-                if variant.rom:
-                    variant_parts.append(variant.rom)
-                if variant.color:
-                    variant_parts.append(variant.color)
-                
-                variants_data.append({
-                    'id': variant.id,
-                    'sku': variant.sku,
-                    'display': ' / '.join(variant_parts) if variant_parts else '-',
-                    'ram': variant.ram or '',
-                    'rom': variant.rom or '',
-                    'color': variant.color or '',
-                    'price': float(variant.price),
-                    'on_hand': inventory.on_hand,
-                    'reserved': reserved,
-                    'available': max(0, inventory.on_hand - reserved)
-                })
-            
-            total_available = max(0, total_on_hand - total_reserved)
-            
-            # Determine status
-            if total_on_hand == 0:
-                status_data = {
-                    'value': 'out_of_stock',
-                    'label': 'Hết hàng',
-                    'color': 'error'
-                }
-            elif total_on_hand <= low_stock_threshold:
-                status_data = {
-                    'value': 'low_stock',
-                    'label': 'Sắp hết',
-                    'color': 'warning'
-                }
-            else:
-                status_data = {
-                    'value': 'in_stock',
-                    'label': 'Còn hàng',
-                    'color': 'success'
-                }
-            
+            variants_data = variants_by_product[product.id]
+            total_on_hand = sum(variant['on_hand'] for variant in variants_data)
+            total_reserved = sum(variant['reserved'] for variant in variants_data)
             result_data.append({
                 'id': product.id,
                 'name': product.name,
@@ -170,23 +125,18 @@ class InventoryViewSet(viewsets.ReadOnlyModelViewSet):
                 'brand_name': product.brand.name if product.brand else '',
                 'total_on_hand': total_on_hand,
                 'total_reserved': total_reserved,
-                'total_available': total_available,
-                'variants_count': variants.count(),
+                'total_available': max(0, total_on_hand - total_reserved),
+                'variants_count': len(variants_data),
                 'variants': variants_data,
-                'status': status_data
+                'status': stock_status(total_on_hand, threshold)
             })
         
-        return Response({
-            'count': total_count,
-            'page': page,
-            'page_size': page_size,
-            'results': result_data
-        })
+        return paginator.get_paginated_response(result_data)
     
     @action(detail=False, methods=['get'])
     def low_stock_alert(self, request):
         """Get inventory items with low stock"""
-        threshold = int(request.query_params.get('threshold', 10))
+        threshold = int(request.query_params.get('threshold', settings.LOW_STOCK_THRESHOLD))
         
         low_stock_items = self.get_queryset().filter(
             on_hand__lte=threshold,
@@ -211,23 +161,59 @@ class InventoryViewSet(viewsets.ReadOnlyModelViewSet):
             'items': serializer.data
         })
     
+    def snapshot_params(self, request, default_day):
+        """(day, variant ids or None) from ?date=YYYY-MM-DD&variants=1,2,3; ValueError when malformed"""
+        day = default_day
+        if 'date' in request.query_params:
+            day = parse_date(request.query_params['date'])
+            if day is None:
+                raise ValueError('date must use the YYYY-MM-DD format')
+        variants = request.query_params.get('variants')
+        if not variants:
+            return day, None
+        try:
+            return day, [int(value) for value in variants.split(',') if value]
+        except ValueError:
+            raise ValueError('variants must be a comma-separated list of ids')
+    
     @action(detail=False, methods=['get'])
-    def summary(self, request):
-        """Get inventory summary statistics"""
-        queryset = self.get_queryset()
-        
-        total_items = queryset.count()
-        total_stock = sum(item.on_hand for item in queryset)
-        out_of_stock_count = queryset.filter(on_hand=0).count()
-        low_stock_count = queryset.filter(on_hand__lte=10, on_hand__gt=0).count()
+    def as_of(self, request):
+        """On-hand stock at the end of a day (?date=YYYY-MM-DD, default today; ?variants=1,2,3)"""
+        try:
+            day, variant_ids = self.snapshot_params(request, timezone.localdate())
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
+        stock = stock_as_of(day, variant_ids)
+        if variant_ids is not None:
+            stock = {variant_id: stock.get(variant_id, 0) for variant_id in variant_ids}
         return Response({
-            'total_items': total_items,
-            'total_stock': total_stock,
-            'out_of_stock_count': out_of_stock_count,
-            'low_stock_count': low_stock_count,
-            'in_stock_count': total_items - out_of_stock_count
+            'date': day,
+            'results': [
+                {'product_variant': variant_id, 'on_hand': on_hand}
+                for variant_id, on_hand in sorted(stock.items())
+            ]
         })
+    
+    @action(detail=False, methods=['get'])
+    def valuation(self, request):
+        """Stock value at the end of a day (default: end of last month); ?items=1 lists the variants"""
+        last_month_end = timezone.localdate().replace(day=1) - timedelta(days=1)
+        try:
+            day, variant_ids = self.snapshot_params(request, last_month_end)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        result = valuation(day, variant_ids)
+        if request.query_params.get('items') != '1':
+            result.pop('items')
+        return Response(result)
+    
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Get inventory summary statistics (one aggregate query)"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(inventory_totals(queryset, settings.LOW_STOCK_THRESHOLD))
 
 
 class StockMovementViewSet(viewsets.ReadOnlyModelViewSet):
@@ -280,15 +266,6 @@ class StockMovementViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['get'])
     def summary(self, request):
-        """Get stock movement summary"""
-        queryset = self.get_queryset()
-        
-        total_in = sum(m.qty for m in queryset.filter(type='IN'))
-        total_out = sum(m.qty for m in queryset.filter(type='OUT'))
-        
-        return Response({
-            'total_movements': queryset.count(),
-            'total_in': total_in,
-            'total_out': total_out,
-            'net_change': total_in - total_out
-        })
+        """Get stock movement summary (one aggregate query)"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(movement_totals(queryset))
@@ -18,7 +18,7 @@ class SupplierSerializer(serializers.ModelSerializer):
 
 
 class POItemSerializer(serializers.ModelSerializer):
-    product_variant_name = serializers.CharField(source='product_variant.__str__', read_only=True)
+    product_variant_name = serializers.CharField(source='product_variant.display_name', read_only=True)
     line_total = serializers.ReadOnlyField()
     
     class Meta:
@@ -81,7 +81,7 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
 
 
 class StockInItemSerializer(serializers.ModelSerializer):
-    product_variant_name = serializers.CharField(source='product_variant.__str__', read_only=True)
+    product_variant_name = serializers.CharField(source='product_variant.display_name', read_only=True)
     line_total = serializers.ReadOnlyField()
     
     class Meta:
@@ -114,26 +114,12 @@ class StockInSerializer(serializers.ModelSerializer):
         stock_in = StockIn.objects.create(**validated_data)
         
         # Create items and update inventory
-        from apps.inventory.models import Inventory, StockMovement
+        from apps.inventory.ledger import StockChange, apply_stock_changes
         
+        changes = []
         for item_data in items_data:
-            stock_in_item = StockInItem.objects.create(stock_in=stock_in, **item_data)
-            
-            # Update inventory
-            inventory, created = Inventory.objects.get_or_create(
-                product_variant=item_data['product_variant'],
-                defaults={'on_hand': 0}
-            )
-            inventory.on_hand += item_data['qty']
-            inventory.save()
-            
-            # Create stock movement
-            StockMovement.objects.create(
-                type='IN',
-                product_variant=item_data['product_variant'],
-                qty=item_data['qty'],
-                ref_type='StockIn',
-                ref_id=stock_in.id
-            )
+            StockInItem.objects.create(stock_in=stock_in, **item_data)
+            changes.append(StockChange(item_data['product_variant'].id, item_data['qty'], 'StockIn', stock_in.id))
+        apply_stock_changes(changes)
         
         return stock_in 
\ No newline at end of file
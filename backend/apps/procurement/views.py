@@ -2,10 +2,10 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 from django.utils import timezone
 
-from .models import Supplier, PurchaseOrder, StockIn
+from .models import Supplier, PurchaseOrder, POItem, StockIn, StockInItem
 from .serializers import (
     SupplierSerializer, PurchaseOrderSerializer, StockInSerializer
 )
@@ -35,7 +35,9 @@ class PurchaseOrderViewSet(viewsets.ModelViewSet):
     """ViewSet for Purchase Order management"""
     queryset = PurchaseOrder.objects.all().select_related(
         'supplier', 'created_by', 'approved_by'
-    ).prefetch_related('items__product_variant__product__brand')
+    ).prefetch_related(
+        Prefetch('items', queryset=POItem.objects.select_related('product_variant'))
+    )
     serializer_class = PurchaseOrderSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -147,7 +149,7 @@ class PurchaseOrderViewSet(viewsets.ModelViewSet):
 class StockInViewSet(viewsets.ModelViewSet):
     """ViewSet for Stock In management"""
     queryset = StockIn.objects.all().select_related('created_by').prefetch_related(
-        'items__product_variant__product__brand'
+        Prefetch('items', queryset=StockInItem.objects.select_related('product_variant'))
     )
     serializer_class = StockInSerializer
     permission_classes = [IsAuthenticated]
@@ -7,6 +7,7 @@ from datetime import timedelta
 
 from apps.sales.models import Order, OrderItem
 from apps.inventory.models import Inventory, StockMovement
+from apps.inventory.summary import movement_totals
 from apps.catalog.models import Product, ProductVariant
 from apps.customers.models import Customer
 
@@ -336,17 +337,8 @@ def stock_movements_report(request):
     if movement_type:
         movements = movements.filter(type=movement_type.upper())
     
-    # Calculate totals
-    total_in = sum(m.qty for m in movements.filter(type='IN'))
-    total_out = sum(m.qty for m in movements.filter(type='OUT'))
-    
     return Response({
-        'summary': {
-            'total_movements': movements.count(),
-            'total_in': total_in,
-            'total_out': total_out,
-            'net_change': total_in - total_out
-        },
+        'summary': movement_totals(movements),
         'movements': [
             {
                 'id': m.id,
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.sales.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Cancel pending orders older than ORDER_PENDING_EXPIRY_HOURS and return their stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, help='Override ORDER_PENDING_EXPIRY_HOURS')
+
+    def handle(self, *args, **options):
+        hours = options['hours'] or settings.ORDER_PENDING_EXPIRY_HOURS
+        cutoff = timezone.now() - timedelta(hours=hours)
+        # An online payment started within the window may still come back successful
+        expired = Order.objects.filter(status='pending', created_at__lt=cutoff).exclude(
+            payments__status='pending', payments__created_at__gte=cutoff
+        ).values_list('id', flat=True)
+
+        cancelled = 0
+        for order_id in list(expired):
+            with transaction.atomic():
+                order = Order.objects.select_for_update().filter(pk=order_id, status='pending').first()
+                if order is not None:
+                    order.cancel()
+                    cancelled += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Cancelled {cancelled} expired pending orders'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.sales.recommendations import update_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Count newly paid orders into the "frequently bought together" recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recount every paid order and re-rank all variants (also drops orders no longer paid)')
+
+    def handle(self, *args, **options):
+        result = update_recommendations(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Counted {result['orders']} orders ({result['total_orders']} in total)"
+        ))
@@ -0,0 +1,124 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_paid_at(apps, schema_editor):
+    from django.db.models import F, OuterRef, Subquery
+    from django.db.models.functions import Coalesce
+
+    Order = apps.get_model('sales', 'Order')
+    Payment = apps.get_model('sales', 'Payment')
+    # When the successful payment was taken, else the last change of the order
+    payment_time = Payment.objects.filter(
+        order=OuterRef('pk'), status='success', paid_at__isnull=False
+    ).order_by('-paid_at').values('paid_at')[:1]
+    Order.objects.filter(status='paid').update(paid_at=Coalesce(Subquery(payment_time), F('updated_at')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_productvariant_display_name'),
+        ('sales', '0003_rename_payments_vnp_txn_ref_idx_payments_vnp_txn_1624ee_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_orders', models.IntegerField(default=0)),
+                ('last_paid_at', models.DateTimeField(blank=True, null=True)),
+                ('last_order_id', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Recommendation State',
+                'verbose_name_plural': 'Recommendation State',
+                'db_table': 'recommendation_state',
+            },
+        ),
+        migrations.CreateModel(
+            name='VariantOrderCount',
+            fields=[
+                ('product_variant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_count', serialize=False, to='catalog.productvariant')),
+                ('orders', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Variant Order Count',
+                'verbose_name_plural': 'Variant Order Counts',
+                'db_table': 'variant_order_counts',
+            },
+        ),
+        migrations.CreateModel(
+            name='VariantPairCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Variant Pair Count',
+                'verbose_name_plural': 'Variant Pair Counts',
+                'db_table': 'variant_pair_counts',
+            },
+        ),
+        migrations.CreateModel(
+            name='VariantRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('lift', models.FloatField()),
+                ('orders', models.IntegerField()),
+            ],
+            options={
+                'verbose_name': 'Variant Recommendation',
+                'verbose_name_plural': 'Variant Recommendations',
+                'db_table': 'variant_recommendations',
+                'ordering': ['product_variant', 'rank'],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['paid_at', 'id'], name='orders_paid_at_b57832_idx'),
+        ),
+        migrations.AddField(
+            model_name='variantrecommendation',
+            name='partner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.productvariant'),
+        ),
+        migrations.AddField(
+            model_name='variantrecommendation',
+            name='product_variant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='catalog.productvariant'),
+        ),
+        migrations.AddField(
+            model_name='variantpaircount',
+            name='partner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.productvariant'),
+        ),
+        migrations.AddField(
+            model_name='variantpaircount',
+            name='product_variant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.productvariant'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='variantrecommendation',
+            unique_together={('product_variant', 'rank')},
+        ),
+        migrations.AddIndex(
+            model_name='variantpaircount',
+            index=models.Index(fields=['partner'], name='variant_pai_partner_fd9c65_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='variantpaircount',
+            unique_together={('product_variant', 'partner')},
+        ),
+        migrations.RunPython(backfill_paid_at, migrations.RunPython.noop),
+    ]
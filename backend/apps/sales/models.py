@@ -1,9 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Sum
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from decimal import Decimal
 
 
+class OrderStateError(Exception):
+    """The order is no longer in the status the change was made from"""
+
+
 class Order(models.Model):
     """Order model"""
     STATUS_CHOICES = [
@@ -22,6 +28,7 @@ class Order(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_orders')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    paid_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         db_table = 'orders'
@@ -32,11 +39,85 @@ class Order(models.Model):
             models.Index(fields=['code']),
             models.Index(fields=['customer', 'status']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['paid_at', 'id']),
         ]
 
     def __str__(self):
         return f"{self.code} - {self.status}"
 
+    # Status the instance was read with (from_db) or last saved with
+    _loaded_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Stamp the moment the order became paid (recommendations read orders by it)
+        if self.status == 'paid' and self.paid_at is None:
+            self.paid_at = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'paid_at'}
+
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            self._loaded_status = self.status
+            return
+
+        from apps.inventory.models import Inventory
+
+        with transaction.atomic():
+            # Locked so that concurrent payment / cancellation release the items only once
+            current = Order.objects.select_for_update().filter(pk=self.pk).values_list('status', flat=True).first()
+            # A stale instance must not overwrite a status another transaction changed (paid -> cancelled)
+            if self._loaded_status is not None and current not in (None, self._loaded_status, self.status):
+                raise OrderStateError(f'Order is already {current}')
+            super().save(*args, **kwargs)
+            self._loaded_status = self.status
+            if current == 'pending' and self.status != 'pending':
+                Inventory.release(self.item_quantities())
+
+    def delete(self, *args, **kwargs):
+        from apps.inventory.models import Inventory
+
+        with transaction.atomic():
+            if Order.objects.select_for_update().filter(pk=self.pk, status='pending').exists():
+                Inventory.release(self.item_quantities())
+            return super().delete(*args, **kwargs)
+
+    @transaction.atomic
+    def cancel(self):
+        """Cancel the order and put its items back in stock; OrderStateError unless it is pending"""
+        from apps.inventory.ledger import StockChange, apply_stock_changes
+        from apps.inventory.models import StockMovement
+
+        # Order row first, inventory rows after: the lock order of a payment (save)
+        current = Order.objects.select_for_update().values_list('status', flat=True).get(pk=self.pk)
+        if current != 'pending':
+            raise OrderStateError(f'Order is already {current}')
+
+        # Only the items whose stock was taken when the order was created
+        taken = set(StockMovement.objects.filter(
+            ref_type='Order', ref_id=self.id, type='OUT'
+        ).values_list('product_variant_id', flat=True))
+        apply_stock_changes([
+            StockChange(order_item.product_variant_id, order_item.qty, 'OrderCancellation', self.id)
+            for order_item in self.items.all() if order_item.product_variant_id in taken
+        ])
+
+        # Leaving 'pending' releases the reserved quantities (save)
+        self.status = 'cancelled'
+        self.save(update_fields=['status', 'updated_at'])
+
+    def item_quantities(self):
+        """{variant id: total qty} of the order's items"""
+        return dict(
+            self.items.values('product_variant_id').annotate(total=Sum('qty'))
+            .order_by('product_variant_id').values_list('product_variant_id', 'total')
+        )
+
     def calculate_totals(self):
         """Calculate order totals from items"""
         self.subtotal = sum(item.line_total for item in self.items.all() if item.line_total)
@@ -181,4 +262,67 @@ class StockOutItem(models.Model):
         verbose_name_plural = 'Stock Out Items'
 
     def __str__(self):
-        return f"{self.stock_out.code} - {self.product_variant}"
\ No newline at end of file
+        return f"{self.stock_out.code} - {self.product_variant}"
+
+
+class VariantOrderCount(models.Model):
+    """Number of paid orders containing a variant"""
+    product_variant = models.OneToOneField(
+        'catalog.ProductVariant', on_delete=models.CASCADE, primary_key=True, related_name='order_count'
+    )
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'variant_order_counts'
+        verbose_name = 'Variant Order Count'
+        verbose_name_plural = 'Variant Order Counts'
+
+
+class VariantPairCount(models.Model):
+    """Number of paid orders containing both variants (stored once, variant id < partner id)"""
+    product_variant = models.ForeignKey('catalog.ProductVariant', on_delete=models.CASCADE, related_name='+')
+    partner = models.ForeignKey('catalog.ProductVariant', on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'variant_pair_counts'
+        verbose_name = 'Variant Pair Count'
+        verbose_name_plural = 'Variant Pair Counts'
+        unique_together = [['product_variant', 'partner']]
+        indexes = [
+            models.Index(fields=['partner']),
+        ]
+
+
+class VariantRecommendation(models.Model):
+    """Top partners of a variant by lift ("frequently bought together")"""
+    product_variant = models.ForeignKey(
+        'catalog.ProductVariant', on_delete=models.CASCADE, related_name='recommendations'
+    )
+    partner = models.ForeignKey('catalog.ProductVariant', on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    lift = models.FloatField()
+    orders = models.IntegerField()
+
+    class Meta:
+        db_table = 'variant_recommendations'
+        ordering = ['product_variant', 'rank']
+        verbose_name = 'Variant Recommendation'
+        verbose_name_plural = 'Variant Recommendations'
+        unique_together = [['product_variant', 'rank']]
+
+    def __str__(self):
+        return f"{self.product_variant_id} -> {self.partner_id} ({self.lift:.2f})"
+
+
+class RecommendationState(models.Model):
+    """Progress of the recommendation job (single row)"""
+    total_orders = models.IntegerField(default=0)
+    last_paid_at = models.DateTimeField(null=True, blank=True)
+    last_order_id = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'recommendation_state'
+        verbose_name = 'Recommendation State'
+        verbose_name_plural = 'Recommendation State'
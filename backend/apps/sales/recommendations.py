@@ -0,0 +1,208 @@
+"""
+"Frequently bought together" recommendations.
+
+The job reads the variants of paid orders (one streamed query over ``order_items``,
+ordered by payment time) and counts, per order, every variant and every pair of
+distinct variants in it. The counts are a sparse variant x variant co-occurrence
+matrix kept in ``VariantPairCount`` (upper triangle, variant id < partner id) and
+``VariantOrderCount`` (the diagonal). Each variant's partners are scored by lift::
+
+    lift(a, b) = orders(a, b) * total_orders / (orders(a) * orders(b))
+
+and the best ``TOP_N`` with lift above 1 are stored in ``VariantRecommendation``, so a
+cart is answered with one indexed read of at most ``len(cart) * TOP_N`` rows.
+
+Runs are incremental: ``RecommendationState`` remembers the last order counted
+(``paid_at``, id) and the next run only counts orders paid after it, then re-ranks the
+variants those orders contain. Lifts of other variants drift slightly as the totals
+grow; a periodic ``full`` rebuild re-ranks everything.
+
+Counts only ever grow: an order counted while paid and later changed to another
+status (refunded, cancelled by an admin) stays in them. Only a ``full`` rebuild,
+which recounts the orders paid at that moment, drops it.
+"""
+import heapq
+from collections import Counter
+from datetime import timedelta
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+
+TOP_N = 10
+# A pair seen in fewer orders than this is noise, whatever its lift
+MIN_PAIR_ORDERS = 2
+# Orders with more variants than this (bulk / wholesale) add no pairs
+MAX_BASKET = 50
+MAX_CART = 50
+# Orders paid in the last seconds are left for the next run, their transaction may still be open
+SETTLE_SECONDS = 60
+QUERY_CHUNK = 1000
+WRITE_BATCH = 2000
+
+
+def chunked(values, size=QUERY_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def paid_baskets(after, until):
+    """(paid_at, order id, variant ids) of orders paid after ``after`` (paid_at, id) up to ``until``"""
+    from .models import OrderItem
+
+    items = OrderItem.objects.filter(order__status='paid', order__paid_at__lte=until)
+    if after is not None:
+        paid_at, order_id = after
+        items = items.filter(
+            Q(order__paid_at__gt=paid_at) | Q(order__paid_at=paid_at, order_id__gt=order_id)
+        )
+    rows = items.order_by('order__paid_at', 'order_id').values_list(
+        'order__paid_at', 'order_id', 'product_variant_id'
+    ).iterator(chunk_size=10000)
+    for (paid_at, order_id), group in groupby(rows, key=itemgetter(0, 1)):
+        yield paid_at, order_id, {row[2] for row in group}
+
+
+def count_baskets(baskets):
+    """Order count, last (paid_at, id), per-variant and per-pair counters of the baskets"""
+    variant_counts = Counter()
+    pair_counts = Counter()
+    orders = 0
+    last = None
+    for paid_at, order_id, variants in baskets:
+        orders += 1
+        last = (paid_at, order_id)
+        variant_counts.update(variants)
+        if 1 < len(variants) <= MAX_BASKET:
+            pair_counts.update(combinations(sorted(variants), 2))
+    return orders, last, variant_counts, pair_counts
+
+
+def merge_variant_counts(variant_counts):
+    from .models import VariantOrderCount
+
+    changed = []
+    for chunk in chunked(variant_counts):
+        for row in VariantOrderCount.objects.filter(product_variant_id__in=chunk):
+            row.orders += variant_counts.pop(row.product_variant_id)
+            changed.append(row)
+    VariantOrderCount.objects.bulk_update(changed, ['orders'], batch_size=WRITE_BATCH)
+    VariantOrderCount.objects.bulk_create([
+        VariantOrderCount(product_variant_id=variant_id, orders=orders)
+        for variant_id, orders in variant_counts.items()
+    ], batch_size=WRITE_BATCH)
+
+
+def merge_pair_counts(pair_counts):
+    from .models import VariantPairCount
+
+    changed = []
+    for chunk in chunked({variant_id for variant_id, _ in pair_counts}):
+        for row in VariantPairCount.objects.filter(product_variant_id__in=chunk):
+            added = pair_counts.pop((row.product_variant_id, row.partner_id), 0)
+            if added:
+                row.orders += added
+                changed.append(row)
+    VariantPairCount.objects.bulk_update(changed, ['orders'], batch_size=WRITE_BATCH)
+    VariantPairCount.objects.bulk_create([
+        VariantPairCount(product_variant_id=variant_id, partner_id=partner_id, orders=orders)
+        for (variant_id, partner_id), orders in pair_counts.items()
+    ], batch_size=WRITE_BATCH)
+
+
+def rank_partners(variant_ids, total_orders, top_n=TOP_N):
+    """Replace the stored recommendations of ``variant_ids``"""
+    from .models import VariantOrderCount, VariantPairCount, VariantRecommendation
+
+    order_counts = dict(VariantOrderCount.objects.values_list('product_variant_id', 'orders'))
+    for chunk in chunked(variant_ids):
+        wanted = set(chunk)
+        partners = {variant_id: [] for variant_id in chunk}
+        pairs = VariantPairCount.objects.filter(
+            Q(product_variant_id__in=chunk) | Q(partner_id__in=chunk), orders__gte=MIN_PAIR_ORDERS
+        ).values_list('product_variant_id', 'partner_id', 'orders')
+        for variant_id, partner_id, orders in pairs:
+            if variant_id in wanted:
+                partners[variant_id].append((partner_id, orders))
+            if partner_id in wanted:
+                partners[partner_id].append((variant_id, orders))
+
+        recommendations = []
+        for variant_id, candidates in partners.items():
+            variant_orders = order_counts.get(variant_id)
+            if not variant_orders:
+                continue
+            scored = (
+                (orders * total_orders / (variant_orders * order_counts[partner_id]), orders, partner_id)
+                for partner_id, orders in candidates
+            )
+            best = heapq.nlargest(top_n, (score for score in scored if score[0] > 1))
+            recommendations.extend(
+                VariantRecommendation(
+                    product_variant_id=variant_id, partner_id=partner_id,
+                    rank=rank, lift=round(lift, 4), orders=orders,
+                )
+                for rank, (lift, orders, partner_id) in enumerate(best, start=1)
+            )
+
+        VariantRecommendation.objects.filter(product_variant_id__in=chunk).delete()
+        VariantRecommendation.objects.bulk_create(recommendations, batch_size=WRITE_BATCH)
+
+
+@transaction.atomic
+def update_recommendations(full=False, settle_seconds=SETTLE_SECONDS):
+    """Count the orders paid since the last run (all of them with ``full``) and re-rank; returns a summary"""
+    from .models import (
+        RecommendationState, VariantOrderCount, VariantPairCount, VariantRecommendation,
+    )
+
+    # The state row also serializes concurrent runs
+    RecommendationState.objects.get_or_create(pk=1)
+    state = RecommendationState.objects.select_for_update().get(pk=1)
+    if full:
+        VariantRecommendation.objects.all().delete()
+        VariantPairCount.objects.all().delete()
+        VariantOrderCount.objects.all().delete()
+        state.total_orders = 0
+        state.last_paid_at = None
+        state.last_order_id = 0
+
+    after = (state.last_paid_at, state.last_order_id) if state.last_paid_at else None
+    until = timezone.now() - timedelta(seconds=settle_seconds)
+    orders, last, variant_counts, pair_counts = count_baskets(paid_baskets(after, until))
+
+    if orders:
+        affected = set(variant_counts)
+        merge_variant_counts(variant_counts)
+        merge_pair_counts(pair_counts)
+        state.total_orders += orders
+        state.last_paid_at, state.last_order_id = last
+        ranked = VariantOrderCount.objects.values_list('product_variant_id', flat=True) if full else affected
+        rank_partners(sorted(ranked), state.total_orders)
+    state.save()
+
+    return {'orders': orders, 'total_orders': state.total_orders, 'full': full}
+
+
+def recommend_for_cart(variant_ids, limit=5):
+    """Partners of the cart's variants (best lift first), excluding the cart and inactive or out-of-stock variants"""
+    from .models import VariantRecommendation
+
+    cart = set(variant_ids[:MAX_CART])
+    rows = VariantRecommendation.objects.filter(
+        product_variant_id__in=cart,
+        partner__is_active=True,
+        partner__product__is_active=True,
+        partner__inventory__on_hand__gt=0,
+    ).exclude(partner_id__in=cart).select_related('partner')
+
+    best = {}
+    for row in rows:
+        current = best.get(row.partner_id)
+        if current is None or row.lift > current.lift:
+            best[row.partner_id] = row
+    return sorted(best.values(), key=lambda row: (-row.lift, -row.orders))[:limit]
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.db import transaction
-from .models import Order, OrderItem, Payment, StockOut, StockOutItem
+from .models import Order, OrderItem, Payment, StockOut, StockOutItem, VariantRecommendation
 from apps.customers.serializers import CustomerSerializer
 import logging
 
@@ -8,7 +8,7 @@ logger = logging.getLogger(__name__)
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_variant_name = serializers.CharField(source='product_variant.__str__', read_only=True)
+    product_variant_name = serializers.CharField(source='product_variant.display_name', read_only=True)
     product_name = serializers.CharField(source='product_variant.product.name', read_only=True)
     variant_sku = serializers.CharField(source='product_variant.sku', read_only=True)
     
@@ -66,46 +66,30 @@ class OrderSerializer(serializers.ModelSerializer):
         order = Order.objects.create(**validated_data)
         logger.info(f"Created order {order.code} with id {order.id}")
         
-        # Import Inventory and StockMovement models
-        from apps.inventory.models import Inventory, StockMovement
+        from apps.inventory.ledger import InsufficientStock, StockChange, apply_stock_changes
         
-        # Create order items with snapshot price and reduce inventory
+        # Create order items with snapshot price
+        changes = []
         for item_data in items_data:
             variant = item_data['product_variant']
-            qty = item_data['qty']
             item_data['unit_price'] = variant.price  # Snapshot current price
             OrderItem.objects.create(order=order, **item_data)
-            
-            logger.info(f"Processing variant {variant.id} (SKU: {variant.sku}), qty: {qty}")
-            
-            # Reduce inventory immediately when order is created
-            try:
-                inventory = Inventory.objects.select_for_update().get(product_variant=variant)
-                old_qty = inventory.on_hand
-                inventory.on_hand -= qty
-                inventory.save()
-                
-                logger.info(f"Reduced inventory for variant {variant.sku}: {old_qty} -> {inventory.on_hand}")
-                
-                # Create stock movement record
-                movement = StockMovement.objects.create(
-                    type='OUT',
-                    product_variant=variant,
-                    qty=qty,
-                    ref_type='Order',
-                    ref_id=order.id
-                )
-                logger.info(f"Created StockMovement id={movement.id} for order {order.code}")
-                
-            except Inventory.DoesNotExist:
-                logger.error(f'Inventory not found for variant {variant.sku} (id={variant.id})')
-                # This should not happen if validation is correct
-                raise serializers.ValidationError({
-                    'items': f'Inventory not found for variant {variant.sku}'
-                })
-            except Exception as e:
-                logger.error(f'Error reducing inventory: {str(e)}')
-                raise
+            changes.append(StockChange(
+                variant.id, -item_data['qty'], 'Order', order.id,
+                reserved=item_data['qty'] if order.status == 'pending' else 0
+            ))
+        
+        # Reduce inventory immediately when order is created (rolled back with the order if short)
+        try:
+            apply_stock_changes(changes)
+        except InsufficientStock as e:
+            logger.warning(f"Insufficient stock for order {order.code}: {e.errors}")
+            raise serializers.ValidationError({'items': [
+                f"Insufficient stock for variant {error['product_variant']}. "
+                f"Only {error['on_hand'] or 0} available."
+                for error in e.errors
+            ]})
+        logger.info(f"Reduced inventory for order {order.code} ({len(changes)} items)")
         
         # Calculate totals
         order.calculate_totals()
@@ -123,11 +107,17 @@ class OrderSerializer(serializers.ModelSerializer):
         
         # Update items if provided
         if items_data is not None:
+            from apps.inventory.models import Inventory
+
+            if instance.status == 'pending':
+                Inventory.release(instance.item_quantities())
             instance.items.all().delete()
             for item_data in items_data:
                 variant = item_data['product_variant']
                 item_data['unit_price'] = variant.price
                 OrderItem.objects.create(order=instance, **item_data)
+            if instance.status == 'pending':
+                Inventory.reserve(instance.item_quantities())
             instance.calculate_totals()
         
         return instance
@@ -146,8 +136,21 @@ class PaymentSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'txn_code', 'raw_response_json', 'paid_at', 'created_at']
 
 
+class VariantRecommendationSerializer(serializers.ModelSerializer):
+    """A recommended variant (the partner) for a cart"""
+    id = serializers.IntegerField(source='partner_id', read_only=True)
+    name = serializers.CharField(source='partner.display_name', read_only=True)
+    sku = serializers.CharField(source='partner.sku', read_only=True)
+    price = serializers.DecimalField(source='partner.price', max_digits=12, decimal_places=0, read_only=True)
+    recommended_with = serializers.IntegerField(source='product_variant_id', read_only=True)
+
+    class Meta:
+        model = VariantRecommendation
+        fields = ['id', 'name', 'sku', 'price', 'lift', 'orders', 'recommended_with']
+
+
 class StockOutItemSerializer(serializers.ModelSerializer):
-    product_variant_name = serializers.CharField(source='product_variant.__str__', read_only=True)
+    product_variant_name = serializers.CharField(source='product_variant.display_name', read_only=True)
     
     class Meta:
         model = StockOutItem
@@ -178,23 +181,20 @@ class StockOutSerializer(serializers.ModelSerializer):
         stock_out = StockOut.objects.create(**validated_data)
         
         # Create items and reduce inventory
-        from apps.inventory.models import Inventory, StockMovement
+        from apps.inventory.ledger import InsufficientStock, StockChange, apply_stock_changes
         
+        changes = []
         for item_data in items_data:
-            stock_out_item = StockOutItem.objects.create(stock_out=stock_out, **item_data)
-            
-            # Reduce inventory
-            inventory = Inventory.objects.get(product_variant=item_data['product_variant'])
-            inventory.on_hand -= item_data['qty']
-            inventory.save()
-            
-            # Create stock movement
-            StockMovement.objects.create(
-                type='OUT',
-                product_variant=item_data['product_variant'],
-                qty=item_data['qty'],
-                ref_type='StockOut',
-                ref_id=stock_out.id
-            )
+            StockOutItem.objects.create(stock_out=stock_out, **item_data)
+            changes.append(StockChange(item_data['product_variant'].id, -item_data['qty'], 'StockOut', stock_out.id))
+        
+        try:
+            apply_stock_changes(changes)
+        except InsufficientStock as e:
+            raise serializers.ValidationError({'items': [
+                f"Insufficient stock for variant {error['product_variant']}. "
+                f"Only {error['on_hand'] or 0} available."
+                for error in e.errors
+            ]})
         
         return stock_out
\ No newline at end of file
@@ -0,0 +1,306 @@
+"""
+Test suite for the sales app
+Run with: python manage.py test apps.sales.tests
+"""
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from apps.catalog.models import Brand, Product, ProductVariant
+from apps.inventory.models import Inventory
+from apps.sales.models import (
+    Order, OrderItem, OrderStateError, Payment, RecommendationState, VariantOrderCount, VariantPairCount, VariantRecommendation,
+)
+from apps.sales.recommendations import update_recommendations
+from apps.sales.serializers import OrderSerializer
+
+
+class TestRecommendations(TestCase):
+    """Frequently-bought-together counts, lift ranking and the cart endpoint"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sales', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        brand = Brand.objects.create(name='Test Brand', slug='test-brand')
+        self.variants = {}
+        for name in ('phone', 'case', 'charger', 'cable', 'tablet'):
+            product = Product.objects.create(name=name.title(), sku=name.upper(), brand=brand)
+            variant = ProductVariant.objects.create(product=product, sku=f'{name.upper()}-1', price=100000)
+            Inventory.objects.create(product_variant=variant, on_hand=10)
+            self.variants[name] = variant
+        self.next_order = 0
+
+    def order(self, *names, status='paid'):
+        self.next_order += 1
+        order = Order.objects.create(code=f'ORD-{self.next_order}', status=status)
+        for name in names:
+            OrderItem.objects.create(order=order, product_variant=self.variants[name], qty=1)
+        return order
+
+    def ids(self, *names):
+        return [self.variants[name].id for name in names]
+
+    def recommended(self, name):
+        return list(
+            VariantRecommendation.objects.filter(product_variant=self.variants[name])
+            .order_by('rank').values_list('partner_id', flat=True)
+        )
+
+    def test_paid_at_is_stamped_once(self):
+        order = self.order('phone', status='pending')
+        self.assertIsNone(order.paid_at)
+        order.status = 'paid'
+        order.save()
+        paid_at = order.paid_at
+        self.assertIsNotNone(paid_at)
+        order.save()
+        self.assertEqual(order.paid_at, paid_at)
+
+    def test_counts_and_lift_ranking(self):
+        for _ in range(3):
+            self.order('phone', 'case')
+        self.order('phone', 'charger')
+        self.order('phone', 'charger')
+        self.order('case')
+        self.order('cable')
+        self.order('tablet')
+        self.order('phone', 'case', status='pending')
+
+        result = update_recommendations(settle_seconds=0)
+
+        self.assertEqual(result['orders'], 8)
+        self.assertEqual(
+            VariantOrderCount.objects.get(product_variant=self.variants['phone']).orders, 5
+        )
+        pair = VariantPairCount.objects.get(
+            product_variant__in=self.ids('phone', 'case'), partner__in=self.ids('phone', 'case')
+        )
+        self.assertEqual(pair.orders, 3)
+        # lift(phone, charger) = 2 * 8 / (5 * 2) = 1.6; lift(phone, case) = 3 * 8 / (5 * 4) = 1.2
+        self.assertEqual(self.recommended('phone'), self.ids('charger', 'case'))
+        self.assertAlmostEqual(
+            VariantRecommendation.objects.get(product_variant=self.variants['phone'], rank=2).lift, 1.2
+        )
+        self.assertEqual(self.recommended('case'), self.ids('phone'))
+
+    def test_incremental_update_counts_only_new_orders(self):
+        self.order('phone', 'case')
+        self.order('phone', 'case')
+        self.order('tablet')
+        update_recommendations(settle_seconds=0)
+        self.assertEqual(self.recommended('charger'), [])
+
+        self.assertEqual(update_recommendations(settle_seconds=0)['orders'], 0)
+
+        pending = self.order('charger', 'cable', status='pending')
+        self.order('charger', 'cable')
+        pending.status = 'paid'
+        pending.save()
+        result = update_recommendations(settle_seconds=0)
+
+        self.assertEqual(result, {'orders': 2, 'total_orders': 5, 'full': False})
+        self.assertEqual(self.recommended('charger'), self.ids('cable'))
+        self.assertEqual(RecommendationState.objects.get().last_order_id, pending.id)
+
+        full = update_recommendations(full=True, settle_seconds=0)
+        self.assertEqual(full['total_orders'], 5)
+        self.assertEqual(self.recommended('charger'), self.ids('cable'))
+        self.assertEqual(self.recommended('phone'), self.ids('case'))
+
+    def test_recent_orders_wait_for_the_next_run(self):
+        self.order('phone', 'case')
+        self.assertEqual(update_recommendations()['orders'], 0)
+        self.assertEqual(update_recommendations(settle_seconds=0)['orders'], 1)
+
+    def test_cart_endpoint(self):
+        for _ in range(2):
+            self.order('phone', 'case')
+            self.order('phone', 'charger', 'case')
+            self.order('cable')
+            self.order('tablet')
+        update_recommendations(settle_seconds=0)
+        inventory = self.variants['charger'].inventory
+        inventory.on_hand = 0
+        inventory.save()
+
+        response = self.client.get('/api/orders/recommendations/', {'variants': self.variants['phone'].id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data], self.ids('case'))
+        self.assertEqual(response.data[0]['name'], self.variants['case'].display_name)
+        self.assertEqual(response.data[0]['recommended_with'], self.variants['phone'].id)
+
+        cart = ','.join(map(str, self.ids('phone', 'case')))
+        response = self.client.get('/api/orders/recommendations/', {'variants': cart})
+        self.assertEqual(response.data, [])
+
+        response = self.client.get('/api/orders/recommendations/', {'variants': 'x'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/orders/recommendations/', {'variants': cart, 'limit': 0})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestOrderReservations(TestCase):
+    """Inventory.reserved follows the pending orders"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cashier', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        brand = Brand.objects.create(name='Test Brand', slug='test-brand')
+        product = Product.objects.create(name='Phone', sku='PHONE', brand=brand)
+        self.variants = []
+        for number in range(2):
+            variant = ProductVariant.objects.create(product=product, sku=f'PHONE-{number}', price=100000)
+            Inventory.objects.create(product_variant=variant, on_hand=10)
+            self.variants.append(variant)
+        self.next_order = 0
+
+    def create_order(self, *quantities):
+        self.next_order += 1
+        response = self.client.post('/api/orders/', {
+            'code': f'ORD-{self.next_order}',
+            'items': [
+                {'product_variant': variant.id, 'qty': qty}
+                for variant, qty in zip(self.variants, quantities) if qty
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Order.objects.get(pk=response.data['id'])
+
+    def stock(self, index=0):
+        inventory = Inventory.objects.get(product_variant=self.variants[index])
+        return inventory.on_hand, inventory.reserved
+
+    def test_pending_order_reserves_and_payment_releases(self):
+        order = self.create_order(2, 1)
+        self.create_order(3)
+        self.assertEqual(self.stock(0), (5, 5))
+        self.assertEqual(self.stock(1), (9, 1))
+
+        response = self.client.post(f'/api/orders/{order.id}/create_cash_payment/', {}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(0), (5, 3))
+        self.assertEqual(self.stock(1), (9, 0))
+        # Saving the paid order again does not release twice
+        order.refresh_from_db()
+        order.save()
+        self.assertEqual(self.stock(0), (5, 3))
+
+    def test_short_stock_rolls_back_the_order(self):
+        """Stock taken between validation and create (a concurrent order) rejects the whole order"""
+        with self.assertRaises(ValidationError):
+            OrderSerializer().create({'code': 'ORD-RACE', 'items': [
+                {'product_variant': self.variants[0], 'qty': 2},
+                {'product_variant': self.variants[1], 'qty': 11},
+            ]})
+
+        self.assertFalse(Order.objects.filter(code='ORD-RACE').exists())
+        self.assertEqual(self.stock(0), (10, 0))
+        self.assertEqual(self.stock(1), (10, 0))
+
+    def test_cancel_restores_stock_and_releases(self):
+        order = self.create_order(2, 1)
+
+        response = self.client.post(f'/api/orders/{order.id}/cancel/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(0), (10, 0))
+        self.assertEqual(self.stock(1), (10, 0))
+
+    def test_cancelling_a_paid_order_is_rejected(self):
+        order = self.create_order(2)
+        stale = Order.objects.get(pk=order.pk)
+        self.client.post(f'/api/orders/{order.id}/create_cash_payment/', {}, format='json')
+
+        with self.assertRaises(OrderStateError):
+            stale.cancel()
+        response = self.client.post(f'/api/orders/{order.id}/cancel/')
+
+        self.assertEqual(response.status_code, 400)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'paid')
+        self.assertEqual(self.stock(0), (8, 0))
+
+    def test_stale_instance_cannot_overwrite_a_status_change(self):
+        order = self.create_order(2)
+        first = Order.objects.get(pk=order.pk)
+        second = Order.objects.get(pk=order.pk)
+        first.status = 'paid'
+        first.save()
+
+        second.status = 'cancelled'
+        with self.assertRaises(OrderStateError):
+            second.save()
+        second.status = 'paid'
+        second.save()
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'paid')
+        self.assertEqual(self.stock(0), (8, 0))
+
+    def test_items_name_the_product_and_the_variant(self):
+        order = self.create_order(1)
+        self.variants[0].color = 'Black'
+        self.variants[0].save()
+
+        item = self.client.get(f'/api/orders/{order.id}/').data['items'][0]
+
+        self.assertEqual(item['product_name'], 'Phone')
+        self.assertEqual(item['product_variant_name'], 'Phone - Black')
+
+    def test_replacing_items_moves_the_reservation(self):
+        order = self.create_order(2)
+
+        response = self.client.patch(f'/api/orders/{order.id}/', {
+            'items': [{'product_variant': self.variants[1].id, 'qty': 4}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.stock(0)[1], 0)
+        self.assertEqual(self.stock(1)[1], 4)
+
+    def test_expire_pending_orders(self):
+        old = self.create_order(2)
+        recent = self.create_order(1)
+        paying = self.create_order(3)
+        Order.objects.filter(pk__in=[old.pk, paying.pk]).update(created_at=timezone.now() - timedelta(hours=30))
+        Payment.objects.create(order=paying, method='vnpay', amount=paying.total, status='pending')
+
+        call_command('expire_pending_orders', stdout=StringIO())
+
+        statuses = dict(Order.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[old.id], 'cancelled')
+        self.assertEqual(statuses[recent.id], 'pending')
+        self.assertEqual(statuses[paying.id], 'pending')
+        self.assertEqual(self.stock(0), (6, 4))
+
+    def test_refresh_command_repairs_drift(self):
+        self.create_order(2, 1)
+        Inventory.objects.update(reserved=99)
+
+        call_command('refresh_reserved_stock', stdout=StringIO())
+
+        self.assertEqual(self.stock(0)[1], 2)
+        self.assertEqual(self.stock(1)[1], 1)
+
+    def test_inventory_list_reads_reserved_column(self):
+        self.create_order(2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/inventory/')
+
+        self.assertEqual(response.status_code, 200)
+        rows = {row['product_variant']: row for row in response.data['results']}
+        self.assertEqual(rows[self.variants[0].id]['reserved'], 2)
+        self.assertEqual(rows[self.variants[0].id]['available'], 6)
+        self.assertFalse(any('order_items' in query['sql'] for query in queries.captured_queries))
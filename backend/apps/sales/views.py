@@ -3,6 +3,7 @@ from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
 from django.shortcuts import redirect
 from django.conf import settings
@@ -11,9 +12,9 @@ import logging
 from datetime import datetime  # Add this import
 
 
-from .models import Order, Payment, StockOut
+from .models import Order, OrderItem, OrderStateError, Payment, StockOut, StockOutItem
 from .serializers import (
-    OrderSerializer, PaymentSerializer, StockOutSerializer
+    OrderSerializer, PaymentSerializer, StockOutSerializer, VariantRecommendationSerializer
 )
 from .vnpay import VNPayService
 from config.pagination import StandardResultsSetPagination
@@ -72,7 +73,9 @@ class OrderViewSet(viewsets.ModelViewSet):
     """ViewSet for Order management"""
     queryset = Order.objects.all().select_related(
         'customer', 'created_by'
-    ).prefetch_related('items__product_variant__product__brand')
+    ).prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product_variant__product'))
+    )
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
@@ -264,44 +267,35 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Restore inventory for cancelled order
-        from apps.inventory.models import Inventory, StockMovement
-        
-        for order_item in order.items.all():
-            # Check if inventory was reduced for this order
-            stock_movements = StockMovement.objects.filter(
-                ref_type='Order',
-                ref_id=order.id,
-                product_variant=order_item.product_variant,
-                type='OUT'
-            )
-            
-            if stock_movements.exists():
-                # Restore inventory
-                try:
-                    inventory = Inventory.objects.select_for_update().get(
-                        product_variant=order_item.product_variant
-                    )
-                    inventory.on_hand += order_item.qty
-                    inventory.save()
-                    
-                    # Create stock movement record for restoration
-                    StockMovement.objects.create(
-                        type='IN',
-                        product_variant=order_item.product_variant,
-                        qty=order_item.qty,
-                        ref_type='OrderCancellation',
-                        ref_id=order.id
-                    )
-                except Inventory.DoesNotExist:
-                    logger.error(f'Inventory not found for variant {order_item.product_variant.sku}')
-        
-        order.status = 'cancelled'
-        order.save()
+        try:
+            order.cancel()
+        except OrderStateError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(order)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def recommendations(self, request):
+        """Variants frequently bought with the cart's (?variants=1,2,3&limit=5)"""
+        from .recommendations import recommend_for_cart
+
+        try:
+            variant_ids = [int(value) for value in request.query_params.get('variants', '').split(',') if value]
+            limit = min(int(request.query_params.get('limit', 5)), 20)
+        except ValueError:
+            return Response(
+                {'error': 'variants must be a comma-separated list of ids and limit a number'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not variant_ids:
+            return Response({'error': 'variants is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit must be at least 1'}, status=status.HTTP_400_BAD_REQUEST)
+
+        recommendations = recommend_for_cart(variant_ids, limit)
+        return Response(VariantRecommendationSerializer(recommendations, many=True).data)
+    
     @action(detail=True, methods=['get'])
     def payments(self, request, pk=None):
         """Get all payments for an order"""
@@ -318,11 +312,12 @@ class OrderViewSet(viewsets.ModelViewSet):
     @transaction.atomic
     def create_cash_payment(self, request, pk=None):
         """Create cash payment for order"""
-        order = self.get_object()
+        # Locked until the payment commits, so a concurrent cancel waits and then sees 'paid'
+        order = Order.objects.select_for_update().get(pk=self.get_object().pk)
         
-        if order.status == 'paid':
+        if order.status != 'pending':
             return Response(
-                {'error': 'Order is already paid'},
+                {'error': f'Order is already {order.status}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
@@ -400,7 +395,9 @@ class StockOutViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for Stock Out management (Read-only)"""
     queryset = StockOut.objects.all().select_related(
         'order', 'created_by'
-    ).prefetch_related('items__product_variant__product__brand')
+    ).prefetch_related(
+        Prefetch('items', queryset=StockOutItem.objects.select_related('product_variant'))
+    )
     serializer_class = StockOutSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
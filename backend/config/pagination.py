@@ -51,3 +51,11 @@ class StandardResultsSetPagination(PageNumberPagination):
         
         self.request = request
         return list(self.page)
+
+
+class OptionsResultsSetPagination(StandardResultsSetPagination):
+    """
+    Larger pages for slim option lists (dropdowns) whose rows are a few fields each
+    """
+    page_size = 50
+    max_page_size = 500
@@ -129,6 +129,40 @@ MEDIA_ROOT = BASE_DIR / 'apps' / 'assets'
 ASSETS_URL = '/assets/'
 ASSETS_ROOT = BASE_DIR / 'apps' / 'assets'
 
+# Cache-Control of /assets/ files that are not content-addressed (revalidated by ETag)
+ASSETS_CACHE_CONTROL = os.getenv('ASSETS_CACHE_CONTROL', 'public, max-age=3600')
+
+# Hand /assets/ bodies to the front server: 'X-Accel-Redirect' (nginx, with an internal
+# location at ASSETS_SENDFILE_PREFIX aliased to ASSETS_ROOT) or 'X-Sendfile'; empty
+# = the WSGI server sends the file (sendfile() under gunicorn)
+ASSETS_SENDFILE_HEADER = os.getenv('ASSETS_SENDFILE_HEADER', '')
+ASSETS_SENDFILE_PREFIX = os.getenv('ASSETS_SENDFILE_PREFIX', '/protected-assets/')
+
+# Cache - use a shared backend (e.g. django.core.cache.backends.redis.RedisCache)
+# in production so invalidations reach every worker process
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Seconds a cached catalog API response lives (writes invalidate it earlier)
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', '300'))
+
+# Catalog changes younger than this are held back from /api/products/sync/ until the
+# writes numbered before them have committed
+CATALOG_SYNC_SETTLE_SECONDS = int(os.getenv('CATALOG_SYNC_SETTLE_SECONDS', '5'))
+
+# Processes rendering image thumbnails/WebP in the background (0 = render inline)
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv('IMAGE_DERIVATIVE_WORKERS', '2'))
+
+# Seconds before a worker rebuilds its in-memory barcode/SKU scan index; writes made
+# by the same process are applied immediately
+SCAN_INDEX_MAX_AGE = int(os.getenv('SCAN_INDEX_MAX_AGE', '300'))
+# Same for the product facet index (apps.catalog.facets)
+FACET_INDEX_MAX_AGE = int(os.getenv('FACET_INDEX_MAX_AGE', '300'))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -188,6 +222,12 @@ VNPAY_HASH_SECRET = VNPAY_HASH_SECRET_KEY
 # Custom Settings
 ENABLE_IMEI_TRACKING = os.getenv('ENABLE_IMEI_TRACKING', 'False') == 'True'
 
+# On-hand quantity at or below which stock counts as low
+LOW_STOCK_THRESHOLD = int(os.getenv('LOW_STOCK_THRESHOLD', '10'))
+
+# Hours a pending order holds its stock before expire_pending_orders cancels it
+ORDER_PENDING_EXPIRY_HOURS = int(os.getenv('ORDER_PENDING_EXPIRY_HOURS', '24'))
+
 # Store Configuration (can be moved to database later)
 STORE_NAME = os.getenv('STORE_NAME', 'Cửa hàng điện thoại')
 STORE_ADDRESS = os.getenv('STORE_ADDRESS', '')
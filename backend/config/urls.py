@@ -2,10 +2,12 @@
 URL configuration for phone store management system.
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from apps.core.views import asset, immutable_asset
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     
@@ -22,13 +24,17 @@ urlpatterns = [
     path('api/payments/', include('apps.sales.urls.payments')),
     path('api/reports/', include('apps.reports.urls')),
     path('api/', include('apps.core.urls')),
+    
+    # Product and brand images (served in every environment); content-addressed
+    # blobs are hash-named and cached forever
+    re_path(r'^assets/(?P<path>images/blobs/.+)$', immutable_asset, name='immutable-asset'),
+    re_path(r'^assets/(?P<path>.+)$', asset, name='asset'),
 ]
 
 # Serve media files in development
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.ASSETS_URL, document_root=settings.ASSETS_ROOT)
 
 # Customize admin site
 admin.site.site_header = "Phone Store Management"
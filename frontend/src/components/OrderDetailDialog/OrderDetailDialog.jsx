@@ -220,7 +220,7 @@ export default function OrderDetailDialog({
                     <TableCell>
                       <Box>
                         <Typography variant="body2" fontWeight="medium">
-                          {item.product_name}
+                          {item.product_variant_name}
                         </Typography>
                         <Typography variant="caption" color="text.secondary">
                           SKU: {item.variant_sku}
@@ -21,6 +21,7 @@ import {
 } from '@mui/material'
 import { Add as AddIcon, Delete as DeleteIcon, Warning as WarningIcon } from '@mui/icons-material'
 import api from '../../api/axios'
+import VariantPicker from '../VariantPicker/VariantPicker'
 import { orderFormStyles } from './OrderForm.styles'
 
 export default function OrderForm({ open, onClose, onSuccess }) {
@@ -30,10 +31,8 @@ export default function OrderForm({ open, onClose, onSuccess }) {
     status: 'pending',
     note: ''
   })
-  const [items, setItems] = useState([{ product_variant: null, qty: 1, unit_price: 0, available_stock: 0 }])
+  const [items, setItems] = useState([{ product_variant: null, variant: null, qty: 1, unit_price: 0, available_stock: 0 }])
   const [customers, setCustomers] = useState([])
-  const [productVariants, setProductVariants] = useState([])
-  const [allProductVariants, setAllProductVariants] = useState([])
   const [brands, setBrands] = useState([])
   const [selectedBrand, setSelectedBrand] = useState('')
   const [loading, setLoading] = useState(false)
@@ -43,28 +42,15 @@ export default function OrderForm({ open, onClose, onSuccess }) {
     if (open) {
       fetchCustomers()
       fetchBrands()
-      fetchProductVariants()
       // Generate order code
       const code = 'ORD-' + Date.now().toString().slice(-8)
       setFormData(prev => ({ ...prev, code }))
-      setItems([{ product_variant: null, qty: 1, unit_price: 0, available_stock: 0 }])
+      setItems([{ product_variant: null, variant: null, qty: 1, unit_price: 0, available_stock: 0 }])
       setSelectedBrand('')
       setError(null)
     }
   }, [open])
 
-  // Filter variants when brand changes
-  useEffect(() => {
-    if (selectedBrand) {
-      const filtered = allProductVariants.filter(
-        variant => variant.product_detail?.brand?.id === selectedBrand
-      )
-      setProductVariants(filtered)
-    } else {
-      setProductVariants(allProductVariants)
-    }
-  }, [selectedBrand, allProductVariants])
-
   const fetchCustomers = async () => {
     try {
       const response = await api.get('/customers/')
@@ -76,27 +62,13 @@ export default function OrderForm({ open, onClose, onSuccess }) {
 
   const fetchBrands = async () => {
     try {
-      const response = await api.get('/brands/')
+      const response = await api.get('/brands/', { params: { page_size: 100 } })
       setBrands(response.data.results || response.data)
     } catch (err) {
       console.error('Error fetching brands:', err)
     }
   }
 
-  const fetchProductVariants = async () => {
-    try {
-      // Add timestamp to ensure fresh data from database
-      const timestamp = new Date().getTime()
-      const response = await api.get(`/products/variants/?_t=${timestamp}`)
-      const variants = response.data.results || response.data
-      console.log(`Fetched ${variants.length} variants with current stock from database`)
-      setAllProductVariants(variants)
-      setProductVariants(variants)
-    } catch (err) {
-      console.error('Error fetching variants:', err)
-    }
-  }
-
   const handleChange = (e) => {
     const { name, value } = e.target
     setFormData(prev => ({ ...prev, [name]: value }))
@@ -106,14 +78,12 @@ export default function OrderForm({ open, onClose, onSuccess }) {
     const newItems = [...items]
     newItems[index][field] = value
 
-    // If product variant changed, set price and stock from variant data
-    if (field === 'product_variant' && value) {
-      const variant = productVariants.find(v => v.id === value)
-      if (variant) {
-        newItems[index].unit_price = variant.price
-        // Use current_stock from variant (fetched from database)
-        newItems[index].available_stock = variant.current_stock || 0
-        console.log(`Stock for variant ${value} (${variant.product_detail?.name}):`, variant.current_stock)
+    // If product variant changed, set price and stock from the picked variant row
+    if (field === 'variant') {
+      newItems[index].product_variant = value?.id || null
+      if (value) {
+        newItems[index].unit_price = value.price
+        newItems[index].available_stock = value.available || 0
       }
     }
 
@@ -121,7 +91,7 @@ export default function OrderForm({ open, onClose, onSuccess }) {
   }
 
   const handleAddItem = () => {
-    setItems([...items, { product_variant: null, qty: 1, unit_price: 0, available_stock: 0 }])
+    setItems([...items, { product_variant: null, variant: null, qty: 1, unit_price: 0, available_stock: 0 }])
   }
 
   const handleRemoveItem = (index) => {
@@ -192,9 +162,6 @@ export default function OrderForm({ open, onClose, onSuccess }) {
 
       onSuccess('Tạo đơn hàng thành công!')
       onClose()
-
-      // Refresh product variants to get updated inventory for next order
-      await fetchProductVariants()
     } catch (err) {
       console.error('Error creating order:', err)
       setError(err.response?.data?.detail || err.response?.data?.error || 'Có lỗi xảy ra khi tạo đơn hàng')
@@ -308,24 +275,12 @@ export default function OrderForm({ open, onClose, onSuccess }) {
                     <Grid container spacing={orderFormStyles.gridSpacing} alignItems="center">
                       <Grid item xs={12} sm={6}>
                         <FormControl fullWidth required>
-                          <Autocomplete
-                            options={productVariants}
-                            getOptionLabel={(option) => {
-                              const parts = []
-                              // Dùng product_detail thay vì product
-                              if (option.product_detail?.name) parts.push(option.product_detail.name)
-                              if (option.ram) parts.push(option.ram)
-                              if (option.rom) parts.push(option.rom)
-                              if (option.color) parts.push(option.color)
-                              return parts.join(' - ')
-                            }}
-                            value={productVariants.find(v => v.id === item.product_variant) || null}
-                            onChange={(_, newValue) => {
-                              handleItemChange(index, 'product_variant', newValue?.id || null)
-                            }}
-                            renderInput={(params) => (
-                              <TextField {...params} label="Sản phẩm" required placeholder="Chọn sản phẩm..." />
-                            )}
+                          <VariantPicker
+                            value={item.variant}
+                            onChange={(variant) => handleItemChange(index, 'variant', variant)}
+                            params={selectedBrand ? { is_active: 'true', brand: selectedBrand } : { is_active: 'true' }}
+                            placeholder="Chọn sản phẩm..."
+                            required
                           />
                         </FormControl>
                       </Grid>
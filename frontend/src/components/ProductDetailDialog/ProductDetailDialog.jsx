@@ -432,7 +432,7 @@ export default function ProductDetailDialog({ open, onClose, product: initialPro
                                                         {firstImage && (
                                                             <Box
                                                                 component="img"
-                                                                src={firstImage.image}
+                                                                src={firstImage.thumbnail || firstImage.image}
                                                                 alt={color}
                                                                 sx={{
                                                                     width: 40,
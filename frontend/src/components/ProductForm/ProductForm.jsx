@@ -159,7 +159,7 @@ export default function ProductForm({ open, onClose, product, onSuccess }) {
 
   const fetchBrands = async () => {
     try {
-      const response = await api.get('/brands/')
+      const response = await api.get('/brands/', { params: { page_size: 100 } })
       setBrands(response.data.results || response.data)
     } catch (err) {
       console.error('Error fetching brands:', err)
@@ -0,0 +1,83 @@
+import { useState, useEffect } from 'react'
+import { Autocomplete, TextField, CircularProgress } from '@mui/material'
+import api from '../../api/axios'
+
+const SEARCH_DELAY_MS = 300
+const PAGE_SIZE = 50
+
+// Variant dropdown that searches the server as the user types (?search=), so any
+// variant of the catalog can be picked, not only the first page.
+// value / onChange use slim variant rows ({ id, name, price, available }).
+export default function VariantPicker({
+  value,
+  onChange,
+  params = {},
+  label = 'Sản phẩm',
+  placeholder = 'Tìm sản phẩm...',
+  size,
+  required = false
+}) {
+  const [options, setOptions] = useState([])
+  const [search, setSearch] = useState('')
+  const [loading, setLoading] = useState(false)
+  const paramsKey = JSON.stringify(params)
+
+  useEffect(() => {
+    let active = true
+    const timer = setTimeout(async () => {
+      setLoading(true)
+      try {
+        const query = { slim: 1, page_size: PAGE_SIZE, ...params }
+        if (search) query.search = search
+        const response = await api.get('/products/variants/', { params: query })
+        if (active) setOptions(response.data.results || response.data)
+      } catch (err) {
+        console.error('Error searching variants:', err)
+      } finally {
+        if (active) setLoading(false)
+      }
+    }, SEARCH_DELAY_MS)
+
+    return () => {
+      active = false
+      clearTimeout(timer)
+    }
+    // params is compared by value
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [search, paramsKey])
+
+  return (
+    <Autocomplete
+      options={value && !options.some(v => v.id === value.id) ? [value, ...options] : options}
+      value={value || null}
+      loading={loading}
+      size={size}
+      // The server already filtered the options
+      filterOptions={(x) => x}
+      getOptionLabel={(option) => option.name || ''}
+      isOptionEqualToValue={(option, selected) => option.id === selected.id}
+      onChange={(_, newValue) => onChange(newValue)}
+      onInputChange={(_, newInput, reason) => {
+        // Selecting an option fills the input with its name; only typing searches
+        if (reason !== 'reset') setSearch(newInput)
+      }}
+      renderInput={(inputParams) => (
+        <TextField
+          {...inputParams}
+          label={label}
+          required={required}
+          placeholder={placeholder}
+          InputProps={{
+            ...inputParams.InputProps,
+            endAdornment: (
+              <>
+                {loading ? <CircularProgress color="inherit" size={16} /> : null}
+                {inputParams.InputProps.endAdornment}
+              </>
+            )
+          }}
+        />
+      )}
+    />
+  )
+}
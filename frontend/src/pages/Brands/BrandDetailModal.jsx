@@ -182,7 +182,7 @@ const BrandDetailModal = ({ open, onClose, brand }) => {
                     {product.primary_image ? (
                       <CardMedia
                         component="img"
-                        image={product.primary_image.image}
+                        image={product.primary_image.derivatives?.medium?.webp || product.primary_image.image}
                         alt={product.name}
                         sx={{
                           position: 'absolute',
@@ -84,7 +84,7 @@ export default function Products() {
 
   const fetchBrands = async () => {
     try {
-      const response = await api.get('/brands/')
+      const response = await api.get('/brands/', { params: { page_size: 100 } })
       setBrands(response.data.results || response.data)
     } catch (err) {
       console.error('Error fetching brands:', err)
@@ -361,7 +361,7 @@ export default function Products() {
                 <TableRow key={product.id} hover>
                   <TableCell>
                     <Avatar
-                      src={product.primary_image?.image || product.images?.[0]?.image || '/assets/images/1.jpg'}
+                      src={product.primary_image?.thumbnail || product.primary_image?.image || product.images?.[0]?.image || '/assets/images/1.jpg'}
                       alt={product.name}
                       variant="rounded"
                       sx={productsStyles.productAvatar}
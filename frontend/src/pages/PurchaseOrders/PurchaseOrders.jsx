@@ -39,6 +39,7 @@ import {
 } from '@mui/icons-material'
 import api from '../../api/axios'
 import Notification from '../../components/Notification/Notification'
+import VariantPicker from '../../components/VariantPicker/VariantPicker'
 import { purchaseOrdersStyles } from './PurchaseOrders.styles'
 import { formatNumber, parseFormattedNumber } from '../../utils/formatters'
 
@@ -55,12 +56,11 @@ export default function PurchaseOrders() {
   const [detailDialogOpen, setDetailDialogOpen] = useState(false)
   const [selectedOrder, setSelectedOrder] = useState(null)
   const [suppliers, setSuppliers] = useState([])
-  const [products, setProducts] = useState([])
   const [formOpen, setFormOpen] = useState(false)
   const [formData, setFormData] = useState({
     supplier: '',
     note: '',
-    items: [{ product_variant: '', qty: 1, unit_cost: '' }]
+    items: [{ product_variant: '', variant: null, qty: 1, unit_cost: '' }]
   })
 
   const fetchOrders = async () => {
@@ -102,18 +102,8 @@ export default function PurchaseOrders() {
     }
   }
 
-  const fetchProducts = async () => {
-    try {
-      const response = await api.get('/products/variants/')
-      setProducts(response.data.results || response.data)
-    } catch (err) {
-      console.error('Error fetching products:', err)
-    }
-  }
-
   useEffect(() => {
     fetchSuppliers()
-    fetchProducts()
   }, [])
 
   useEffect(() => {
@@ -176,7 +166,7 @@ export default function PurchaseOrders() {
     setFormData({
       supplier: '',
       note: '',
-      items: [{ product_variant: '', qty: 1, unit_cost: '' }]
+      items: [{ product_variant: '', variant: null, qty: 1, unit_cost: '' }]
     })
     setFormOpen(true)
   }
@@ -184,7 +174,7 @@ export default function PurchaseOrders() {
   const handleAddItem = () => {
     setFormData(prev => ({
       ...prev,
-      items: [...prev.items, { product_variant: '', qty: 1, unit_cost: '' }]
+      items: [...prev.items, { product_variant: '', variant: null, qty: 1, unit_cost: '' }]
     }))
   }
 
@@ -204,19 +194,17 @@ export default function PurchaseOrders() {
       processedValue = cleanValue === '' ? '' : parseInt(cleanValue) || 0
     } else if (field === 'qty') {
       processedValue = parseInt(value) || 1
-    } else if (field === 'product_variant') {
+    } else if (field === 'variant') {
       // Tự động điền giá khi chọn sản phẩm
-      const selectedProduct = products.find(p => p.id === value)
-      if (selectedProduct && selectedProduct.price) {
-        setFormData(prev => ({
-          ...prev,
-          items: prev.items.map((item, i) => 
-            i === index ? { ...item, product_variant: value, unit_cost: selectedProduct.price } : item
-          )
-        }))
-        return
-      }
-      processedValue = value
+      setFormData(prev => ({
+        ...prev,
+        items: prev.items.map((item, i) =>
+          i === index
+            ? { ...item, variant: value, product_variant: value?.id || '', unit_cost: value?.price || item.unit_cost }
+            : item
+        )
+      }))
+      return
     }
 
     setFormData(prev => ({
@@ -546,20 +534,11 @@ export default function PurchaseOrders() {
               {formData.items.map((item, index) => (
                 <Grid container spacing={1} key={index} sx={{ mb: 2 }}>
                   <Grid item xs={5}>
-                    <FormControl fullWidth size="small">
-                      <InputLabel>Sản phẩm</InputLabel>
-                      <Select
-                        value={item.product_variant}
-                        onChange={(e) => handleItemChange(index, 'product_variant', e.target.value)}
-                        label="Sản phẩm"
-                      >
-                        {products.map((product) => (
-                          <SelectMenuItem key={product.id} value={product.id}>
-                            {product.product_detail?.name} - {product.ram} {product.rom}
-                          </SelectMenuItem>
-                        ))}
-                      </Select>
-                    </FormControl>
+                    <VariantPicker
+                      value={item.variant}
+                      onChange={(variant) => handleItemChange(index, 'variant', variant)}
+                      size="small"
+                    />
                   </Grid>
                   <Grid item xs={2}>
                     <TextField
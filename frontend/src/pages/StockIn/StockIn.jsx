@@ -37,6 +37,7 @@ import {
 } from '@mui/icons-material'
 import api from '../../api/axios'
 import Notification from '../../components/Notification/Notification'
+import VariantPicker from '../../components/VariantPicker/VariantPicker'
 import { stockInStyles } from './StockIn.styles'
 import { formatNumber, parseFormattedNumber } from '../../utils/formatters'
 
@@ -53,14 +54,13 @@ export default function StockIn() {
   const [formOpen, setFormOpen] = useState(false)
   const [detailOpen, setDetailOpen] = useState(false)
   const [selectedStockIn, setSelectedStockIn] = useState(null)
-  const [products, setProducts] = useState([])
   const [purchaseOrders, setPurchaseOrders] = useState([])
   const [formData, setFormData] = useState({
     source: 'MANUAL',
     reference_id: null,
     supplier_id: '',
     note: '',
-    items: [{ product_variant: '', qty: 1, unit_cost: '' }]
+    items: [{ product_variant: '', variant: null, qty: 1, unit_cost: '' }]
   })
 
   // State to store mapping between stockIn id/code and supplier
@@ -118,15 +118,6 @@ export default function StockIn() {
     }
   }
 
-  const fetchProducts = async () => {
-    try {
-      const response = await api.get('/products/variants/')
-      setProducts(response.data.results || response.data)
-    } catch (err) {
-      console.error('Error fetching products:', err)
-    }
-  }
-
   const fetchPurchaseOrders = async () => {
     try {
       const response = await api.get('/purchase-orders/', { params: { status: 'approved' } })
@@ -137,25 +128,24 @@ export default function StockIn() {
   }
 
   useEffect(() => {
-    fetchProducts()
     fetchPurchaseOrders()
   }, [])
 
   // Handle pre-selected items from LowStockAlert
   useEffect(() => {
-    if (location.state?.preSelectedItems && products.length > 0) {
+    if (location.state?.preSelectedItems) {
       const preSelectedItems = location.state.preSelectedItems
-      const items = preSelectedItems.map(item => {
-        // Tìm product trong danh sách để lấy giá
-        const product = products.find(p => p.id === item.product_variant)
-        const unit_cost = product?.price || item.price || ''
-
-        return {
-          product_variant: item.product_variant,
-          qty: item.suggested_qty,
-          unit_cost: unit_cost
-        }
-      })
+      const items = preSelectedItems.map(item => ({
+        product_variant: item.product_variant,
+        // Option shown by the variant picker until another one is searched
+        variant: {
+          id: item.product_variant,
+          name: [item.product_name, item.variant_detail].filter(Boolean).join(' - '),
+          price: item.price
+        },
+        qty: item.suggested_qty,
+        unit_cost: item.price || ''
+      }))
 
       setFormData({
         source: 'MANUAL',
@@ -170,7 +160,7 @@ export default function StockIn() {
       // Clear state after using
       window.history.replaceState({}, document.title)
     }
-  }, [location.state, products])
+  }, [location.state])
 
   useEffect(() => {
     fetchStockIns()
@@ -196,7 +186,7 @@ export default function StockIn() {
       reference_id: null,
       supplier_id: '',
       note: '',
-      items: [{ product_variant: '', qty: 1, unit_cost: '' }]
+      items: [{ product_variant: '', variant: null, qty: 1, unit_cost: '' }]
     })
     setFormOpen(true)
   }
@@ -219,7 +209,7 @@ export default function StockIn() {
   const handleAddItem = () => {
     setFormData(prev => ({
       ...prev,
-      items: [...prev.items, { product_variant: '', qty: 1, unit_cost: '' }]
+      items: [...prev.items, { product_variant: '', variant: null, qty: 1, unit_cost: '' }]
     }))
   }
 
@@ -238,18 +228,17 @@ export default function StockIn() {
       processedValue = cleanValue === '' ? '' : parseInt(cleanValue) || 0
     } else if (field === 'qty') {
       processedValue = parseInt(value) || 1
-    } else if (field === 'product_variant') {
-      const selectedProduct = products.find(p => p.id === value)
-      if (selectedProduct && selectedProduct.price) {
-        setFormData(prev => ({
-          ...prev,
-          items: prev.items.map((item, i) =>
-            i === index ? { ...item, product_variant: value, unit_cost: selectedProduct.price } : item
-          )
-        }))
-        return
-      }
-      processedValue = value
+    } else if (field === 'variant') {
+      // Tự động điền giá khi chọn sản phẩm
+      setFormData(prev => ({
+        ...prev,
+        items: prev.items.map((item, i) =>
+          i === index
+            ? { ...item, variant: value, product_variant: value?.id || '', unit_cost: value?.price || item.unit_cost }
+            : item
+        )
+      }))
+      return
     }
 
     setFormData(prev => ({
@@ -561,20 +550,11 @@ export default function StockIn() {
               {formData.items.map((item, index) => (
                 <Grid container spacing={1} key={index} sx={{ mb: 2 }}>
                   <Grid item xs={5}>
-                    <FormControl fullWidth size="small">
-                      <InputLabel>Sản phẩm</InputLabel>
-                      <Select
-                        value={item.product_variant}
-                        onChange={(e) => handleItemChange(index, 'product_variant', e.target.value)}
-                        label="Sản phẩm"
-                      >
-                        {products.map((product) => (
-                          <SelectMenuItem key={product.id} value={product.id}>
-                            {product.product_detail?.name} - {product.ram} {product.rom}
-                          </SelectMenuItem>
-                        ))}
-                      </Select>
-                    </FormControl>
+                    <VariantPicker
+                      value={item.variant}
+                      onChange={(variant) => handleItemChange(index, 'variant', variant)}
+                      size="small"
+                    />
                   </Grid>
                   <Grid item xs={2}>
                     <TextField